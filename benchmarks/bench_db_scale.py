@@ -0,0 +1,96 @@
+"""
+Populates a database with a synthetic league (see nba_ss_db.synthetic)
+of the given size and times storing it, the retrieval functions
+and an aggregation query over the player logs.
+
+The default size is close to ten real seasons (1230 games per season
+and about 500 players).
+
+Usage (from the root of the repository):
+    python -m benchmarks.bench_db_scale --seasons 10 --players_per_team 17 --games 1230
+"""
+import argparse
+import contextlib
+import os
+import tempfile
+import time
+
+from nba_ss_db import db, scrape, synthetic, CONFIG
+from benchmarks.bench_scrape_e2e import ScrapeTimings
+
+
+def get_seasons(num_seasons, end_year=2018):
+    """
+    >>> get_seasons(2)
+    ['2016-17', '2017-18']
+    """
+    return ['{}-{:02d}'.format(year, (year + 1) % 100) for year in range(end_year - num_seasons, end_year)]
+
+
+def time_call(timings, name, f, *args):
+    start_time = time.perf_counter()
+    result = f(*args)
+    timings[name] = time.perf_counter() - start_time
+    return result
+
+
+def bench_db_scale(league, db_path, quiet=True):
+    """
+    Populates a database in db_path with the league and returns
+    the number of rows stored and a dictionary of timings.
+    """
+    CONFIG['DB_PATH'] = db_path
+    CONFIG['DB_NAME'] = 'bench_db_scale'
+    db.request_logger.clear_scraped_requests_cache()
+    db.schema_catalog.clear()
+    scrape.query_param_values.GAME_DATES_BY_GAME_ID.clear()
+
+    timings = {}
+    output = open(os.devnull, 'w') if quiet else None
+    with db.utils.connection():
+        db.initialize.init_db()
+        with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext(), \
+                ScrapeTimings().record() as scrape_timings:
+            num_rows = time_call(timings, 'populate', synthetic.populate_database, league)
+        # most of populating is generating the responses
+        timings['store'] = sum(scrape_timings.write_times)
+        time_call(timings, 'fetch_player_ids', db.retrieve.fetch_player_ids)
+        time_call(timings, 'fetch_game_ids', db.retrieve.fetch_game_ids)
+        time_call(timings, 'fetch_game_dates_by_game_id', db.retrieve.fetch_game_dates_by_game_id)
+        time_call(timings, 'retrieve_player_logs', db.retrieve.retrieve_player_logs)
+        time_call(timings, 'aggregate_player_logs', db.utils.execute_sql,
+                  """SELECT PLAYER_ID, SEASON, COUNT(*), AVG(PTS), AVG(REB), AVG(AST), SUM(FGM) * 1.0 / SUM(FGA)
+                     FROM player_logs GROUP BY PLAYER_ID, SEASON ORDER BY PLAYER_ID, SEASON;""")
+    if output is not None:
+        output.close()
+    return num_rows, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the database with a synthetic league.')
+    parser.add_argument('--seasons', type=int, default=10, help='number of seasons')
+    parser.add_argument('--players_per_team', type=int, default=17)
+    parser.add_argument('--games', type=int, default=1230, help='number of games per season')
+    parser.add_argument('--sqlite_profile', choices=list(CONFIG['SQLITE_PRAGMAS'].keys()), default=CONFIG['SQLITE_PROFILE'])
+    parser.add_argument('--db_path', help='directory to keep the database in (a temporary one by default)')
+    parser.add_argument('--verbose', action='store_true', help='show the output of populating the database')
+    args = parser.parse_args()
+
+    db.utils.set_sqlite_profile(args.sqlite_profile)
+    league = synthetic.League(seasons=get_seasons(args.seasons), players_per_team=args.players_per_team,
+                              games_per_season=args.games)
+
+    with tempfile.TemporaryDirectory() as tmp_path:
+        db_path = args.db_path if args.db_path is not None else tmp_path
+        num_rows, timings = bench_db_scale(league, db_path, quiet=not args.verbose)
+        db_size = os.path.getsize(os.path.join(db_path, 'bench_db_scale.db'))
+
+    print('rows:            {}'.format(num_rows))
+    print('database size:   {:.1f} MB'.format(db_size / 1e6))
+    print('rows/sec stored: {:.0f}'.format(num_rows / timings['store']))
+    for name, seconds in timings.items():
+        print('{:<30}{:>8.3f} s'.format(name, seconds))
+
+
+if __name__ == '__main__':
+    main()
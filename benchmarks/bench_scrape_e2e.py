@@ -0,0 +1,190 @@
+"""
+Runs run_scrape_jobs end to end against the fake stats server
+(see fake_stats_server.py) and reports the throughput and latency
+of the scrape and the time spent writing to the database.
+
+The jobs in api_requests_init.yaml and the given api requests yaml
+file are pointed at the fake server and stored in a temporary database.
+
+Usage (from the root of the repository):
+    python -m benchmarks.bench_scrape_e2e --latency 0.02 --error_rate 0.02 --throttle_rate 0.01
+"""
+import argparse
+import contextlib
+import os
+import statistics
+import tempfile
+import threading
+import time
+import yaml
+
+from nba_ss_db import db, scrape, CONFIG
+from nba_ss_db.scrape import http_session
+from benchmarks.fake_stats_server import FakeStatsServer, League
+
+
+API_REQUESTS_INIT_PATH = 'nba_ss_db/scrape/api_requests_init.yaml'
+
+STATS_NBA_URLS = ['https://stats.nba.com', 'http://stats.nba.com']
+
+
+class ScrapeTimings():
+    """
+    Records the latency of every request and the time spent
+    and rows written by every batch write during a scrape.
+    """
+
+    def __init__(self):
+        self.request_times = []
+        self.write_times = []
+        self.num_rows = 0
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def record(self):
+        """
+        Times http_session.get and BatchWriter.flush while in the context.
+        """
+        get = http_session.get
+        flush = db.batch_writer.BatchWriter.flush
+
+        def timed_get(url):
+            start_time = time.perf_counter()
+            try:
+                return get(url)
+            finally:
+                with self._lock:
+                    self.request_times.append(time.perf_counter() - start_time)
+
+        def timed_flush(batch_writer):
+            num_rows = batch_writer._num_rows
+            start_time = time.perf_counter()
+            flush(batch_writer)
+            with self._lock:
+                self.write_times.append(time.perf_counter() - start_time)
+                self.num_rows += num_rows
+
+        http_session.get = timed_get
+        db.batch_writer.BatchWriter.flush = timed_flush
+        try:
+            yield self
+        finally:
+            http_session.get = get
+            db.batch_writer.BatchWriter.flush = flush
+
+
+def point_jobs_at(path_to_api_requests, url, output_path):
+    """
+    Writes the jobs of the yaml file with their api requests
+    made to url instead of stats.nba.com.
+    """
+    with open(path_to_api_requests, 'r') as f:
+        jobs = yaml.safe_load(f)
+    for job in jobs:
+        for stats_nba_url in STATS_NBA_URLS:
+            job['API_ENDPOINT'] = job['API_ENDPOINT'].replace(stats_nba_url, url)
+    with open(output_path, 'w') as f:
+        yaml.safe_dump(jobs, f)
+
+
+def percentile(values, p):
+    """
+    >>> percentile([1, 2, 3, 4], 50)
+    2.5
+    """
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[p - 1]
+
+
+def bench_scrape(path_to_api_requests, server, seasons, quiet=True):
+    """
+    Scrapes every job against the server into a temporary database
+    and returns a dictionary of results.
+    """
+    with tempfile.TemporaryDirectory() as tmp_path:
+        CONFIG['DB_PATH'] = tmp_path
+        CONFIG['DB_NAME'] = 'bench_scrape'
+        CONFIG['RESPONSE_CACHE'] = False
+        CONFIG['SEASONS'] = seasons
+        CONFIG['CURRENT_SEASON'] = seasons[-1]
+
+        init_path = os.path.join(tmp_path, 'api_requests_init.yaml')
+        jobs_path = os.path.join(tmp_path, 'api_requests.yaml')
+        point_jobs_at(API_REQUESTS_INIT_PATH, server.url, init_path)
+        point_jobs_at(path_to_api_requests, server.url, jobs_path)
+
+        scrape.query_param_values.QUERY_PARAM_VALUES.clear()
+        scrape.query_param_values.GAME_DATES_BY_GAME_ID.clear()
+        db.request_logger.clear_scraped_requests_cache()
+        db.schema_catalog.clear()
+
+        output = open(os.devnull, 'w') if quiet else None
+        with ScrapeTimings().record() as timings, db.utils.connection():
+            db.initialize.init_db()
+            start_time = time.perf_counter()
+            with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+                scrape.scraper.run_scrape_jobs(init_path)
+                scrape.scraper.run_scrape_jobs(jobs_path)
+            total_time = time.perf_counter() - start_time
+        if output is not None:
+            output.close()
+        http_session.close_session()
+
+    num_requests = len(timings.request_times)
+    return {
+        'requests': num_requests,
+        'time': total_time,
+        'requests_per_sec': num_requests / total_time,
+        'rows': timings.num_rows,
+        'rows_per_sec': timings.num_rows / total_time,
+        'p50_latency': percentile(timings.request_times, 50) if num_requests > 0 else None,
+        'p99_latency': percentile(timings.request_times, 99) if num_requests > 0 else None,
+        'db_write_time': sum(timings.write_times),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks a scrape against a fake stats.nba.com.')
+    parser.add_argument('--api_requests', default='api_requests.yaml', help='yaml file of the jobs to scrape')
+    parser.add_argument('--seasons', nargs='+', default=['2017-18'], help='seasons to scrape')
+    parser.add_argument('--latency', type=float, default=0.01, help='mean response time in seconds')
+    parser.add_argument('--error_rate', type=float, default=0.0, help='fraction of requests answered with a 500')
+    parser.add_argument('--throttle_rate', type=float, default=0.0, help='fraction of requests answered with a 429')
+    parser.add_argument('--players_per_team', type=int, default=5)
+    parser.add_argument('--games', type=int, default=60, help='number of games per season')
+    parser.add_argument('--max_concurrency', type=int, default=CONFIG['MAX_CONCURRENCY'])
+    parser.add_argument('--job_concurrency', type=int, default=CONFIG['JOB_CONCURRENCY'])
+    parser.add_argument('--parsers', type=int, default=CONFIG['PIPELINE_PARSERS'], help='threads decoding responses')
+    parser.add_argument('--queue_size', type=int, default=CONFIG['PIPELINE_QUEUE_SIZE'])
+    parser.add_argument('--sqlite_profile', choices=list(CONFIG['SQLITE_PRAGMAS'].keys()), default=CONFIG['SQLITE_PROFILE'])
+    parser.add_argument('--verbose', action='store_true', help='show the output of the scrape')
+    args = parser.parse_args()
+
+    CONFIG['MAX_CONCURRENCY'] = args.max_concurrency
+    CONFIG['JOB_CONCURRENCY'] = args.job_concurrency
+    CONFIG['PIPELINE_PARSERS'] = args.parsers
+    CONFIG['PIPELINE_QUEUE_SIZE'] = args.queue_size
+    # retry quickly, since the fake server's faults are random rather than load dependent
+    CONFIG['SLEEP_TIME'] = 0.05
+    CONFIG['BACKOFF_MAX_TIME'] = 1
+    db.utils.set_sqlite_profile(args.sqlite_profile)
+
+    league = League(players_per_team=args.players_per_team, games_per_season=args.games)
+    with FakeStatsServer(latency=args.latency, error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                         retry_after=0, league=league) as server:
+        results = bench_scrape(args.api_requests, server, args.seasons, quiet=not args.verbose)
+
+    print('requests:        {}'.format(results['requests']))
+    print('time:            {:.2f} s'.format(results['time']))
+    print('requests/sec:    {:.1f}'.format(results['requests_per_sec']))
+    print('rows:            {}'.format(results['rows']))
+    print('rows/sec:        {:.0f}'.format(results['rows_per_sec']))
+    print('p50 latency:     {:.1f} ms'.format(results['p50_latency'] * 1000))
+    print('p99 latency:     {:.1f} ms'.format(results['p99_latency'] * 1000))
+    print('db write time:   {:.2f} s ({:.0%} of the scrape)'.format(
+        results['db_write_time'], results['db_write_time'] / results['time']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Compares the sqlite pragma presets in config.yaml (SQLITE_PRAGMAS).
+
+For every preset, responses are stored and logged one at a time
+like a scrape job does and then an aggregation query is run over
+the stored rows.
+
+Usage (from the root of the repository):
+    python -m benchmarks.bench_sqlite_profiles --responses 500 --rows 200
+"""
+import argparse
+import random
+import tempfile
+import time
+
+from nba_ss_db import db, CONFIG
+from nba_ss_db.scrape.scraper import NBAResponse
+
+
+HEADERS = ['PLAYER_ID', 'GAME_ID', 'GAME_DATE', 'MIN', 'FGM', 'FGA', 'FG_PCT', 'FG3M', 'FG3A',
+           'FTM', 'FTA', 'REB', 'AST', 'STL', 'BLK', 'TOV', 'PF', 'PTS', 'PLUS_MINUS', 'MATCHUP']
+
+
+def make_response(response_i, num_rows):
+    rows = []
+    for row_i in range(num_rows):
+        fga = random.randint(0, 30)
+        fgm = random.randint(0, fga)
+        rows.append([1000 + row_i, '00217{:05d}'.format(response_i), '2018-01-{:02d}'.format(response_i % 28 + 1),
+                     random.randint(0, 48), fgm, fga, fgm / fga if fga else None, random.randint(0, 5),
+                     random.randint(5, 10), random.randint(0, 10), random.randint(10, 15), random.randint(0, 15),
+                     random.randint(0, 12), random.randint(0, 4), random.randint(0, 4), random.randint(0, 6),
+                     random.randint(0, 6), random.randint(0, 50), random.randint(-20, 20), 'GSW vs. HOU'])
+    json_response = {'resultSets': [{'headers': list(HEADERS), 'rowSet': rows}]}
+    return NBAResponse(json_response, 0)
+
+
+def bench_profile(profile, responses):
+    with tempfile.TemporaryDirectory() as db_path:
+        CONFIG['DB_PATH'] = db_path
+        CONFIG['DB_NAME'] = 'bench_{}'.format(profile)
+        db.utils.set_sqlite_profile(profile)
+
+        with db.utils.connection():
+            db.initialize.init_db()
+
+            start_time = time.perf_counter()
+            for response_i, nba_response in enumerate(responses):
+                db.store.store_nba_response('player_logs', nba_response, ('PLAYER_ID', 'GAME_ID'))
+                db.request_logger.log_request('api_request_{}'.format(response_i), 'player_logs')
+            store_time = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            db.utils.execute_sql("""SELECT PLAYER_ID, GAME_DATE, AVG(PTS), SUM(REB), MAX(AST)
+                                    FROM player_logs GROUP BY PLAYER_ID, GAME_DATE
+                                    ORDER BY PLAYER_ID, GAME_DATE;""")
+            query_time = time.perf_counter() - start_time
+    return store_time, query_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the sqlite pragma presets.')
+    parser.add_argument('--responses', type=int, default=500, help='number of responses to store')
+    parser.add_argument('--rows', type=int, default=200, help='number of rows per response')
+    args = parser.parse_args()
+
+    random.seed(0)
+    responses = [make_response(response_i, args.rows) for response_i in range(args.responses)]
+    num_rows = args.responses * args.rows
+
+    print('{:<12}{:>12}{:>14}{:>12}'.format('profile', 'store (s)', 'rows/sec', 'query (s)'))
+    for profile in CONFIG['SQLITE_PRAGMAS']:
+        store_time, query_time = bench_profile(profile, responses)
+        print('{:<12}{:>12.3f}{:>14.0f}{:>12.3f}'.format(profile, store_time, num_rows / store_time, query_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+A local stand-in for stats.nba.com which serves the synthetic
+responses of nba_ss_db.synthetic for every endpoint used in
+api_requests.yaml and api_requests_init.yaml. Latency, server errors,
+throttling (429 with a Retry-After header) and the size of the
+league (which sets the size of the payloads) are configurable.
+
+Usage (from the root of the repository):
+    python -m benchmarks.fake_stats_server --port 8000 --latency 0.05 --error_rate 0.01
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from nba_ss_db.synthetic import ENDPOINTS, League, generate_json_response
+
+
+class FakeStatsServer():
+    """
+    Serves the league over http on a background thread.
+
+    with FakeStatsServer(latency=0.05, error_rate=0.01) as server:
+        requests.get(server.url + '/stats/leaguegamelog?Season=2017-18')
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, error_rate=0.0, throttle_rate=0.0,
+                 retry_after=1, league=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.league = League() if league is None else league
+        self.num_requests = 0
+        self._num_requests_lock = threading.Lock()
+        self._rng = random.Random(self.league.seed)
+        self._httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def handle(self, path):
+        """
+        Returns the (status code, headers, body) of the response to a request.
+        """
+        with self._num_requests_lock:
+            self.num_requests += 1
+            fault = self._rng.random()
+
+        if self.latency > 0:
+            # exponentially distributed, so a few requests are a lot slower than the rest
+            time.sleep(self._rng.expovariate(1 / self.latency))
+        if fault < self.throttle_rate:
+            return 429, {'Retry-After': str(self.retry_after)}, b''
+        if fault < self.throttle_rate + self.error_rate:
+            return 500, {}, b''
+
+        endpoint = urllib.parse.urlsplit(path).path.rstrip('/').split('/')[-1]
+        if endpoint not in ENDPOINTS:
+            return 404, {}, b''
+        json_response = generate_json_response(path, self.league)
+        if json_response is None:
+            return 400, {}, b''
+
+        body = json.dumps(json_response)
+        return 200, {'Content-Type': 'application/json'}, body.encode('utf-8')
+
+
+def _make_handler(server):
+
+    class FakeStatsHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # the headers and body are written separately, which would otherwise be delayed by nagle
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            status_code, headers, body = server.handle(self.path)
+            self.send_response(status_code)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeStatsHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serves a fake stats.nba.com locally.')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='mean response time in seconds')
+    parser.add_argument('--error_rate', type=float, default=0.0, help='fraction of requests answered with a 500')
+    parser.add_argument('--throttle_rate', type=float, default=0.0, help='fraction of requests answered with a 429')
+    parser.add_argument('--players_per_team', type=int, default=15)
+    parser.add_argument('--games', type=int, default=1230, help='number of games per season')
+    args = parser.parse_args()
+
+    league = League(players_per_team=args.players_per_team, games_per_season=args.games)
+    server = FakeStatsServer(port=args.port, latency=args.latency, error_rate=args.error_rate,
+                             throttle_rate=args.throttle_rate, league=league)
+    print('Serving a fake stats.nba.com at {}'.format(server.url))
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
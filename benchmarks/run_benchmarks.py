@@ -0,0 +1,382 @@
+"""
+Benchmarks the ingest and retrieval hot paths at small, medium and
+large input sizes and writes a json report that can be saved as a
+baseline and diffed between releases.
+
+Every benchmark is run a number of times on the same (seeded) inputs
+and the minimum and median times are reported. When a baseline is
+given, a benchmark whose minimum time (the least noisy one) is more
+than the threshold slower than its baseline is a regression and the
+exit code is 1.
+
+Usage (from the root of the repository):
+    python -m benchmarks.run_benchmarks --save_baseline benchmarks/baseline.json
+    python -m benchmarks.run_benchmarks --baseline benchmarks/baseline.json --output report.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from nba_ss_db import db, scrape, synthetic, CONFIG
+from nba_ss_db.scrape.fillable_api_request import FillableAPIRequest
+from nba_ss_db.scrape.query_param_values import QUERY_PARAM_VALUES
+from nba_ss_db.scrape.scraper import NBAResponse
+
+
+SIZES = {
+    'small': 100,
+    'medium': 10000,
+    'large': 100000,
+}
+
+SEASON = '2017-18'
+
+PLAYER_LOG_HEADERS = ['SEASON_YEAR', 'PLAYER_ID', 'PLAYER_NAME', 'TEAM_ID', 'GAME_ID', 'GAME_DATE', 'MATCHUP',
+                      'WL'] + synthetic.STAT_HEADERS
+
+# the columns of player logs that the jobs in api_requests.yaml ignore
+IGNORE_KEYS = {'PLAYER_NAME', 'MATCHUP'}
+
+PLAYER_LOGS_API_REQUEST = 'http://stats.nba.com/stats/playergamelogs?DateFrom=&DateTo=&GameSegment=&LastNGames=0' \
+    '&LeagueID=00&Location=&MeasureType=Base&Month=0&OpponentTeamID=0&Outcome=&PORound=0&PaceAdjust=N' \
+    '&PerMode=Totals&Period=0&PlayerID={PLAYER_ID}&PlusMinus=N&Rank=N&Season={SEASON}&SeasonSegment=' \
+    '&SeasonType=Regular+Season&ShotClockRange=&VsConference=&VsDivision='
+
+
+def make_player_log_response(num_rows, seed=0):
+    """
+    Returns an NBAResponse of num_rows synthetic player logs
+    with dates formatted like 'OCT 29, 2016'.
+    """
+    rng = random.Random(seed)
+    league = synthetic.League(seasons=[SEASON], seed=seed)
+    players = league.get_players(SEASON)
+    first_date = datetime.date(2017, 10, 17)
+    rows = []
+    for i in range(num_rows):
+        player = players[i % len(players)]
+        game_date = first_date + datetime.timedelta(days=i // len(players) % 170)
+        rows.append([SEASON, player.player_id, player.player_name, player.team_id, '00217{:05d}'.format(i),
+                     game_date.strftime('%b %d, %Y').upper(), 'T00 vs. T01', rng.choice('WL')] +
+                    synthetic.make_player_box_score(rng, player))
+    return NBAResponse({'resultSets': [synthetic.make_result_set('PlayerGameLogs', PLAYER_LOG_HEADERS, rows)]}, 0)
+
+
+def make_api_requests(num_api_requests):
+    return [PLAYER_LOGS_API_REQUEST.format(PLAYER_ID=200000 + i, SEASON=SEASON) for i in range(num_api_requests)]
+
+
+def bench_generate_api_requests(n):
+    QUERY_PARAM_VALUES['{SEASON}'] = [SEASON]
+    QUERY_PARAM_VALUES['{PLAYER_ID}'] = {SEASON: list(range(200000, 200000 + n))}
+    fillable_api_request = FillableAPIRequest(PLAYER_LOGS_API_REQUEST, False)
+
+    def run():
+        for _ in fillable_api_request.generate_api_requests():
+            pass
+
+    return None, run
+
+
+def bench_extract_used_columns(n):
+    nba_response = make_player_log_response(n)
+    desired_column_headers = db.store.filter_column_headers(nba_response.headers, IGNORE_KEYS)
+
+    def run():
+        db.store.extract_used_columns([nba_response], desired_column_headers)
+
+    return None, run
+
+
+def bench_format_date_columns(n):
+    """
+    Projects every column of the rows while formatting their dates.
+    """
+    nba_response = make_player_log_response(n)
+
+    def run():
+        projected_rows = db.store.ProjectedRows(nba_response, nba_response.headers)
+        db.store.format_date_columns(nba_response.headers, projected_rows)
+        for _ in projected_rows:
+            pass
+
+    return None, run
+
+
+def bench_format_date(n):
+    dates = [row[PLAYER_LOG_HEADERS.index('GAME_DATE')] for row in make_player_log_response(n).rows]
+
+    def run():
+        for date in dates:
+            scrape.utils.format_date(date)
+
+    return None, run
+
+
+def bench_decode_result_set(n):
+    """
+    Decodes the json body of a response of player logs
+    with the decoder in CONFIG['JSON_DECODER'].
+    """
+    nba_response = make_player_log_response(n)
+    body = json.dumps({'resultSets': [{'name': 'PlayerGameLogs', 'headers': nba_response.headers,
+                                       'rowSet': nba_response.rows}]}).encode('utf-8')
+
+    def run():
+        scrape.json_decoder.decode_result_set(body, 0)
+
+    return None, run
+
+
+def bench_add_rows_to_table(n):
+    nba_response = make_player_log_response(n)
+    headers = db.store.filter_column_headers(nba_response.headers, IGNORE_KEYS)
+    projected_rows = db.store.ProjectedRows(nba_response, headers)
+    db.store.format_date_columns(headers, projected_rows)
+    rows = list(projected_rows)
+
+    def setup():
+        db.utils.execute_sql('DROP TABLE IF EXISTS bench_player_logs;')
+        db.schema_catalog.clear()
+        db.store.initialize_table_if_not_exists('bench_player_logs', headers, rows, ['PLAYER_ID', 'GAME_ID'])
+
+    def run():
+        with db.utils.transaction():
+            db.store.add_rows_to_table('bench_player_logs', headers, rows)
+
+    return setup, run
+
+
+def bench_already_scraped(n):
+    """
+    Half of the api requests have been scraped.
+    """
+    api_requests = make_api_requests(n)
+    with db.utils.transaction():
+        for api_request in api_requests[::2]:
+            db.request_logger.log_request(api_request, 'bench_player_logs')
+
+    def setup():
+        db.request_logger.clear_scraped_requests_cache()
+
+    def run():
+        for api_request in api_requests:
+            db.request_logger.already_scraped(api_request, 'bench_player_logs')
+
+    return setup, run
+
+
+def bench_already_scraped_without_table(n):
+    """
+    Like bench_already_scraped, but every check queries "scrape_log".
+    """
+    api_requests = make_api_requests(n)
+    with db.utils.transaction():
+        for api_request in api_requests[::2]:
+            db.request_logger.log_request(api_request, 'bench_player_logs')
+
+    def run():
+        for api_request in api_requests:
+            db.request_logger.already_scraped(api_request)
+
+    return None, run
+
+
+def bench_store_nba_responses(n):
+    """
+    Stores a season of player logs with the SEASON and DATE_TO
+    primary keys added from the query params, like a playergamelogs
+    job does, into an existing table.
+    """
+    rows = make_player_log_response(n).rows
+    nba_responses = []
+
+    def setup():
+        db.utils.execute_sql('DROP TABLE IF EXISTS bench_player_logs;')
+        db.schema_catalog.clear()
+        nba_responses[:] = [NBAResponse({'resultSets': [{'headers': PLAYER_LOG_HEADERS,
+                                                         'rowSet': [list(row) for row in rows]}]}, 0)
+                            for _ in range(2)]
+        # the first response creates the table
+        scrape.scraper.add_primary_key_columns(nba_responses[0], {'SEASON': SEASON, 'DATE_TO': '10/17/2017'},
+                                               ['SEASON', 'DATE_TO'])
+        db.store.store_nba_response('bench_player_logs', nba_responses[0], ['PLAYER_ID', 'GAME_ID', 'SEASON'],
+                                    IGNORE_KEYS)
+        db.utils.execute_sql('DELETE FROM bench_player_logs;')
+
+    def run():
+        scrape.scraper.add_primary_key_columns(nba_responses[1], {'SEASON': SEASON, 'DATE_TO': '10/17/2017'},
+                                               ['SEASON', 'DATE_TO'])
+        db.store.store_nba_response('bench_player_logs', nba_responses[1], ['PLAYER_ID', 'GAME_ID', 'SEASON'],
+                                    IGNORE_KEYS)
+
+    return setup, run
+
+
+def _store_player_logs(n):
+    setup, run = bench_add_rows_to_table(n)
+    setup()
+    run()
+
+
+def bench_db_query(n):
+    _store_player_logs(n)
+
+    def run():
+        db.retrieve.db_query("""SELECT * FROM bench_player_logs ORDER BY PLAYER_ID, GAME_DATE;""")
+
+    return None, run
+
+
+def bench_df_to_csv(n):
+    _store_player_logs(n)
+    df = db.retrieve.db_query("""SELECT * FROM bench_player_logs ORDER BY PLAYER_ID, GAME_DATE;""")
+    # next to the temporary database
+    csv_output_path = os.path.join(CONFIG['DB_PATH'], 'csv')
+
+    def run():
+        db.retrieve.df_to_csv(df, 'bench_player_logs', csv_output_path=csv_output_path)
+
+    return None, run
+
+
+BENCHMARKS = {
+    'generate_api_requests': bench_generate_api_requests,
+    'extract_used_columns': bench_extract_used_columns,
+    'format_date_columns': bench_format_date_columns,
+    'format_date': bench_format_date,
+    'decode_result_set': bench_decode_result_set,
+    'add_rows_to_table': bench_add_rows_to_table,
+    'store_nba_responses': bench_store_nba_responses,
+    'already_scraped': bench_already_scraped,
+    'already_scraped_without_table': bench_already_scraped_without_table,
+    'db_query': bench_db_query,
+    'df_to_csv': bench_df_to_csv,
+}
+
+
+def run_benchmark(name, size, repeat):
+    """
+    Runs a benchmark in a fresh temporary database and returns its
+    results. The size is a key of SIZES or a number of inputs.
+    """
+    n = SIZES[size] if size in SIZES else int(size)
+    db_path, db_name = CONFIG['DB_PATH'], CONFIG['DB_NAME']
+    with tempfile.TemporaryDirectory() as tmp_path:
+        CONFIG['DB_PATH'] = tmp_path
+        CONFIG['DB_NAME'] = 'bench'
+        db.request_logger.clear_scraped_requests_cache()
+        db.schema_catalog.clear()
+        QUERY_PARAM_VALUES.clear()
+        try:
+            with db.utils.connection():
+                db.initialize.init_db()
+                setup, run = BENCHMARKS[name](n)
+                times = []
+                for _ in range(repeat):
+                    if setup is not None:
+                        setup()
+                    start_time = time.perf_counter()
+                    run()
+                    times.append(time.perf_counter() - start_time)
+        finally:
+            CONFIG['DB_PATH'], CONFIG['DB_NAME'] = db_path, db_name
+            db.request_logger.clear_scraped_requests_cache()
+            db.schema_catalog.clear()
+            QUERY_PARAM_VALUES.clear()
+    return {'n': n, 'repeat': repeat, 'min': min(times), 'median': statistics.median(times),
+            'per_sec': n / min(times)}
+
+
+def run_benchmarks(names, sizes, repeat):
+    """
+    Returns a report of the results of every benchmark at every size,
+    keyed by "<benchmark>/<size>".
+    """
+    results = {}
+    for name in names:
+        for size in sizes:
+            results['{}/{}'.format(name, size)] = run_benchmark(name, size, repeat)
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'sqlite_profile': CONFIG['SQLITE_PROFILE'],
+        },
+        'results': results,
+    }
+
+
+def find_regressions(report, baseline, threshold, min_delta=0.001):
+    """
+    Returns a list of (benchmark, baseline time, time) tuples of the
+    benchmarks whose minimum time is more than threshold (a fraction)
+    and more than min_delta seconds slower than in the baseline.
+
+    >>> find_regressions({'results': {'a/small': {'min': 0.5}, 'b/small': {'min': 0.2}}},
+    ...                  {'results': {'a/small': {'min': 0.3}, 'b/small': {'min': 0.19}}}, 0.25)
+    [('a/small', 0.3, 0.5)]
+    """
+    regressions = []
+    for key, result in sorted(report['results'].items()):
+        if key not in baseline['results']:
+            continue
+        baseline_time = baseline['results'][key]['min']
+        if result['min'] > baseline_time * (1 + threshold) and result['min'] - baseline_time > min_delta:
+            regressions.append((key, baseline_time, result['min']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the ingest and retrieval hot paths.')
+    parser.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS.keys()), default=list(BENCHMARKS.keys()))
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES.keys()), default=list(SIZES.keys()))
+    parser.add_argument('--repeat', type=int, default=5, help='number of times each benchmark is run')
+    parser.add_argument('--output', help='path to write the json report to')
+    parser.add_argument('--baseline', help='path of a json report to compare against')
+    parser.add_argument('--save_baseline', help='path to save the json report to as a baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='fraction by which a benchmark has to be slower than its baseline to be a regression')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.benchmarks, args.sizes, args.repeat)
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+
+    print('{:<42}{:>10}{:>12}{:>12}{:>14}{:>10}'.format('benchmark', 'n', 'min (s)', 'median (s)', 'per sec',
+                                                      'change'))
+    for key, result in report['results'].items():
+        change = ''
+        if baseline is not None and key in baseline['results']:
+            change = '{:+.0%}'.format(result['min'] / baseline['results'][key]['min'] - 1)
+        print('{:<42}{:>10}{:>12.4f}{:>12.4f}{:>14.0f}{:>10}'.format(key, result['n'], result['min'], result['median'],
+                                                                   result['per_sec'], change))
+
+    for path in (args.output, args.save_baseline):
+        if path is not None:
+            if os.path.dirname(path) != '':
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+
+    if baseline is not None:
+        regressions = find_regressions(report, baseline, args.threshold)
+        for key, baseline_time, min_time in regressions:
+            print('Regression: {} took {:.4f} s (baseline {:.4f} s)'.format(key, min_time, baseline_time))
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
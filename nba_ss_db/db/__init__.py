@@ -1 +1 @@
-from . import initialize, request_logger, retrieve, store, utils
+from . import initialize, request_logger, retrieve, schema_catalog, store, utils, batch_writer, merge, scrape_queue
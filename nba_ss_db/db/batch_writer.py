@@ -0,0 +1,117 @@
+"""
+Buffers scraped responses and writes them to the database
+in batches.
+
+Every batch is written in one transaction together with the
+scrape_log entries of the api requests the responses came from,
+so a response is never stored without being logged (or the reverse).
+"""
+import sys
+import time
+from collections import OrderedDict
+from .. import db, metrics, CONFIG
+
+
+class BatchWriter():
+    """
+    Buffers nba responses until CONFIG['BATCH_MAX_ROWS'] rows,
+    roughly CONFIG['BATCH_MAX_BYTES'] bytes or responses older
+    than CONFIG['BATCH_MAX_SECONDS'] seconds are buffered and then
+    stores and logs all of them at once.
+
+    Used as a context manager, any buffered responses are
+    written on exit:
+
+    with BatchWriter() as batch_writer:
+        batch_writer.add(data_name, nba_response, api_request, primary_keys)
+    """
+
+    def __init__(self, max_rows=None, max_bytes=None, max_seconds=None):
+        self.max_rows = CONFIG['BATCH_MAX_ROWS'] if max_rows is None else max_rows
+        self.max_bytes = CONFIG['BATCH_MAX_BYTES'] if max_bytes is None else max_bytes
+        self.max_seconds = CONFIG['BATCH_MAX_SECONDS'] if max_seconds is None else max_seconds
+
+        # maps (data_name, headers, primary_keys, ignore_keys) to a list of responses
+        self._responses = OrderedDict()
+        # list of (api_request, data_name) tuples to log
+        self._api_requests = []
+        self._num_rows = 0
+        self._num_bytes = 0
+        self._first_add_time = None
+
+    def add(self, data_name: str, nba_response, api_request: str, primary_keys=(), ignore_keys=set()):
+        """
+        Buffers a response to be stored into the table data_name
+        and the api_request it came from to be logged,
+        writing the buffer if it is full.
+        """
+        self.add_all(api_request, [(data_name, nba_response, primary_keys, ignore_keys)])
+
+    def add_all(self, api_request: str, responses):
+        """
+        Buffers the responses to one api_request for several tables
+        (a list of (data_name, nba_response, primary_keys, ignore_keys)
+        tuples) so that all of them are written in the same batch.
+        """
+        for data_name, nba_response, primary_keys, ignore_keys in responses:
+            if len(nba_response) != 0:
+                key = (data_name, tuple(nba_response.headers), tuple(primary_keys), frozenset(ignore_keys))
+                self._responses.setdefault(key, []).append(nba_response)
+                self._num_rows += len(nba_response)
+                self._num_bytes += _estimate_size(nba_response)
+            self._api_requests.append((api_request, data_name))
+
+        if self._first_add_time is None:
+            self._first_add_time = time.time()
+
+        if self.is_full():
+            self.flush()
+
+    def is_full(self):
+        return (self._num_rows >= self.max_rows
+                or self._num_bytes >= self.max_bytes
+                or (self._first_add_time is not None
+                    and time.time() - self._first_add_time >= self.max_seconds))
+
+    def flush(self):
+        """
+        Stores every buffered response and logs every buffered
+        api request in one transaction.
+        """
+        if len(self._api_requests) == 0:
+            return
+
+        # lock the database up front so that a transaction which read the
+        # schema doesn't fail to write when another process writes first
+        with metrics.timer('batch_write_seconds'), db.utils.transaction(immediate=True):
+            for (data_name, _, primary_keys, ignore_keys), nba_responses in self._responses.items():
+                db.store.store_nba_responses(data_name, nba_responses, primary_keys, set(ignore_keys))
+            for api_request, data_name in self._api_requests:
+                db.request_logger.log_request(api_request, data_name)
+
+        self._responses.clear()
+        self._api_requests.clear()
+        self._num_rows = 0
+        self._num_bytes = 0
+        self._first_add_time = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # the buffered responses are complete even if something else failed
+        self.flush()
+
+
+def _estimate_size(nba_response):
+    """
+    Returns a rough estimate of the number of bytes
+    taken up by the rows of the nba_response.
+    """
+    if len(nba_response) == 0:
+        return 0
+    first_row = nba_response.row_set[0]
+    row_size = sys.getsizeof(first_row) + sum(sys.getsizeof(value) for value in first_row)
+    # the added columns are stored once per response
+    constants_size = sum(sys.getsizeof(value) for value in nba_response.constant_values)
+    return row_size * len(nba_response) + constants_size
@@ -1,14 +1,65 @@
 """
 Initializes the database and adds a table called "scrape_log"
 detailing when requests were made for logging purposes and
-to prevent double scraping.
+to prevent double scraping, as well as the "scrape_queue" table
+used by queue workers.
 """
 
-from . import utils
+from . import utils, request_logger
 
 def init_db():
     """
     Creates a database with the given name and creates
-    the "scrape_log" table.
+    the "scrape_log" table, migrating it from the old
+    format if needed, and the "scrape_queue" table.
     """
-    utils.execute_sql("""CREATE TABLE IF NOT EXISTS scrape_log (date text, api_request text, table_name text);""")
+    if 'scrape_log' in utils.get_table_names() and request_logger.is_old_scrape_log():
+        request_logger.migrate_scrape_log()
+    create_scrape_log_tables()
+    create_scrape_queue_tables()
+
+
+def create_scrape_log_tables(con=None):
+    """
+    Creates the "scrape_log" table which is keyed by the hash
+    of a request and the id of the table it was stored in,
+    and the "scrape_log_tables" table which maps table ids to names.
+    """
+    utils.execute_sql("""CREATE TABLE IF NOT EXISTS scrape_log (
+                             request_hash INTEGER NOT NULL,
+                             table_id INTEGER NOT NULL,
+                             scraped_at INTEGER NOT NULL,
+                             PRIMARY KEY (request_hash, table_id)) WITHOUT ROWID;""", con)
+    utils.execute_sql("""CREATE TABLE IF NOT EXISTS scrape_log_tables (
+                             table_id INTEGER PRIMARY KEY,
+                             table_name TEXT UNIQUE);""", con)
+
+
+def create_scrape_queue_tables(con=None):
+    """
+    Creates the "scrape_queue" table which holds api requests
+    waiting to be scraped by queue workers, the
+    "scrape_queue_jobs" table which holds the job (an entry of
+    an api requests yaml file) each api request belongs to and the
+    "scrape_queue_deferred_jobs" table which holds the jobs whose
+    api requests are queued once the jobs they depend on are done.
+    """
+    utils.execute_sql("""CREATE TABLE IF NOT EXISTS scrape_queue_jobs (
+                             data_name TEXT PRIMARY KEY,
+                             job TEXT NOT NULL);""", con)
+    utils.execute_sql("""CREATE TABLE IF NOT EXISTS scrape_queue (
+                             queue_id INTEGER PRIMARY KEY,
+                             api_request TEXT NOT NULL,
+                             data_name TEXT NOT NULL,
+                             query_params TEXT NOT NULL,
+                             state TEXT NOT NULL,
+                             lease_owner TEXT,
+                             lease_expires_at INTEGER,
+                             attempts INTEGER NOT NULL DEFAULT 0,
+                             UNIQUE (data_name, api_request));""", con)
+    utils.execute_sql("""CREATE TABLE IF NOT EXISTS scrape_queue_deferred_jobs (
+                             data_name TEXT PRIMARY KEY,
+                             job TEXT NOT NULL,
+                             is_daily INTEGER NOT NULL,
+                             depends_on TEXT NOT NULL);""", con)
+    utils.execute_sql("""CREATE INDEX IF NOT EXISTS scrape_queue_state ON scrape_queue (state, lease_expires_at);""", con)
@@ -0,0 +1,75 @@
+"""
+Merges the tables of other databases (such as the databases
+written by each shard of a sharded scrape) into the current one.
+"""
+from .. import db, CONFIG
+
+
+# the queue of a database is only meaningful to the workers using that database
+QUEUE_TABLE_NAMES = {'scrape_queue', 'scrape_queue_jobs', 'scrape_queue_deferred_jobs'}
+
+
+def merge_databases(db_paths):
+    """
+    Copies every table of the databases at the given paths
+    into the current database.
+
+    Tables that don't exist yet are created with the same
+    declaration. Rows that are already stored are kept
+    (or replaced if CONFIG['IGNORE_DUPLICATES'] is False) and
+    "scrape_log" keeps the latest time each request was scraped.
+    The scrape queue of each database is not merged.
+    """
+    for db_path in db_paths:
+        print('Merging {}'.format(db_path))
+        con = db.utils.get_db_connection()
+        # ATTACH can't be run inside of a transaction
+        db.utils.commit(con)
+        con.execute("""ATTACH DATABASE ? AS merged_db;""", (db_path, ))
+        try:
+            with db.utils.transaction():
+                merge_attached_database(con)
+        finally:
+            con.execute("""DETACH DATABASE merged_db;""")
+    db.request_logger.clear_scraped_requests_cache()
+    db.schema_catalog.clear()
+
+
+def merge_attached_database(con):
+    """
+    Copies every table of the database attached as "merged_db"
+    into the main database of the connection.
+    """
+    tables = con.execute("""SELECT name, sql FROM merged_db.sqlite_master
+                            WHERE type = 'table' AND name NOT LIKE 'sqlite_%';""").fetchall()
+    for table_name, create_table_sql in tables:
+        if table_name == 'scrape_log':
+            con.execute("""INSERT INTO main.scrape_log SELECT * FROM merged_db.scrape_log WHERE TRUE
+                           ON CONFLICT (request_hash, table_id) DO UPDATE
+                           SET scraped_at = MAX(scraped_at, excluded.scraped_at);""")
+        elif table_name == 'scrape_log_tables':
+            con.execute("""INSERT OR IGNORE INTO main.scrape_log_tables SELECT * FROM merged_db.scrape_log_tables;""")
+        elif table_name in QUEUE_TABLE_NAMES:
+            continue
+        else:
+            # the catalog can't be used since unqualified lookups also find the attached tables
+            if len(con.execute("""SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = ?;""",
+                               (table_name, )).fetchall()) == 0:
+                con.execute(create_table_sql)
+            merge_table(con, table_name)
+
+
+def merge_table(con, table_name: str):
+    """
+    Copies the rows of the table in "merged_db" into the table
+    of the same name in the main database. Only the columns that
+    both tables have are copied.
+    """
+    main_column_names = [column[1] for column in con.execute("""PRAGMA main.table_info({});""".format(table_name))]
+    merged_column_names = [column[1] for column in con.execute("""PRAGMA merged_db.table_info({});""".format(table_name))]
+    column_names = ', '.join([column_name for column_name in merged_column_names if column_name in main_column_names])
+    if CONFIG['IGNORE_DUPLICATES']:
+        sql_statement = """INSERT OR IGNORE INTO main.{0} ({1}) SELECT {1} FROM merged_db.{0};"""
+    else:
+        sql_statement = """INSERT OR REPLACE INTO main.{0} ({1}) SELECT {1} FROM merged_db.{0};"""
+    con.execute(sql_statement.format(table_name, column_names))
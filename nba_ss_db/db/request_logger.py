@@ -1,5 +1,63 @@
+"""
+Logs which api requests have been scraped into the table
+"scrape_log" so that they aren't scraped again.
+
+Each entry is keyed by a 64 bit hash of the canonical api request
+and the id of the table it was stored in. The table ids are
+mapped to table names in "scrape_log_tables".
+"""
+import hashlib
+import time
 from datetime import datetime
-from .. import db
+from .. import db, metrics
+from ..scrape.utils import canonicalize_api_request
+
+
+# format of the date column of the old "scrape_log" table
+OLD_SCRAPE_LOG_DATE_FORMAT = '%Y-%m-%d %X %f'
+
+# maps (db path, table name) to the set of request hashes logged for the table in that database
+SCRAPED_REQUESTS = {}
+
+# (db path, table name) tuples of the tables that are known to be in "scrape_log_tables"
+REGISTERED_TABLE_NAMES = set()
+
+
+def _hash_str(s: str):
+    """
+    Returns a signed 64 bit integer hash of s which
+    fits into a sqlite INTEGER column.
+    """
+    return int.from_bytes(hashlib.sha1(s.encode('utf-8')).digest()[:8], 'big', signed=True)
+
+
+def get_request_hash(api_request: str):
+    """
+    Returns the hash that the api_request is logged under.
+    Requests that only differ in the order of their query
+    parameters or in their scheme share the same hash.
+
+    >>> get_request_hash('http://stats.nba.com/stats/leaguegamelog?Season=2017-18&Counter=1000') == \
+        get_request_hash('https://stats.nba.com/stats/leaguegamelog?Counter=1000&Season=2017-18')
+    True
+    """
+    return _hash_str(canonicalize_api_request(api_request))
+
+
+def get_table_id(table_name: str):
+    """
+    Returns the id that requests for the table are logged under,
+    registering the table in "scrape_log_tables" if needed.
+
+    Ids are derived from the table name so that they are the
+    same in every database.
+    """
+    table_id = _hash_str(table_name)
+    key = (db.utils.get_db_path(), table_name)
+    if key not in REGISTERED_TABLE_NAMES:
+        db.utils.execute_sql("""INSERT OR IGNORE INTO scrape_log_tables VALUES (?, ?);""", params=(table_id, table_name))
+        REGISTERED_TABLE_NAMES.add(key)
+    return table_id
 
 
 def log_request(api_request, table_name):
@@ -7,24 +65,114 @@ def log_request(api_request, table_name):
     Logs the api_request with a time stamp to the table
     called "scrape_log".
     """
-    curr_time = datetime.now().strftime('%Y-%m-%d %X %f')
-    db.utils.execute_sql("""INSERT INTO scrape_log VALUES (?, ?, ?);""", params=(curr_time, api_request, table_name))
+    with metrics.timer('log_request_seconds', job=table_name):
+        request_hash = get_request_hash(api_request)
+        db.utils.execute_sql("""INSERT OR REPLACE INTO scrape_log VALUES (?, ?, ?);""",
+                             params=(request_hash, get_table_id(table_name), int(time.time())))
+        key = (db.utils.get_db_path(), table_name)
+        if key in SCRAPED_REQUESTS:
+            SCRAPED_REQUESTS[key].add(request_hash)
+
 
-def already_scraped(api_request):
+def already_scraped(api_request, table_name=None):
     """
     Returns True if the api_request has already been scraped.
-    This is determined by whether or not the api_request str
-    exists within the table "scrape_log.
+    This is determined by whether or not the hash of the api_request
+    exists within the table "scrape_log".
+
+    If a table_name is given, only requests logged for that table
+    are considered and the check is made against the in-memory
+    set of scraped requests (see get_scraped_request_hashes).
     """
-    api_request_log = db.utils.execute_sql("""SELECT * FROM scrape_log WHERE api_request = ? LIMIT 1;""", params=(api_request, ))
+    request_hash = get_request_hash(api_request)
+    if table_name is not None:
+        return request_hash in get_scraped_request_hashes(table_name)
+
+    api_request_log = db.utils.execute_sql("""SELECT 1 FROM scrape_log WHERE request_hash = ? LIMIT 1;""", params=(request_hash, ))
     return len(api_request_log.rows) != 0
 
 
+def get_scraped_request_hashes(table_name):
+    """
+    Returns the set of hashes of api requests that have been
+    logged for the table with the given name.
+
+    The set is loaded from "scrape_log" once and kept up to date
+    as new requests are logged, so checking whether each request
+    of a job has already been scraped doesn't query the database.
+    Every database (Ex. the database of each shard) has its own set.
+    """
+    key = (db.utils.get_db_path(), table_name)
+    if key not in SCRAPED_REQUESTS:
+        scraped_requests = db.utils.execute_sql("""SELECT request_hash FROM scrape_log WHERE table_id = ?;""",
+                                                params=(get_table_id(table_name), )).rows
+        SCRAPED_REQUESTS[key] = {request_hash for request_hash, in scraped_requests}
+    return SCRAPED_REQUESTS[key]
+
+
+def clear_scraped_requests_cache():
+    """
+    Forgets the in-memory sets of scraped requests so that
+    they are reloaded from "scrape_log" the next time they are used.
+    """
+    SCRAPED_REQUESTS.clear()
+    REGISTERED_TABLE_NAMES.clear()
+
+
 def get_last_scraped(api_request):
     """
-    Returns True if the api_request has already been scraped.
-    This is determined by whether or not the api_request str
-    exists within the table "scrape_log.
+    Returns the unix time at which the api_request was last
+    scraped or None if it has never been scraped.
+    """
+    api_request_date_query = db.utils.execute_sql("""SELECT MAX(scraped_at) FROM scrape_log WHERE request_hash = ?;""",
+                                                  params=(get_request_hash(api_request), ))
+    return api_request_date_query.rows[0][0]
+
+
+def is_old_scrape_log():
+    """
+    Returns True if "scrape_log" still has the old
+    (date text, api_request text, table_name text) format.
+    """
+    column_names = [row[1] for row in db.utils.execute_sql("""PRAGMA table_info(scrape_log);""").rows]
+    return 'api_request' in column_names
+
+
+def migrate_scrape_log():
+    """
+    Converts an old "scrape_log" table which stored the full
+    api request for every scrape into the hashed format.
+    Duplicate entries are collapsed into the latest one.
+    """
+    with db.utils.transaction() as con:
+        con.execute("""ALTER TABLE scrape_log RENAME TO scrape_log_old;""")
+        db.initialize.create_scrape_log_tables(con)
+
+        for table_name, in con.execute("""SELECT DISTINCT table_name FROM scrape_log_old;""").fetchall():
+            con.execute("""INSERT OR IGNORE INTO scrape_log_tables VALUES (?, ?);""", (_hash_str(table_name), table_name))
+
+        def migrated_rows():
+            for date, api_request, table_name in con.execute("""SELECT date, api_request, table_name FROM scrape_log_old;"""):
+                scraped_at = int(datetime.strptime(date, OLD_SCRAPE_LOG_DATE_FORMAT).timestamp())
+                yield get_request_hash(api_request), _hash_str(table_name), scraped_at
+
+        con.executemany("""INSERT INTO scrape_log VALUES (?, ?, ?)
+                           ON CONFLICT (request_hash, table_id) DO UPDATE
+                           SET scraped_at = MAX(scraped_at, excluded.scraped_at);""", list(migrated_rows()))
+        con.execute("""DROP TABLE scrape_log_old;""")
+    clear_scraped_requests_cache()
+
+
+def compact_scrape_log():
+    """
+    Shrinks "scrape_log" as much as possible by migrating it
+    from the old format if needed (which collapses duplicate entries),
+    removing table ids that no longer have any entries and
+    rebuilding the database file.
     """
-    api_request_date_query = db.utils.execute_sql("""SELECT MAX(date) FROM scrape_log WHERE api_request = ?;""", params=(api_request, ))
-    return api_request_date_query.rows[0][0]
\ No newline at end of file
+    if is_old_scrape_log():
+        migrate_scrape_log()
+    db.utils.execute_sql("""DELETE FROM scrape_log_tables
+                            WHERE table_id NOT IN (SELECT DISTINCT table_id FROM scrape_log);""")
+    clear_scraped_requests_cache()
+    db.utils.execute_sql("""VACUUM;""")
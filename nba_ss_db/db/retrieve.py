@@ -50,6 +50,14 @@ def fetch_game_ids():
     return game_ids_by_season
 
 
+def fetch_game_dates_by_game_id():
+    """
+    Returns a mapping of game id to the date of the game.
+    """
+    game_id_game_date_tuples = db.utils.execute_sql("""SELECT GAME_ID, MAX(GAME_DATE) FROM games GROUP BY GAME_ID;""").rows
+    return dict(game_id_game_date_tuples)
+
+
 def retrieve_player_logs():
     """
     Utility function to fetch player_logs as a pandas df.
@@ -87,12 +95,10 @@ def exists_table(table_name: str):
     """
     Returns True if there already exists a table with this name.
     """
-    try:
-        # if this errors, then there was not a table with this name
-        db.utils.execute_sql("""SELECT * FROM {} LIMIT 1;""".format(table_name))
-        return True
-    except:
-        return False
+    return len(db.utils.execute_sql("""SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?
+                                       UNION ALL
+                                       SELECT name FROM sqlite_temp_master WHERE type = 'table' AND name = ?;""",
+                                    params=(table_name, table_name)).rows) != 0
 
 
 def get_table_names(only_data=True):
@@ -101,7 +107,7 @@ def get_table_names(only_data=True):
     If only_data is False, then all table names are returned
     including tables such as scrape_log and player_ids.
     """
-    EXCLUDE_TABLES = {'scrape_log', 'player_ids'}
+    EXCLUDE_TABLES = {'scrape_log', 'scrape_log_tables', 'player_ids'} | db.merge.QUEUE_TABLE_NAMES
     table_names = [table_name for table_name in db.utils.get_table_names()
                    if (not only_data or table_name not in EXCLUDE_TABLES)]
     return table_names
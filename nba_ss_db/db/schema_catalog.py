@@ -0,0 +1,165 @@
+"""
+An in-process catalog of the tables in the database.
+
+The catalog is loaded from sqlite_master once and updated as
+tables are created, so storing a response doesn't need to probe
+the database to find out whether its table exists. It also caches
+which columns of a response are stored for each response signature
+(its headers and the keys to ignore).
+"""
+import operator
+import threading
+from .. import db, CONFIG
+
+
+class TableSchema():
+    """
+    The column names (in order) and sqlite types of a table.
+    """
+
+    def __init__(self, table_name: str, column_names, column_types):
+        self.table_name = table_name
+        self.column_names = list(column_names)
+        self.column_types = list(column_types)
+
+    def __str__(self):
+        return '{} ({})'.format(self.table_name, ', '.join(
+            '{} {}'.format(name, col_type) for name, col_type in zip(self.column_names, self.column_types)))
+
+
+# maps a db path to a dictionary of table name to TableSchema
+SCHEMAS = {}
+
+# maps (headers, ignore_keys) to the headers that are stored
+PROJECTIONS = {}
+
+# maps (headers, desired_headers) to the indicies of the desired headers
+COLUMN_INDICIES = {}
+
+# maps (headers, number of row columns, desired_headers) to a RowProjection
+ROW_PROJECTIONS = {}
+
+_catalog_lock = threading.Lock()
+
+
+def _get_schemas():
+    """
+    Returns the schemas of the current database,
+    loading them from sqlite_master the first time.
+    """
+    db_path = db.utils.get_db_path()
+    with _catalog_lock:
+        if db_path not in SCHEMAS:
+            schemas = {}
+            table_names = db.utils.get_table_names()
+            for table_name in table_names:
+                schemas[table_name] = _load_table_schema(table_name)
+            SCHEMAS[db_path] = schemas
+        return SCHEMAS[db_path]
+
+
+def _load_table_schema(table_name: str):
+    table_info = db.utils.execute_sql("""PRAGMA table_info({});""".format(table_name)).rows
+    if len(table_info) == 0:
+        return None
+    return TableSchema(table_name, [column[1] for column in table_info], [column[2] for column in table_info])
+
+
+def get_table_schema(table_name: str):
+    """
+    Returns the TableSchema of the table or None if it doesn't exist.
+
+    Tables created outside of db.store (which don't update
+    the catalog) are looked up when they are first asked for.
+    """
+    schemas = _get_schemas()
+    if table_name not in schemas:
+        table_schema = _load_table_schema(table_name)
+        if table_schema is None:
+            return None
+        schemas[table_name] = table_schema
+    return schemas[table_name]
+
+
+def exists_table(table_name: str):
+    return get_table_schema(table_name) is not None
+
+
+def register_table(table_name: str, column_names, column_types):
+    """
+    Adds a newly created table to the catalog.
+    """
+    _get_schemas()[table_name] = TableSchema(table_name, column_names, column_types)
+
+
+def clear():
+    """
+    Forgets every table so that the catalog is reloaded
+    from the database the next time it is used.
+    """
+    with _catalog_lock:
+        SCHEMAS.clear()
+
+
+def get_projection(headers, ignore_keys):
+    """
+    Returns the list of headers of a response with the given
+    headers which are stored (every header that isn't in
+    ignore_keys or CONFIG['GLOBAL_IGNORE_KEYS']).
+    """
+    signature = (tuple(headers), frozenset(ignore_keys))
+    if signature not in PROJECTIONS:
+        combined_ignore_keys = set(ignore_keys) | set(CONFIG['GLOBAL_IGNORE_KEYS'])
+        PROJECTIONS[signature] = [header for header in headers if header not in combined_ignore_keys]
+    return PROJECTIONS[signature]
+
+
+def get_column_indicies(headers, desired_headers):
+    """
+    Returns the index in headers of every header in desired_headers.
+    Raises a ValueError if one of them is missing.
+    """
+    signature = (tuple(headers), tuple(desired_headers))
+    if signature not in COLUMN_INDICIES:
+        COLUMN_INDICIES[signature] = [headers.index(header) for header in desired_headers]
+    return COLUMN_INDICIES[signature]
+
+
+class RowProjection():
+    """
+    Picks the desired columns out of the rows of responses with
+    the same headers, where the headers after the first
+    num_row_columns are constant columns (see NBAResponse.add_col).
+
+    project(row) returns a tuple of the desired row columns, which
+    are followed by the constant values at constant_indicies.
+    """
+
+    def __init__(self, row_indicies, constant_indicies):
+        self.row_indicies = row_indicies
+        self.constant_indicies = constant_indicies
+        if len(row_indicies) == 0:
+            self.project = lambda row: ()
+        elif len(row_indicies) == 1:
+            # itemgetter only returns a tuple for several indicies
+            i = row_indicies[0]
+            self.project = lambda row: (row[i], )
+        else:
+            self.project = operator.itemgetter(*row_indicies)
+
+
+def get_row_projection(headers, num_row_columns, desired_headers):
+    """
+    Returns the RowProjection of the desired headers out of
+    responses with the given headers. Raises a ValueError if
+    one of them is missing or they are out of order.
+    """
+    signature = (tuple(headers), num_row_columns, tuple(desired_headers))
+    if signature not in ROW_PROJECTIONS:
+        column_indicies = get_column_indicies(headers, desired_headers)
+        if column_indicies != sorted(column_indicies):
+            raise ValueError('Desired headers are not in the order of the headers.')
+        row_indicies = [i for i in column_indicies if i < num_row_columns]
+        constant_indicies = [i - num_row_columns for i in column_indicies if i >= num_row_columns]
+        ROW_PROJECTIONS[signature] = RowProjection(row_indicies, constant_indicies)
+    return ROW_PROJECTIONS[signature]
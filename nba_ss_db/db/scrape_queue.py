@@ -0,0 +1,229 @@
+"""
+A work queue of api requests stored in the table "scrape_queue"
+so that any number of worker processes can share a scrape.
+
+Workers claim batches of api requests by leasing them for
+CONFIG['QUEUE_LEASE_TIME'] seconds. A worker renews the leases of its
+batch while it is scraping it. An api request whose lease expired
+(because its worker crashed or hung) can be claimed again by
+another worker, so a scrape resumes where it left off. A worker
+can only mark the api requests it still holds the lease of as done.
+
+Jobs whose fillables are read from tables stored by other jobs
+(Ex. {GAME_ID} jobs and the "games" job) are deferred until the
+api requests of those jobs are done, since their api requests
+can't be listed before then.
+"""
+import json
+import time
+from .. import db, CONFIG
+from ..scrape.utils import get_job_name
+
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class QueueEntry():
+    """
+    An api request claimed from the queue.
+    """
+
+    def __init__(self, queue_id: int, api_request: str, data_name: str, query_params: dict, attempts: int,
+                 worker_id=None):
+        self.queue_id = queue_id
+        self.api_request = api_request
+        self.data_name = data_name
+        self.query_params = query_params
+        self.attempts = attempts
+        # the worker holding the lease of the api request
+        self.worker_id = worker_id
+
+    def __str__(self):
+        return 'Queue Entry {}: {} for {}'.format(self.queue_id, self.api_request, self.data_name)
+
+
+def enqueue_job(job: dict, api_requests):
+    """
+    Adds the job (an entry of an api requests yaml file) and every
+    one of its APIRequests to the queue.
+
+    Api requests that are already in the queue are left alone
+    unless they are done or failed, in which case they are
+    queued again.
+    """
+    data_name = get_job_name(job)
+
+    def queue_rows():
+        for api_request in api_requests:
+            yield api_request.api_request, data_name, json.dumps(api_request.query_params), PENDING
+
+    with db.utils.transaction() as con:
+        con.execute("""INSERT OR REPLACE INTO scrape_queue_jobs VALUES (?, ?);""",
+                    (data_name, json.dumps(job)))
+        cur = con.executemany("""INSERT INTO scrape_queue (api_request, data_name, query_params, state)
+                                 VALUES (?, ?, ?, ?)
+                                 ON CONFLICT (data_name, api_request) DO UPDATE
+                                 SET state = excluded.state, attempts = 0,
+                                     lease_owner = NULL, lease_expires_at = NULL
+                                 WHERE state IN ('done', 'failed');""", queue_rows())
+        num_enqueued = cur.rowcount
+        cur.close()
+    return num_enqueued
+
+
+def defer_job(job: dict, depends_on_jobs, is_daily=False):
+    """
+    Adds the job to the queue once every job in depends_on_jobs
+    is done (see pop_ready_jobs).
+    """
+    db.utils.execute_sql("""INSERT OR REPLACE INTO scrape_queue_deferred_jobs VALUES (?, ?, ?, ?);""",
+                         params=(get_job_name(job), json.dumps(job), int(is_daily),
+                                 json.dumps([get_job_name(depends_on_job) for depends_on_job in depends_on_jobs])))
+
+
+def pop_ready_jobs():
+    """
+    Removes the deferred jobs none of whose dependencies are
+    deferred or have api requests that are pending or leased
+    and returns them as a list of (job, is_daily) tuples.
+
+    Call it in the transaction that queues the api requests
+    of the jobs, so that each job is only queued once.
+    """
+    deferred_jobs = db.utils.execute_sql(
+        """SELECT data_name, job, is_daily, depends_on FROM scrape_queue_deferred_jobs ORDER BY rowid;""").rows
+    deferred_data_names = {data_name for data_name, _, _, _ in deferred_jobs}
+    running_data_names = {data_name for data_name, in db.utils.execute_sql(
+        """SELECT DISTINCT data_name FROM scrape_queue WHERE state IN ('pending', 'leased');""").rows}
+
+    ready_jobs = []
+    for data_name, job, is_daily, depends_on in deferred_jobs:
+        depends_on = set(json.loads(depends_on))
+        if depends_on.isdisjoint(deferred_data_names) and depends_on.isdisjoint(running_data_names):
+            db.utils.execute_sql("""DELETE FROM scrape_queue_deferred_jobs WHERE data_name = ?;""", params=(data_name, ))
+            ready_jobs.append((json.loads(job), bool(is_daily)))
+    return ready_jobs
+
+
+def has_deferred_jobs():
+    return len(db.utils.execute_sql("""SELECT 1 FROM scrape_queue_deferred_jobs LIMIT 1;""").rows) != 0
+
+
+def get_job(data_name: str):
+    """
+    Returns the job that the api requests for the table data_name
+    (or the name of a job storing several tables) were queued for.
+    """
+    job = db.utils.execute_sql("""SELECT job FROM scrape_queue_jobs WHERE data_name = ?;""", params=(data_name, )).rows
+    if len(job) == 0:
+        raise ValueError('No job was queued for: {}'.format(data_name))
+    return json.loads(job[0][0])
+
+
+def claim_batch(worker_id: str, batch_size=None, lease_time=None, max_attempts=None):
+    """
+    Leases up to batch_size (CONFIG['QUEUE_BATCH_SIZE']) pending
+    api requests or api requests whose lease expired to the worker
+    and returns them as a list of QueueEntry objects.
+
+    An api request whose lease expired after max_attempts
+    (CONFIG['QUEUE_MAX_ATTEMPTS']) attempts is marked as failed
+    instead (Ex. every worker claiming it crashed).
+
+    The batch is claimed in one write transaction, so no two
+    workers ever claim the same api request at the same time.
+    """
+    if batch_size is None:
+        batch_size = CONFIG['QUEUE_BATCH_SIZE']
+    if lease_time is None:
+        lease_time = CONFIG['QUEUE_LEASE_TIME']
+    if max_attempts is None:
+        max_attempts = CONFIG['QUEUE_MAX_ATTEMPTS']
+
+    now = int(time.time())
+    with db.utils.transaction(immediate=True) as con:
+        con.execute("""UPDATE scrape_queue SET state = ?, lease_owner = NULL, lease_expires_at = NULL
+                       WHERE state = 'leased' AND lease_expires_at < ? AND attempts >= ?;""",
+                    (FAILED, now, max_attempts))
+        rows = con.execute("""SELECT queue_id, api_request, data_name, query_params, attempts FROM scrape_queue
+                              WHERE state = 'pending' OR (state = 'leased' AND lease_expires_at < ?)
+                              ORDER BY queue_id LIMIT ?;""", (now, batch_size)).fetchall()
+        con.executemany("""UPDATE scrape_queue
+                           SET state = 'leased', lease_owner = ?, lease_expires_at = ?, attempts = attempts + 1
+                           WHERE queue_id = ?;""", [(worker_id, now + lease_time, row[0]) for row in rows])
+
+    return [QueueEntry(queue_id, api_request, data_name, json.loads(query_params), attempts + 1, worker_id)
+            for queue_id, api_request, data_name, query_params, attempts in rows]
+
+
+def renew_leases(worker_id: str, queue_ids, lease_time=None):
+    """
+    Extends the leases that the worker still holds on the api
+    requests by lease_time (CONFIG['QUEUE_LEASE_TIME']) seconds
+    from now. Returns the number of leases that were renewed.
+    """
+    if lease_time is None:
+        lease_time = CONFIG['QUEUE_LEASE_TIME']
+    lease_expires_at = int(time.time()) + lease_time
+    with db.utils.transaction() as con:
+        cur = con.executemany("""UPDATE scrape_queue SET lease_expires_at = ?
+                                 WHERE queue_id = ? AND state = 'leased' AND lease_owner = ?;""",
+                              [(lease_expires_at, queue_id, worker_id) for queue_id in queue_ids])
+        num_renewed = cur.rowcount
+        cur.close()
+    return num_renewed
+
+
+def mark_done(queue_ids, worker_id: str):
+    """
+    Marks the api requests that the worker still holds the
+    lease of as scraped. Returns the number of api requests
+    that were marked (the others were claimed by another
+    worker after the lease expired).
+    """
+    with db.utils.transaction() as con:
+        cur = con.executemany("""UPDATE scrape_queue SET state = 'done', lease_owner = NULL, lease_expires_at = NULL
+                                 WHERE queue_id = ? AND state = 'leased' AND lease_owner = ?;""",
+                              [(queue_id, worker_id) for queue_id in queue_ids])
+        num_done = cur.rowcount
+        cur.close()
+    return num_done
+
+
+def mark_failed(queue_entry, max_attempts=None):
+    """
+    Releases an api request that couldn't be scraped so that it
+    is tried again, or marks it as failed after max_attempts
+    (CONFIG['QUEUE_MAX_ATTEMPTS']) attempts. Nothing is changed if
+    the api request was claimed by another worker in the meantime.
+    """
+    if max_attempts is None:
+        max_attempts = CONFIG['QUEUE_MAX_ATTEMPTS']
+    state = FAILED if queue_entry.attempts >= max_attempts else PENDING
+    db.utils.execute_sql("""UPDATE scrape_queue SET state = ?, lease_owner = NULL, lease_expires_at = NULL
+                            WHERE queue_id = ? AND state = 'leased' AND lease_owner = ?;""",
+                         params=(state, queue_entry.queue_id, queue_entry.worker_id))
+
+
+def get_queue_stats():
+    """
+    Returns a dictionary mapping each state to the number
+    of api requests in the queue in that state.
+    """
+    return dict(db.utils.execute_sql("""SELECT state, COUNT(*) FROM scrape_queue GROUP BY state;""").rows)
+
+
+def clear_queue(only_done=False):
+    """
+    Removes every api request from the queue
+    (only those that are done if only_done is True).
+    """
+    if only_done:
+        db.utils.execute_sql("""DELETE FROM scrape_queue WHERE state = 'done';""")
+    else:
+        db.utils.execute_sql("""DELETE FROM scrape_queue WHERE TRUE;""")
+        db.utils.execute_sql("""DELETE FROM scrape_queue_jobs WHERE TRUE;""")
+        db.utils.execute_sql("""DELETE FROM scrape_queue_deferred_jobs WHERE TRUE;""")
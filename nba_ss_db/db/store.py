@@ -1,12 +1,16 @@
 """
 Handles the creation of tables and storage into tables.
 """
-from typing import List
-from .. import db, CONFIG
-from ..scrape.utils import is_proper_date_format, format_date
+import itertools
+from typing import Iterable, List
+from .. import db, metrics, CONFIG
+from ..scrape.utils import is_proper_date_format, format_dates
 
 PROTECTED_COL_NAMES = {'TO'}
 
+# a column without a declared type keeps the type of whatever value is stored in it
+UNKNOWN_COLUMN_TYPE = ''
+
 DATE_QUERY_PARAMS = {'GAME_DATE', 'DATE_TO'}
 
 
@@ -22,32 +26,128 @@ def store_nba_responses(data_name: str, l_nba_response: List, primary_keys=(), i
     """
     Stores a given list of nba responses, creating a table
     if necessary with the given data_name and primary keys.
+
+    The rows of the responses are projected (and their dates
+    formatted) one at a time as they are inserted, so they
+    aren't copied before being handed to sqlite.
     """
     if len(l_nba_response) == 0:
         raise ValueError('List of nba responses was empty.')
     
     response_columns = l_nba_response[0].headers
-    desired_column_headers = filter_column_headers(response_columns, ignore_keys)
-    extracted_rows = extract_used_columns(l_nba_response, desired_column_headers)
-    format_date_columns(desired_column_headers, extracted_rows)
+    with metrics.timer('store_seconds', job=data_name, step='filter_columns'):
+        desired_column_headers = filter_column_headers(response_columns, ignore_keys)
+    with metrics.timer('store_seconds', job=data_name, step='extract_columns'):
+        projected_responses = [ProjectedRows(nba_response, desired_column_headers)
+                               for nba_response in l_nba_response]
+    with metrics.timer('store_seconds', job=data_name, step='format_dates'):
+        for projected_rows in projected_responses:
+            format_date_columns(desired_column_headers, projected_rows)
     renamed_column_headers = map_protected_col_names(desired_column_headers)
+    rows = itertools.chain.from_iterable(projected_responses)
 
-    if db.retrieve.exists_table(data_name):
-        add_rows_to_table(data_name, renamed_column_headers, extracted_rows)
-    else:
-        create_table_with_data(data_name, renamed_column_headers, extracted_rows, primary_keys)
+    with db.utils.transaction(), metrics.timer('store_seconds', job=data_name, step='insert'):
+        if db.schema_catalog.exists_table(data_name):
+            add_rows_to_table(data_name, renamed_column_headers, rows)
+        else:
+            # the column types are found from the rows
+            create_table_with_data(data_name, renamed_column_headers, list(rows), primary_keys)
+    metrics.increment('rows_stored', sum(len(projected_rows) for projected_rows in projected_responses),
+                      job=data_name)
 
 
 def filter_column_headers(column_names, ignore_keys):
-    combined_ignore_keys = ignore_keys | set(CONFIG['GLOBAL_IGNORE_KEYS'])
-    desired_column_headers = [
-        header for header in column_names
-        if header not in combined_ignore_keys
-    ]
-    return desired_column_headers
+    return db.schema_catalog.get_projection(column_names, ignore_keys)
+
+
+class ProjectedRows():
+    """
+    The rows of an nba response with only the columns in
+    desired_column_headers, as tuples which are made one at a
+    time while iterating.
+
+    The columns added to the response with NBAResponse.add_col
+    are appended to every row as it is made, and functions given
+    to map_column are applied to a column as the rows are made
+    (or once if it is an added column).
+    """
+
+    def __init__(self, nba_response, desired_column_headers):
+        try:
+            projection = db.schema_catalog.get_row_projection(
+                nba_response.headers, len(nba_response.row_headers), desired_column_headers)
+        except ValueError:
+            raise ValueError('nba response headers are inconsistent: {} \n\n {}'.format(
+                nba_response.headers,
+                desired_column_headers
+            ))
+        self._rows = nba_response.row_set
+        self._project = projection.project
+        self._num_row_columns = len(projection.row_indicies)
+        self._constant_values = tuple(nba_response.constant_values[i] for i in projection.constant_indicies)
+        # maps the index of a row column to the function to apply to it
+        self._column_functions = {}
+
+    def get_first_value(self, column_i):
+        """
+        Returns the value of the column in the first row.
+        """
+        if column_i >= self._num_row_columns:
+            return self._constant_values[column_i - self._num_row_columns]
+        return self._project(self._rows[0])[column_i]
+
+    def get_column_values(self, column_i):
+        """
+        Returns an iterator over the values of the column
+        (before any function given to map_column is applied).
+        """
+        if column_i >= self._num_row_columns:
+            return iter([self._constant_values[column_i - self._num_row_columns]])
+        return (self._project(row)[column_i] for row in self._rows)
+
+    def map_column(self, column_i, function):
+        """
+        Replaces every value of the column with function(value).
+        """
+        if column_i >= self._num_row_columns:
+            constant_values = list(self._constant_values)
+            constant_i = column_i - self._num_row_columns
+            constant_values[constant_i] = function(constant_values[constant_i])
+            self._constant_values = tuple(constant_values)
+        elif column_i in self._column_functions:
+            previous_function = self._column_functions[column_i]
+            self._column_functions[column_i] = lambda value: function(previous_function(value))
+        else:
+            self._column_functions[column_i] = function
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        project = self._project
+        constant_values = self._constant_values
+        if len(self._column_functions) == 0:
+            if len(constant_values) == 0:
+                return map(project, self._rows)
+            return (project(row) + constant_values for row in self._rows)
+        return self._iter_mapped_rows()
+
+    def _iter_mapped_rows(self):
+        project = self._project
+        constant_values = self._constant_values
+        column_functions = list(self._column_functions.items())
+        for row in self._rows:
+            projected_row = list(project(row))
+            for column_i, function in column_functions:
+                projected_row[column_i] = function(projected_row[column_i])
+            yield tuple(projected_row) + constant_values
 
 
 def extract_used_columns(nba_responses, desired_column_headers):
+    """
+    Returns a list of the rows of every nba response with only
+    the columns in desired_column_headers.
+    """
     filtered_rows = []
     for nba_response in nba_responses:
         filtered_rows.extend(extract_used_columns_from_nba_response(
@@ -60,33 +160,25 @@ def extract_used_columns_from_nba_response(nba_response, desired_column_headers)
     Keeps all columns specified in desired_column_headers
     and returns the processed list of rows.
     """
-    try:
-        desired_column_indicies = [nba_response.headers.index(
-            header) for header in desired_column_headers]
-    except ValueError:
-        raise ValueError('nba response headers are inconsistent: {} \n\n {}'.format(
-            nba_response.headers,
-            desired_column_headers
-        ))
+    return list(ProjectedRows(nba_response, desired_column_headers))
 
-    rows = nba_response.rows
-    filtered_rows = []
-    for row in rows:
-        filtered_rows.append([row[i] for i in desired_column_indicies])
-    return filtered_rows
 
+def format_date_columns(desired_column_headers, projected_rows: ProjectedRows):
+    """
+    Formats the values of every date column (whose first value
+    isn't formatted already) as the rows are projected.
 
-def format_date_columns(desired_column_headers, rows):
+    Every distinct date of a column is formatted once up front
+    and then looked up for every row.
+    """
+    if len(projected_rows) == 0:
+        return
     for header_i, header in enumerate(desired_column_headers):
         if header in DATE_QUERY_PARAMS:
-            example_date = rows[0][header_i]
+            example_date = projected_rows.get_first_value(header_i)
             if not is_proper_date_format(example_date):
-                format_date_column(rows, header_i)
-
-
-def format_date_column(rows, header_i):
-    for row_i, row in enumerate(rows):
-        rows[row_i][header_i] = format_date(row[header_i])
+                formatted_dates = format_dates(projected_rows.get_column_values(header_i))
+                projected_rows.map_column(header_i, formatted_dates.__getitem__)
 
 
 def map_protected_col_names(column_names: List[str]):
@@ -111,12 +203,14 @@ def create_table_with_data(table_name: str, headers: List[str], rows: List[List]
 
 
 def initialize_table_if_not_exists(table_name, headers, rows, primary_keys):
-    column_sql_str = format_sql_table_column_declaration_str(headers, primary_keys, rows)
+    column_types = get_column_types(headers, rows)
+    column_sql_str = format_sql_table_column_declaration_str(headers, primary_keys, rows, column_types)
     db.utils.execute_sql("""CREATE TABLE IF NOT EXISTS {} ({});""".format(
         table_name, column_sql_str))
+    db.schema_catalog.register_table(table_name, headers, column_types)
 
 
-def format_sql_table_column_declaration_str(headers, primary_keys, rows):
+def format_sql_table_column_declaration_str(headers, primary_keys, rows, column_types=None):
     """
     Returns the string representing the declaration of columns
         in a sqlite3 table declaration which includes.
@@ -126,7 +220,8 @@ def format_sql_table_column_declaration_str(headers, primary_keys, rows):
 
     Ex. 'PLAYER_ID INT, PLAYER_NAME TEXT, PRIMARY KEY (PLAYER_ID, PLAYER_NAME)'
     """
-    column_types = get_column_types(headers, rows)
+    if column_types is None:
+        column_types = get_column_types(headers, rows)
     column_name_type_pairs = ['{} {}'.format(headers[i], column_types[i]) for i in range(len(headers))]
     column_def = ', '.join(column_name_type_pairs)
     if len(primary_keys) != 0:
@@ -138,6 +233,8 @@ def get_column_types(headers, rows: List[List]):
     """
     Returns a list of sqlite3 types defined by the
     data in the json response rows.
+
+    Columns that are None in every row get no declared type.
     """
     TYPE_MAPPING = {
         str: 'TEXT',
@@ -149,7 +246,7 @@ def get_column_types(headers, rows: List[List]):
     unknown_type_indicies = set(range(len(headers)))
     column_types = [None for _ in range(len(headers))]
     r = 0
-    while len(unknown_type_indicies) > 0:
+    while len(unknown_type_indicies) > 0 and r < len(rows):
         discovered_type_indicies = []
         for i in unknown_type_indicies:
             if rows[r][i] is not None:
@@ -158,17 +255,21 @@ def get_column_types(headers, rows: List[List]):
         for i in discovered_type_indicies:
             unknown_type_indicies.remove(i)
         r += 1
+
+    for i in unknown_type_indicies:
+        column_types[i] = UNKNOWN_COLUMN_TYPE
     return column_types
 
 
-def add_rows_to_table(table_name: str, headers: List[str], rows: List[List]):
+def add_rows_to_table(table_name: str, headers: List[str], rows: Iterable):
     """
-    Adds the rows to the table.
+    Adds the rows (any iterable of rows) to the table.
     """
+    insert_columns_sql_str = '({})'.format(', '.join(headers))
     insert_values_sql_str = '({})'.format(', '.join(['?'] * len(headers)))
     if CONFIG['IGNORE_DUPLICATES']:
-        sql_statement = """INSERT OR IGNORE INTO {} VALUES {};"""
+        sql_statement = """INSERT OR IGNORE INTO {} {} VALUES {};"""
     else:
-        sql_statement = """INSERT OR REPLACE INTO {} VALUES {};"""
+        sql_statement = """INSERT OR REPLACE INTO {} {} VALUES {};"""
 
-    db.utils.execute_many_sql(sql_statement.format(table_name, insert_values_sql_str), rows)
+    db.utils.execute_many_sql(sql_statement.format(table_name, insert_columns_sql_str, insert_values_sql_str), rows)
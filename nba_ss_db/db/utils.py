@@ -1,10 +1,33 @@
+import os
 import sqlite3
+import threading
+from contextlib import contextmanager
 import pandas as pd
-from .. import CONFIG
+from .. import metrics, CONFIG
+from . import request_logger, schema_catalog
 import datetime
 from ..scrape.utils import PROPER_DATE_FORMAT
 
 
+# holds the connection of each thread to the database
+_local = threading.local()
+
+
+def _forget_db_connection():
+    """
+    Makes a forked process open its own connection, since a
+    sqlite connection can't be used by more than one process.
+    The inherited connection is kept (but never used) so that
+    it isn't closed underneath the parent process.
+    """
+    _local.inherited_con = getattr(_local, 'con', None)
+    _local.con = None
+    _local.transaction_depth = 0
+
+
+os.register_at_fork(after_in_child=_forget_db_connection)
+
+
 class DB_Query():
 
     def __init__(self, column_names, rows):
@@ -22,6 +45,9 @@ def execute_sql(sql, input_con=None, params=()):
 
     The input_con parameter is useful for creating
     temporary tables that will be persisted across a connection.
+    If no input_con is given, the current thread's connection
+    is used (see get_db_connection) and the result is committed
+    unless it is part of a transaction.
 
     Returns a DB_Query.
     """
@@ -33,11 +59,14 @@ def execute_sql(sql, input_con=None, params=()):
     if type(params) != tuple and type(params) != list:
         params = (params, )
     cur = con.execute(sql, params)
-    results = cur.fetchall()
-    column_names = [description[0] for description in cur.description] if cur.description is not None else None
+    try:
+        results = cur.fetchall()
+        column_names = [description[0] for description in cur.description] if cur.description is not None else None
+    finally:
+        cur.close()
 
     if input_con is None:
-        close_db_connection(con)
+        commit(con)
 
     return DB_Query(column_names, results)
 
@@ -51,9 +80,12 @@ def execute_many_sql(sql, seq_of_params):
     """
     con = get_db_connection()
     cur = con.executemany(sql, seq_of_params)
-    results = cur.fetchall()
-    column_names = [description[0] for description in cur.description] if cur.description is not None else None
-    close_db_connection(con)
+    try:
+        results = cur.fetchall()
+        column_names = [description[0] for description in cur.description] if cur.description is not None else None
+    finally:
+        cur.close()
+    commit(con)
     return DB_Query(column_names, results)
 
 
@@ -64,10 +96,7 @@ def get_table_column_names(table_name: str):
     This function is in this module because it deals with
     the cursor and connection abstractipn layer.
     """
-    con = get_db_connection()
-    cur = con.execute("""SELECT * FROM {} LIMIT 1;""".format(table_name))
-    column_names = [description[0] for description in cur.description]
-    return column_names
+    return execute_sql("""SELECT * FROM {} LIMIT 1;""".format(table_name)).column_names
 
 
 def clear_scrape_logs(date=None):
@@ -82,10 +111,11 @@ def clear_scrape_logs(date=None):
         execute_sql("""DELETE FROM scrape_log WHERE TRUE;""")
     else:
         try:
-            datetime.datetime.strptime(date, PROPER_DATE_FORMAT)
+            clear_before_time = datetime.datetime.strptime(date, PROPER_DATE_FORMAT).timestamp()
         except ValueError:
             raise ValueError('date was not in the correct format: YYYY-MM-DD')
-        execute_sql("""DELETE FROM scrape_log WHERE date < ?;""", date)
+        execute_sql("""DELETE FROM scrape_log WHERE scraped_at < ?;""", int(clear_before_time))
+    request_logger.clear_scraped_requests_cache()
 
 
 def drop_tables():
@@ -95,6 +125,8 @@ def drop_tables():
     table_names = [l[0] for l in execute_sql("""SELECT name FROM sqlite_master WHERE type='table';""").rows]
     for table_name in table_names:
         execute_sql("""DROP TABLE {};""".format(table_name))
+    request_logger.clear_scraped_requests_cache()
+    schema_catalog.clear()
 
 
 def get_table_names():
@@ -122,19 +154,151 @@ def execute_sql_file(file_name, input_con=None):
             except Exception as e:
                 print('Tried to execute this command but failed: {}'.format(cmd))
                 raise e
-        # close the con if it was created by this function
+        # commit if the con is the shared one used by this function
         if input_con is None:
-            close_db_connection(con)
+            commit(con)
     return output
 
 execute_sql_file_persist = execute_sql_file
 
 
+def get_db_path():
+    return '{}/{}.db'.format(CONFIG['DB_PATH'], CONFIG['DB_NAME'])
+
+
 def get_db_connection():
-    con = sqlite3.connect('{}/{}.db'.format(CONFIG['DB_PATH'], CONFIG['DB_NAME']))
+    """
+    Returns the current thread's connection to the database,
+    opening it if needed.
+
+    The connection (and its cache of prepared statements) is
+    reused by every function in the db package until
+    close_db_connection is called. If CONFIG['DB_NAME'] or
+    CONFIG['DB_PATH'] changed, a connection to the new database
+    is opened instead.
+    """
+    con = getattr(_local, 'con', None)
+    if con is not None and _local.db_path != get_db_path():
+        close_db_connection(con)
+        con = None
+
+    if con is None:
+        con = sqlite3.connect(get_db_path(), timeout=CONFIG['SQLITE_TIMEOUT'],
+                              cached_statements=CONFIG['SQLITE_CACHED_STATEMENTS'])
+        apply_sqlite_pragmas(con)
+        _local.con = con
+        _local.db_path = get_db_path()
+        _local.transaction_depth = 0
     return con
 
 
-def close_db_connection(con):
+def apply_sqlite_pragmas(con, profile=None):
+    """
+    Applies the pragmas of the given preset in
+    CONFIG['SQLITE_PRAGMAS'] (CONFIG['SQLITE_PROFILE'] by default)
+    to the connection.
+    """
+    if profile is None:
+        profile = CONFIG['SQLITE_PROFILE']
+    if profile not in CONFIG['SQLITE_PRAGMAS']:
+        raise ValueError('Unknown sqlite profile: {}'.format(profile))
+
+    for pragma_name, value in CONFIG['SQLITE_PRAGMAS'][profile].items():
+        con.execute("""PRAGMA {} = {};""".format(pragma_name, value)).fetchall()
+
+
+def set_sqlite_profile(profile):
+    """
+    Makes every connection use the pragmas of the given preset
+    in CONFIG['SQLITE_PRAGMAS'], including the current thread's
+    connection if it is already open.
+    """
+    if profile not in CONFIG['SQLITE_PRAGMAS']:
+        raise ValueError('Unknown sqlite profile: {}'.format(profile))
+    CONFIG['SQLITE_PROFILE'] = profile
+
+    con = getattr(_local, 'con', None)
+    if con is not None:
+        con.commit()
+        apply_sqlite_pragmas(con, profile)
+
+
+def close_db_connection(con=None):
+    """
+    Commits and closes the connection.
+    Closes the current thread's connection if none is given.
+    """
+    if con is None:
+        con = getattr(_local, 'con', None)
+        if con is None:
+            return
+
     con.commit()
     con.close()
+    if con is getattr(_local, 'con', None):
+        _local.con = None
+
+
+def commit(con):
+    """
+    Commits the connection unless a transaction is in progress.
+    """
+    if con is not getattr(_local, 'con', None) or _local.transaction_depth == 0:
+        con.commit()
+
+
+@contextmanager
+def connection():
+    """
+    Context manager which yields the current thread's connection.
+    The connection is closed on exit if it was opened by this
+    context manager, so nested uses share one connection.
+
+    with db.utils.connection():
+        ...
+    """
+    opened_connection = getattr(_local, 'con', None) is None
+    con = get_db_connection()
+    try:
+        yield con
+    finally:
+        if opened_connection:
+            close_db_connection(con)
+
+
+@contextmanager
+def transaction(immediate=False):
+    """
+    Context manager which groups every statement executed on
+    the current thread's connection into one transaction.
+    The transaction is committed on exit or rolled back if an
+    exception was raised. Nested transactions are part of the
+    outermost one.
+
+    If immediate is True, the database is locked for writing
+    when the transaction begins rather than at its first write,
+    so that reads in the transaction can't be changed by other
+    processes before it writes.
+
+    with db.utils.transaction():
+        ...
+    """
+    con = get_db_connection()
+    if _local.transaction_depth == 0 and not con.in_transaction:
+        # begin explicitly so that statements such as CREATE TABLE are also part of it
+        con.execute("""BEGIN IMMEDIATE;""" if immediate else """BEGIN;""")
+    _local.transaction_depth += 1
+    try:
+        yield con
+    except BaseException:
+        _local.transaction_depth -= 1
+        if _local.transaction_depth == 0:
+            con.rollback()
+            # the in-memory caches may refer to rows and tables that were rolled back
+            request_logger.clear_scraped_requests_cache()
+            schema_catalog.clear()
+        raise
+    _local.transaction_depth -= 1
+    if _local.transaction_depth == 0:
+        with metrics.timer('commit_seconds'):
+            con.commit()
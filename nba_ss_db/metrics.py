@@ -0,0 +1,261 @@
+"""
+Counters and latency histograms of the stages of a scrape run.
+
+Every metric has a name and labels (Ex. the job or the endpoint
+it was recorded for):
+
+    metrics.increment('requests', endpoint='leaguegamelog', outcome='ok')
+    with metrics.timer('store_seconds', job='player_logs', step='insert'):
+        ...
+
+At the end of a run, a json summary is written to CONFIG['METRICS_PATH']
+and, if CONFIG['METRICS_PROMETHEUS_PATH'] is set, every metric is
+written in the Prometheus text format (Ex. for node_exporter's
+textfile collector) so that runs can be graphed over time.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from . import CONFIG
+
+
+PROMETHEUS_PREFIX = 'nba_ss_db_'
+
+# upper bounds (in seconds) of the buckets of every histogram
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# maps (name, labels) to a number, where labels is a sorted tuple of (label, value) tuples
+COUNTERS = {}
+# maps (name, labels) to a Histogram
+HISTOGRAMS = {}
+_lock = threading.Lock()
+
+
+class Histogram():
+    """
+    Counts observed values into BUCKETS and keeps their sum.
+    """
+
+    def __init__(self):
+        # the last bucket holds values above every bound
+        self.bucket_counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.bucket_counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def get_percentile(self, p):
+        """
+        Returns the upper bound of the bucket holding the p-th
+        percentile of the observed values (or None if there are none).
+
+        >>> histogram = Histogram()
+        >>> for value in (0.002, 0.003, 0.004, 0.2):
+        ...     histogram.observe(value)
+        >>> histogram.get_percentile(50), histogram.get_percentile(99)
+        (0.005, 0.25)
+        """
+        if self.count == 0:
+            return None
+        rank = p / 100 * self.count
+        num_seen = 0
+        for i, bucket_count in enumerate(self.bucket_counts):
+            num_seen += bucket_count
+            if num_seen >= rank and bucket_count > 0:
+                return BUCKETS[i] if i < len(BUCKETS) else float('inf')
+        return float('inf')
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count != 0 else None,
+            'p50': self.get_percentile(50),
+            'p90': self.get_percentile(90),
+            'p99': self.get_percentile(99),
+        }
+
+
+def _get_key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def increment(name: str, value=1, **labels):
+    """
+    Adds value to the counter with the given name and labels.
+    """
+    key = _get_key(name, labels)
+    with _lock:
+        COUNTERS[key] = COUNTERS.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels):
+    """
+    Records a value (Ex. a latency in seconds) in the histogram
+    with the given name and labels.
+    """
+    key = _get_key(name, labels)
+    with _lock:
+        if key not in HISTOGRAMS:
+            HISTOGRAMS[key] = Histogram()
+        HISTOGRAMS[key].observe(value)
+
+
+@contextmanager
+def timer(name: str, **labels):
+    """
+    Context manager which records how long its body took in the
+    histogram with the given name and labels, even if it raised.
+    """
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start_time, **labels)
+
+
+def get_counters(name: str):
+    """
+    Returns a dictionary mapping the labels (as a dictionary
+    turned into a sorted tuple of items) of every counter with
+    the given name to its value.
+    """
+    with _lock:
+        return {labels: value for (counter_name, labels), value in COUNTERS.items() if counter_name == name}
+
+
+def get_histogram(name: str, **labels):
+    """
+    Returns the histogram with the given name and labels or None.
+    """
+    with _lock:
+        return HISTOGRAMS.get(_get_key(name, labels))
+
+
+def reset():
+    """
+    Forgets every metric (Ex. at the start of a run).
+    """
+    with _lock:
+        COUNTERS.clear()
+        HISTOGRAMS.clear()
+
+
+def get_summary():
+    """
+    Returns every metric as a json serializable dictionary.
+    """
+    summary = {'counters': {}, 'histograms': {}}
+    with _lock:
+        for (name, labels), value in sorted(COUNTERS.items()):
+            summary['counters'].setdefault(name, []).append({'labels': dict(labels), 'value': value})
+        for (name, labels), histogram in sorted(HISTOGRAMS.items(), key=lambda item: item[0]):
+            summary['histograms'].setdefault(name, []).append(dict(histogram.to_dict(), labels=dict(labels)))
+    return summary
+
+
+def _format_prometheus_labels(labels, extra_labels=()):
+    labels = tuple(labels) + tuple(extra_labels)
+    if len(labels) == 0:
+        return ''
+    return '{{{}}}'.format(','.join('{}="{}"'.format(
+        label, str(value).replace('\\', '\\\\').replace('"', '\\"')) for label, value in labels))
+
+
+def format_prometheus():
+    """
+    Returns every metric in the Prometheus text format.
+
+    >>> reset()
+    >>> increment('requests', endpoint='leaguegamelog')
+    >>> print(format_prometheus())
+    # TYPE nba_ss_db_requests_total counter
+    nba_ss_db_requests_total{endpoint="leaguegamelog"} 1
+    <BLANKLINE>
+    >>> reset()
+    """
+    lines = []
+    with _lock:
+        counters = sorted(COUNTERS.items())
+        histograms = sorted(HISTOGRAMS.items(), key=lambda item: item[0])
+
+        typed_names = set()
+        for (name, labels), value in counters:
+            metric_name = '{}{}_total'.format(PROMETHEUS_PREFIX, name)
+            if metric_name not in typed_names:
+                lines.append('# TYPE {} counter'.format(metric_name))
+                typed_names.add(metric_name)
+            lines.append('{}{} {}'.format(metric_name, _format_prometheus_labels(labels), value))
+
+        for (name, labels), histogram in histograms:
+            metric_name = '{}{}'.format(PROMETHEUS_PREFIX, name)
+            if metric_name not in typed_names:
+                lines.append('# TYPE {} histogram'.format(metric_name))
+                typed_names.add(metric_name)
+            cumulative_count = 0
+            for bound, bucket_count in zip(BUCKETS + ('+Inf', ), histogram.bucket_counts):
+                cumulative_count += bucket_count
+                lines.append('{}_bucket{} {}'.format(
+                    metric_name, _format_prometheus_labels(labels, (('le', bound), )), cumulative_count))
+            lines.append('{}_sum{} {}'.format(metric_name, _format_prometheus_labels(labels), histogram.sum))
+            lines.append('{}_count{} {}'.format(metric_name, _format_prometheus_labels(labels), histogram.count))
+    return '\n'.join(lines) + '\n'
+
+
+def _write_atomically(path, content):
+    """
+    Writes the file through a temporary file so that it is
+    never read half written.
+    """
+    if os.path.dirname(path) != '':
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def write_run_summary(run_name: str, start_time: float, **run_info):
+    """
+    Writes a json summary of the metrics of a run that started at
+    start_time (a unix time) to CONFIG['METRICS_PATH'] and the
+    metrics in the Prometheus text format to
+    CONFIG['METRICS_PROMETHEUS_PATH'] if they are set.
+
+    Returns the path of the json summary or None.
+    """
+    end_time = time.time()
+    summary_path = None
+    if CONFIG['METRICS_PATH'] is not None:
+        summary = dict(run_info, run=run_name, pid=os.getpid(), start_time=start_time, end_time=end_time,
+                       duration=end_time - start_time, **get_summary())
+        summary_path = os.path.join(CONFIG['METRICS_PATH'], '{}-{:03d}_{}_{}.json'.format(
+            time.strftime('%Y%m%d-%H%M%S', time.localtime(start_time)), int(start_time * 1000) % 1000,
+            run_name, os.getpid()))
+        _write_atomically(summary_path, json.dumps(summary, indent=2))
+
+    if CONFIG['METRICS_PROMETHEUS_PATH'] is not None:
+        _write_atomically(CONFIG['METRICS_PROMETHEUS_PATH'], format_prometheus())
+    return summary_path
+
+
+def _forget_metrics():
+    """
+    Makes a forked process (Ex. a queue worker) only report its own
+    metrics. The lock is replaced since another thread of the parent
+    process may have held it while forking.
+    """
+    global _lock
+    _lock = threading.Lock()
+    COUNTERS.clear()
+    HISTOGRAMS.clear()
+
+
+os.register_at_fork(after_in_child=_forget_metrics)
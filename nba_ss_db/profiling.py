@@ -0,0 +1,287 @@
+"""
+Profiles the jobs of a run without editing any code (see run.py --profile).
+
+Three modes are supported:
+- cpu: a cProfile profile of every job, saved as <DATA_NAME>.pstats.
+  Jobs and their api requests are run one at a time so that all of
+  the work of a job happens on the profiled thread.
+- memory: the peak memory of every job and a tracemalloc snapshot
+  taken close to the peak, saved as <DATA_NAME>.tracemalloc.
+  Jobs are run one at a time so that their memory isn't mixed up.
+- sample: the stacks of every thread are sampled every
+  CONFIG['PROFILE_SAMPLE_INTERVAL'] seconds by a background thread
+  and saved in the collapsed format of flame graphs as <DATA_NAME>.folded.
+  The overhead is low enough to leave on during a daily scrape.
+
+The files of a run are written to a new directory in CONFIG['PROFILE_PATH']
+and the top hotspots of every job are printed.
+
+    profiling.start('sample')
+    with profiling.profile('player_logs'):
+        ...
+    profiling.stop()
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+from . import CONFIG
+
+
+PROFILE_MODES = ['cpu', 'memory', 'sample']
+
+# number of frames kept for every memory allocation
+TRACEMALLOC_FRAMES = 25
+
+# the profiler of the current run (None when not profiling)
+_profiler = None
+
+
+def start(mode: str, output_path=None):
+    """
+    Starts profiling every job run in the profile context manager
+    with the given mode. Returns the directory that the profiles
+    are written to.
+    """
+    global _profiler
+    if mode not in PROFILE_MODES:
+        raise ValueError('Unsupported profile mode: {} (expected one of {})'.format(mode, PROFILE_MODES))
+    if output_path is None:
+        output_path = os.path.join(CONFIG['PROFILE_PATH'], '{}_{}'.format(time.strftime('%Y%m%d-%H%M%S'), mode))
+    os.makedirs(output_path, exist_ok=True)
+
+    if mode == 'cpu':
+        _profiler = CPUProfiler(output_path)
+    elif mode == 'memory':
+        _profiler = MemoryProfiler(output_path)
+    else:
+        _profiler = SamplingProfiler(output_path)
+    _profiler.start()
+    print('Writing {} profiles to {}'.format(mode, output_path))
+    return output_path
+
+
+def stop():
+    """
+    Stops profiling and writes out whatever is left to write.
+    """
+    global _profiler
+    if _profiler is not None:
+        _profiler.stop()
+        _profiler = None
+
+
+def is_profiling():
+    return _profiler is not None
+
+
+@contextmanager
+def profile(name: str):
+    """
+    Context manager which profiles its body as the job with the
+    given name (Ex. its DATA_NAME) if profiling was started.
+    """
+    if _profiler is None:
+        yield
+        return
+    with _profiler.profile(name):
+        yield
+
+
+def _get_file_name(name):
+    return ''.join(c if c.isalnum() or c in '-_.' else '_' for c in name)
+
+
+class CPUProfiler():
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self._concurrency = None
+
+    def start(self):
+        # cProfile only profiles the thread it was enabled on
+        self._concurrency = CONFIG['JOB_CONCURRENCY'], CONFIG['MAX_CONCURRENCY']
+        CONFIG['JOB_CONCURRENCY'] = 1
+        CONFIG['MAX_CONCURRENCY'] = 1
+
+    def stop(self):
+        CONFIG['JOB_CONCURRENCY'], CONFIG['MAX_CONCURRENCY'] = self._concurrency
+
+    @contextmanager
+    def profile(self, name):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(os.path.join(self.output_path, '{}.pstats'.format(_get_file_name(name))))
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats('tottime').print_stats(CONFIG['PROFILE_TOP'])
+            print('Top {} functions of {} by own time:'.format(CONFIG['PROFILE_TOP'], name))
+            # skip the header of the stats
+            print(output.getvalue()[output.getvalue().find('   ncalls'):])
+
+
+class MemoryProfiler():
+    """
+    Snapshots are taken by a background thread whenever the traced
+    memory grew past the largest snapshot so far, so the snapshot of a
+    job was taken at most CONFIG['PROFILE_SAMPLE_INTERVAL'] * 10
+    seconds away from its peak.
+    """
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self._job_concurrency = None
+        self._was_tracing = False
+        self._lock = threading.Lock()
+        self._peak_snapshot = None
+        self._peak_snapshot_size = 0
+        self._stop_event = None
+        self._thread = None
+
+    def start(self):
+        self._job_concurrency = CONFIG['JOB_CONCURRENCY']
+        CONFIG['JOB_CONCURRENCY'] = 1
+        self._was_tracing = tracemalloc.is_tracing()
+        if not self._was_tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._snapshot_peaks, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+        if not self._was_tracing:
+            tracemalloc.stop()
+        CONFIG['JOB_CONCURRENCY'] = self._job_concurrency
+
+    def _snapshot_peaks(self):
+        while not self._stop_event.wait(CONFIG['PROFILE_SAMPLE_INTERVAL'] * 10):
+            self._snapshot_if_larger()
+
+    def _snapshot_if_larger(self):
+        with self._lock:
+            current_size, _ = tracemalloc.get_traced_memory()
+            if current_size > self._peak_snapshot_size:
+                self._peak_snapshot = tracemalloc.take_snapshot()
+                self._peak_snapshot_size = current_size
+
+    @contextmanager
+    def profile(self, name):
+        with self._lock:
+            tracemalloc.reset_peak()
+            self._peak_snapshot = None
+            self._peak_snapshot_size = 0
+        start_size, _ = tracemalloc.get_traced_memory()
+        try:
+            yield
+        finally:
+            # the job's memory may not have been freed yet
+            self._snapshot_if_larger()
+            _, peak_size = tracemalloc.get_traced_memory()
+            with self._lock:
+                snapshot = self._peak_snapshot
+            snapshot.dump(os.path.join(self.output_path, '{}.tracemalloc'.format(_get_file_name(name))))
+
+            print('Peak memory of {}: {:.1f} MB ({:.1f} MB more than at its start)'.format(
+                name, peak_size / 1e6, (peak_size - start_size) / 1e6))
+            for stat in snapshot.statistics('lineno')[:CONFIG['PROFILE_TOP']]:
+                print('    {}'.format(stat))
+
+
+class SamplingProfiler():
+    """
+    Counts the stacks of every thread at a fixed interval. The
+    samples of a thread running a job are attributed to the job
+    and the samples of other threads (Ex. the threads making
+    api requests) are attributed to every job running at the time.
+    """
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self._lock = threading.Lock()
+        # maps a job name to a Counter of stacks
+        self._samples = {}
+        # maps the id of a thread running a job to the name of the job
+        self._job_threads = {}
+        self._stop_event = None
+        self._thread = None
+
+    def start(self):
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._sample_stacks, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+
+    def _sample_stacks(self):
+        sampler_thread_id = threading.get_ident()
+        while not self._stop_event.wait(CONFIG['PROFILE_SAMPLE_INTERVAL']):
+            frames = sys._current_frames()
+            with self._lock:
+                job_names = set(self._job_threads.values())
+                if len(job_names) == 0:
+                    continue
+                for thread_id, frame in frames.items():
+                    if thread_id == sampler_thread_id:
+                        continue
+                    stack = _format_stack(frame)
+                    if thread_id in self._job_threads:
+                        self._samples[self._job_threads[thread_id]][stack] += 1
+                    else:
+                        for job_name in job_names:
+                            self._samples[job_name][stack] += 1
+
+    @contextmanager
+    def profile(self, name):
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._samples[name] = Counter()
+            self._job_threads[thread_id] = name
+        try:
+            yield
+        finally:
+            with self._lock:
+                del self._job_threads[thread_id]
+                samples = self._samples.pop(name)
+            self._write_samples(name, samples)
+
+    def _write_samples(self, name, samples):
+        with open(os.path.join(self.output_path, '{}.folded'.format(_get_file_name(name))), 'w') as f:
+            for stack, count in samples.most_common():
+                f.write('{} {}\n'.format(stack, count))
+
+        num_samples = sum(samples.values())
+        # the innermost frame of a stack is the function that was running
+        running_functions = Counter()
+        for stack, count in samples.items():
+            running_functions[stack.rsplit(';', 1)[-1]] += count
+        print('Top {} running functions of {} ({} samples):'.format(CONFIG['PROFILE_TOP'], name, num_samples))
+        for function, count in running_functions.most_common(CONFIG['PROFILE_TOP']):
+            print('    {:5.1f}% {}'.format(100 * count / num_samples, function))
+
+
+def _format_stack(frame):
+    """
+    Returns the stack of the frame from the outermost call as
+    'function (file:first line of the function);...' which is the
+    collapsed format read by flame graph tools.
+    """
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append('{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
@@ -1 +1 @@
-from . import scraper, utils
\ No newline at end of file
+from . import http_session, json_decoder, pipeline, response_cache, retry_policy, scheduler, scraper, queue_worker, utils
\ No newline at end of file
@@ -9,8 +9,9 @@ from collections import OrderedDict
 
 from typing import List
 
-from .utils import flatten_list
-from .query_param_values import get_possible_query_param_values
+from .. import CONFIG
+from .query_param_values import get_possible_query_param_values, get_earliest_high_water_marks, \
+    get_values_after_high_water_mark, INCREMENTAL_QUERY_PARAMS
 
 
 VALID_FILLABLES = {'{SEASON}', '{PLAYER_ID}', '{GAME_DATE}', '{DATE_TO}', '{GAME_ID}', '{PLAYER_POSITION}'}
@@ -24,28 +25,72 @@ class FillableAPIRequest():
     Represents a fillable api request.
     """
 
-    def __init__(self, fillable_api_request: str, is_daily: bool):
+    def __init__(self, fillable_api_request: str, is_daily: bool, data_name=None):
         """
         Given a fillable_api_request, parses the fillable choices
         and adds any primary keys if necesssary.
+
+        If data_name (the table, or list of tables, the job is stored in) is given,
+        is_daily is True and CONFIG['MINIMIZE_SCRAPES'] is True,
+        only {DATE_TO}, {GAME_DATE} and {GAME_ID} values on or after
+        the date of the latest ones already stored in the table are filled in.
+        Gaps before that date are left to a full (non-daily) scrape.
         """
         self.fillable_api_request = fillable_api_request
         self.is_daily = is_daily
+        self.data_name = data_name
+        self.data_names = [data_name] if isinstance(data_name, str) else data_name
+        self.is_incremental = data_name is not None and is_daily and CONFIG['MINIMIZE_SCRAPES']
 
-        fillable_names, fillable_choices = self._parse_fillable_api_request()
+        fillable_names, seasonal_choices, other_choices = self._parse_fillable_api_request()
         self.fillable_names = fillable_names
-        self.fillable_choices = fillable_choices
+        # a list of (season, list of values for each season dependent fillable) tuples
+        self.seasonal_choices = seasonal_choices
+        # a list of values for each fillable that doesn't depend on the season
+        self.other_choices = other_choices
 
     def generate_api_requests(self):
         """
         Yields APIRequest objects that are generated
         by creating every combination of fillable choices.
+
+        Combinations are generated lazily, so the full
+        product of choices is never held in memory.
+        """
+        for seasonal_permutation in self._generate_seasonal_permutations():
+            for other_permutation in itertools.product(*self.other_choices):
+                fill_mapping = OrderedDict(zip(self.fillable_names, seasonal_permutation + other_permutation))
+                yield APIRequest(self.fill_in(**fill_mapping), fill_mapping)
+
+    def _generate_seasonal_permutations(self):
+        if self.seasonal_choices is None:
+            yield ()
+            return
+        for season, dependent_choices in self.seasonal_choices:
+            for dependent_permutation in itertools.product(*dependent_choices):
+                yield (season, ) + dependent_permutation
+
+    def plan(self):
         """
-        for fillable_permutation in itertools.product(*self.fillable_choices):
-            fill_mapping = OrderedDict()
-            for fillable_type, fillable_value in zip(self.fillable_names, flatten_list(fillable_permutation)):
-                fill_mapping[fillable_type] = fillable_value
-            yield APIRequest(self.fill_in(**fill_mapping), fill_mapping)
+        Returns an OrderedDict mapping each season to the number of
+        api requests that will be generated for it, without
+        generating them. If the request has no {SEASON}, the
+        only key is None.
+        """
+        num_other_permutations = _product_of_lengths(self.other_choices)
+        if self.seasonal_choices is None:
+            return OrderedDict([(None, num_other_permutations)])
+
+        return OrderedDict(
+            (season, _product_of_lengths(dependent_choices) * num_other_permutations)
+            for season, dependent_choices in self.seasonal_choices
+        )
+
+    def count(self):
+        """
+        Returns the number of api requests that will be generated.
+        """
+        return sum(self.plan().values())
 
     def fill_in(self, **kwargs):
         return self.fillable_api_request.format(**kwargs)
@@ -59,11 +104,13 @@ class FillableAPIRequest():
         specific keywords in the string such as '{SEASON}'
         which denotes that the job should scrape for all
         seasons.
+
+        Returns the names of the fillables, the choices for each
+        season (None if there is no {SEASON}) and the choices
+        for the other fillables.
         """
         query_param_names = []
-        # a list of lists where a valid api request is formed by
-        # picking one from each list (product)
-        query_param_choices = []
+        seasonal_choices = None
         if '{SEASON}' in self.fillable_api_request:
             query_param_names.append('SEASON')
 
@@ -76,34 +123,63 @@ class FillableAPIRequest():
 
             query_param_names.extend(dependent_query_param_names)
 
-            # go through each season and get possible combinations of query params
-            grouped_choices = []
+            # the latest stored value of each incremental query param by season
+            high_water_marks = {}
+            if self.is_incremental:
+                for dependent_fillable in dependent_query_param_names:
+                    if '{' + dependent_fillable + '}' in INCREMENTAL_QUERY_PARAMS:
+                        high_water_marks[dependent_fillable] = get_earliest_high_water_marks(
+                            '{' + dependent_fillable + '}', self.data_names)
+
+            # go through each season and get the possible values of each dependent query param
+            seasonal_choices = []
             for season in get_possible_query_param_values('{SEASON}', self.is_daily):
                 # a list of list of values for each dependent query param
-                seasonal_choices = [[season]]
+                dependent_choices = []
 
                 for dependent_fillable in dependent_query_param_names:
                     dependent_values = get_possible_query_param_values(
                         '{' + dependent_fillable + '}', self.is_daily)[season]
-                    seasonal_choices.append(dependent_values)
-
-                grouped_choices.extend(itertools.product(*seasonal_choices))
+                    if dependent_fillable in high_water_marks:
+                        dependent_values = get_values_after_high_water_mark(
+                            '{' + dependent_fillable + '}', dependent_values,
+                            high_water_marks[dependent_fillable].get(season))
+                    dependent_choices.append(dependent_values)
 
-            query_param_choices.append(grouped_choices)
+                seasonal_choices.append((season, dependent_choices))
         else:
             # raise an error if there was a dependent query param but no season
             for dependent_query_param in SEASON_DEPENDENT_FILLABLES:
                 if dependent_query_param in self.fillable_api_request:
                     raise ValueError(
-                        'API request had {} without a {SEASON}.'.format(dependent_query_param))
+                        'API request had {} without a {{SEASON}}.'.format(dependent_query_param))
 
-        for fillable_type in OTHER_FILLABLES:
+        # a list of lists where a valid api request is formed by
+        # picking one from each list (product)
+        other_choices = []
+        for fillable_type in sorted(OTHER_FILLABLES):
             if fillable_type in self.fillable_api_request:
                 query_param_names.append(fillable_type[1:-1])
-                query_param_choices.append(
+                other_choices.append(
                     get_possible_query_param_values(fillable_type, self.is_daily))
-        
-        return query_param_names, query_param_choices
+
+        return query_param_names, seasonal_choices, other_choices
+
+
+def _product_of_lengths(lists):
+    """
+    Returns the number of combinations formed by
+    picking one element from each list.
+
+    >>> _product_of_lengths([[1, 2], ['a', 'b', 'c']])
+    6
+    >>> _product_of_lengths([])
+    1
+    """
+    num_combinations = 1
+    for l in lists:
+        num_combinations *= len(l)
+    return num_combinations
 
 
 class APIRequest():
@@ -0,0 +1,172 @@
+"""
+A shared HTTP session used for every request to stats.nba.com.
+
+Connections are pooled per host and kept alive between requests
+so that scraping thousands of urls doesn't pay for a new TCP+TLS
+handshake on every request.
+
+Every request and every new connection is counted in metrics
+(http_requests and http_connections by host), so every request
+that didn't need a new connection reused one.
+
+No more than CONFIG['MAX_CONCURRENCY'] requests made in a
+request_slot are in flight at once in the process, however many
+jobs are scraped at the same time.
+"""
+import os
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .. import metrics, CONFIG
+
+
+USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/60.0.3112.101 Safari/537.36'
+
+DEFAULT_HEADERS = {
+    'User-Agent': USER_AGENT,
+    'Accept': 'application/json, text/plain, */*',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive'
+}
+
+_session = None
+_session_lock = threading.Lock()
+# a (max concurrency, semaphore) tuple limiting the requests in flight
+_request_slots = None
+
+
+def get_session():
+    """
+    Returns the shared requests.Session, creating it on first use.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _create_session()
+        return _session
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+
+    def _new_conn(self):
+        metrics.increment('http_connections', host=self.host)
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+
+    def _new_conn(self):
+        metrics.increment('http_connections', host=self.host)
+        return super()._new_conn()
+
+
+class _CountingHTTPAdapter(HTTPAdapter):
+    """
+    An HTTPAdapter whose pools count the connections they open.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool,
+        }
+
+
+def _get_request_semaphore():
+    """
+    Returns the semaphore of the request slots, replacing it
+    if CONFIG['MAX_CONCURRENCY'] changed (Ex. while profiling).
+    """
+    global _request_slots
+    with _session_lock:
+        if _request_slots is None or _request_slots[0] != CONFIG['MAX_CONCURRENCY']:
+            _request_slots = (CONFIG['MAX_CONCURRENCY'], threading.BoundedSemaphore(max(CONFIG['MAX_CONCURRENCY'], 1)))
+        return _request_slots[1]
+
+
+@contextmanager
+def request_slot():
+    """
+    Context manager which waits until fewer than
+    CONFIG['MAX_CONCURRENCY'] requests are in flight in the
+    process before making the requests in its body.
+
+    with http_session.request_slot():
+        response = http_session.get(url)
+    """
+    semaphore = _get_request_semaphore()
+    with metrics.timer('request_slot_wait_seconds'):
+        semaphore.acquire()
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+def _create_session():
+    session = requests.Session()
+    session.headers.update(DEFAULT_HEADERS)
+
+    # one pool per host with enough connections for every worker
+    adapter = _CountingHTTPAdapter(pool_connections=CONFIG['HTTP_POOL_CONNECTIONS'],
+                                   pool_maxsize=max(CONFIG['HTTP_POOL_SIZE'], CONFIG['MAX_CONCURRENCY']),
+                                   pool_block=True)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get(url):
+    """
+    Makes a GET request to the url through the shared session
+    and returns the requests.Response.
+    """
+    # counted before it's made so that failed requests are counted too
+    metrics.increment('http_requests', host=urlsplit(url).hostname)
+    return get_session().get(url, allow_redirects=False,
+                             timeout=(CONFIG['CONNECT_TIMEOUT'], CONFIG['READ_TIMEOUT']))
+
+
+def get_connection_stats():
+    """
+    Returns a dictionary with the number of requests made
+    and the number of new connections opened since the
+    metrics were last reset (Ex. at the start of a run).
+    """
+    num_requests = sum(metrics.get_counters('http_requests').values())
+    num_connections = sum(metrics.get_counters('http_connections').values())
+    return {
+        'requests': num_requests,
+        'connections': num_connections,
+        'reused_connections': max(num_requests - num_connections, 0)
+    }
+
+
+def close_session():
+    """
+    Closes every pooled connection of the shared session.
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def _forget_session():
+    """
+    Makes a forked process open its own connections rather
+    than sharing the pooled sockets of the parent process.
+    """
+    global _session, _session_lock, _request_slots
+    _session = None
+    _session_lock = threading.Lock()
+    _request_slots = None
+
+
+os.register_at_fork(after_in_child=_forget_session)
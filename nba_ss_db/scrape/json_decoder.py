@@ -0,0 +1,79 @@
+"""
+Decodes the json bodies of responses from stats.nba.com.
+
+The fastest json library that is installed is used (see
+JSON_DECODERS) unless CONFIG['JSON_DECODER'] names one.
+orjson and ujson are optional, the standard library's json
+module is always available:
+
+    pip install orjson
+
+Only the result sets that a job stores are kept from a decoded
+body, so the other result sets can be freed right away.
+"""
+import json
+
+from .. import CONFIG
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+# maps the name of a json library to its loads function (or None if it isn't installed), fastest first
+JSON_DECODERS = {
+    'orjson': orjson.loads if orjson is not None else None,
+    'ujson': ujson.loads if ujson is not None else None,
+    'json': json.loads,
+}
+
+
+def get_decoder_name():
+    """
+    Returns the name of the json library used to decode responses.
+    """
+    decoder_name = CONFIG['JSON_DECODER']
+    if decoder_name == 'auto':
+        return next(name for name, loads in JSON_DECODERS.items() if loads is not None)
+    if decoder_name not in JSON_DECODERS:
+        raise ValueError('Unsupported json decoder: {} (expected auto or one of {})'.format(
+            decoder_name, list(JSON_DECODERS.keys())))
+    if JSON_DECODERS[decoder_name] is None:
+        raise ValueError('The json decoder {} is not installed.'.format(decoder_name))
+    return decoder_name
+
+
+def loads(body):
+    """
+    Decodes a json body (bytes or str).
+    Raises a ValueError if it isn't valid json.
+    """
+    return JSON_DECODERS[get_decoder_name()](body)
+
+
+def decode_result_set(body, result_set_index: int):
+    """
+    Decodes a json response from stats.nba.com and returns
+    only the result set at result_set_index as a dict
+    with 'headers' and 'rowSet'.
+
+    >>> decode_result_set(b'{"resultSets": [{"headers": ["A"], "rowSet": [[1]]}, {"headers": ["B"], "rowSet": []}]}', 1)
+    {'headers': ['B'], 'rowSet': []}
+    """
+    return decode_result_sets(body, [result_set_index])[0]
+
+
+def decode_result_sets(body, result_set_indicies):
+    """
+    Like decode_result_set, but returns a list of the result
+    sets at each of the result_set_indicies.
+    """
+    result_sets = loads(body)['resultSets']
+    return [{'headers': result_sets[i]['headers'], 'rowSet': result_sets[i]['rowSet']}
+            for i in result_set_indicies]
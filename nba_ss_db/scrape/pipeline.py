@@ -0,0 +1,231 @@
+"""
+Runs the api requests of a job through stages which work at the
+same time, connected by bounded queues:
+
+    api requests -> fetch -> [queue] -> parse -> [queue] -> write
+
+Every stage is a pool of threads calling a function on each item
+taken from the previous stage, except for the last stage which is run
+by the thread that runs the pipeline (Ex. so that only the job's own
+thread writes its rows to the database). Each pipeline has its own
+writer: jobs run through pipelines at the same time write in turns,
+each batch waiting for SQLite's write lock. A queue holds at most
+CONFIG['PIPELINE_QUEUE_SIZE'] items so that when a stage falls behind,
+the stages before it wait for it (backpressure) rather than holding
+every response in memory.
+
+The metrics of every stage of a job are counted:
+- pipeline_busy_seconds: time its threads spent working
+- pipeline_wait_seconds: time its threads waited for an item
+  (on='input') or for room in the next queue (on='output')
+- pipeline_thread_seconds: time its threads ran for (their
+  utilization is pipeline_busy_seconds / pipeline_thread_seconds)
+- pipeline_queue_depth: number of items left in the queue before
+  the stage whenever it took an item from it
+
+    pipeline = Pipeline('player_logs')
+    pipeline.add_stage('fetch', fetch, num_threads=4)
+    pipeline.add_stage('parse', parse, num_threads=2)
+    pipeline.run(api_requests, 'write', write)
+"""
+import queue
+import threading
+import time
+
+from .. import metrics, CONFIG
+
+
+# put into a queue after its last item
+_DONE = object()
+# in seconds (how often a blocked thread checks whether the pipeline was stopped)
+_POLL_TIME = 0.1
+
+
+class Stage():
+
+    def __init__(self, name, work, num_threads):
+        self.name = name
+        self.work = work
+        self.num_threads = num_threads
+        self.num_items = 0
+        self.busy_seconds = 0.0
+        self.thread_seconds = 0.0
+
+
+class Pipeline():
+    """
+    If serial is True, every item is run through every stage
+    on the calling thread before the next item is started (Ex.
+    so that a cProfile of the calling thread sees all of the work).
+    """
+
+    def __init__(self, job_name: str, queue_size=None, serial=False):
+        self.job_name = job_name
+        self.queue_size = CONFIG['PIPELINE_QUEUE_SIZE'] if queue_size is None else queue_size
+        self.serial = serial
+        self._stages = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._error = None
+        # number of threads of each stage that are still running
+        self._num_running = []
+
+    def add_stage(self, name: str, work, num_threads=1):
+        """
+        Adds a stage of num_threads threads which call work on every
+        item of the previous stage and pass its result to the next one.
+        """
+        self._stages.append(Stage(name, work, max(num_threads, 1)))
+
+    def run(self, items, name: str, work):
+        """
+        Runs every item through the stages and calls work on every
+        result of the last stage on the calling thread (as the stage
+        with the given name). Raises the first error of any stage.
+        """
+        start_time = time.perf_counter()
+        stages = self._stages + [Stage(name, work, 1)]
+        if self.serial:
+            self._run_serially(items, stages)
+        else:
+            self._run_threads(items, stages)
+        elapsed_time = time.perf_counter() - start_time
+
+        if self.serial:
+            for stage in stages:
+                stage.thread_seconds = elapsed_time
+                metrics.increment('pipeline_thread_seconds', elapsed_time, job=self.job_name, stage=stage.name)
+        if stages[-1].num_items > 0:
+            print('Pipeline of {} ({:.1f}s): {}'.format(self.job_name, elapsed_time, self._format_utilization(stages)))
+
+    def _run_serially(self, items, stages):
+        for item in items:
+            for stage in stages:
+                start_time = time.perf_counter()
+                item = stage.work(item)
+                stage.busy_seconds += time.perf_counter() - start_time
+                stage.num_items += 1
+        for stage in stages:
+            metrics.increment('pipeline_busy_seconds', stage.busy_seconds, job=self.job_name, stage=stage.name)
+
+    def _run_threads(self, items, stages):
+        items = iter(items)
+        items_lock = threading.Lock()
+
+        def get_item():
+            with items_lock:
+                return next(items, _DONE)
+
+        queues = [queue.Queue(self.queue_size) for _ in self._stages]
+        self._num_running = [stage.num_threads for stage in self._stages]
+        threads = []
+        for i, stage in enumerate(self._stages):
+            get = get_item if i == 0 else self._make_get(queues[i - 1], stage)
+            for _ in range(stage.num_threads):
+                threads.append(threading.Thread(target=self._run_stage, args=(i, stage, get, queues[i]),
+                                                name='{}-{}'.format(self.job_name, stage.name), daemon=True))
+
+        for thread in threads:
+            thread.start()
+        try:
+            self._run_stage(len(self._stages), stages[-1], self._make_get(queues[-1], stages[-1]), None)
+        finally:
+            # the other threads stop as soon as they are done with their current item
+            self._stop_event.set()
+            for thread in threads:
+                thread.join()
+
+        if self._error is not None:
+            raise self._error
+
+    def _make_get(self, input_queue, stage):
+        def get():
+            while not self._stop_event.is_set():
+                try:
+                    item = input_queue.get(timeout=_POLL_TIME)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    # every other thread of the stage needs to see it too
+                    input_queue.put(_DONE)
+                else:
+                    metrics.observe('pipeline_queue_depth', input_queue.qsize(), job=self.job_name, stage=stage.name)
+                return item
+            return _DONE
+        return get
+
+    def _put(self, output_queue, item):
+        """
+        Puts the item into the queue once it has room.
+        Returns False if the pipeline was stopped first.
+        """
+        while not self._stop_event.is_set():
+            try:
+                output_queue.put(item, timeout=_POLL_TIME)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run_stage(self, i, stage, get, output_queue):
+        start_time = time.perf_counter()
+        num_items = 0
+        busy_seconds = input_wait_seconds = output_wait_seconds = 0.0
+        try:
+            while True:
+                wait_start_time = time.perf_counter()
+                item = get()
+                work_start_time = time.perf_counter()
+                input_wait_seconds += work_start_time - wait_start_time
+                if item is _DONE:
+                    break
+
+                result = stage.work(item)
+                work_end_time = time.perf_counter()
+                busy_seconds += work_end_time - work_start_time
+                num_items += 1
+                if output_queue is not None and not self._put(output_queue, result):
+                    break
+                output_wait_seconds += time.perf_counter() - work_end_time
+        except BaseException as e:
+            with self._lock:
+                if self._error is None:
+                    self._error = e
+            self._stop_event.set()
+            if output_queue is None:
+                raise
+        finally:
+            thread_seconds = time.perf_counter() - start_time
+            with self._lock:
+                stage.num_items += num_items
+                stage.busy_seconds += busy_seconds
+                stage.thread_seconds += thread_seconds
+            metrics.increment('pipeline_busy_seconds', busy_seconds, job=self.job_name, stage=stage.name)
+            metrics.increment('pipeline_wait_seconds', input_wait_seconds, job=self.job_name, stage=stage.name,
+                              on='input')
+            metrics.increment('pipeline_wait_seconds', output_wait_seconds, job=self.job_name, stage=stage.name,
+                              on='output')
+            metrics.increment('pipeline_thread_seconds', thread_seconds, job=self.job_name, stage=stage.name)
+
+        if output_queue is not None:
+            with self._lock:
+                self._num_running[i] -= 1
+                is_last_thread = self._num_running[i] == 0
+            if is_last_thread:
+                self._put(output_queue, _DONE)
+
+    def _format_utilization(self, stages):
+        """
+        Returns how busy the threads of each stage were and how
+        full the queue before it was on average.
+        """
+        stage_strs = []
+        for stage in stages:
+            stage_str = '{} {:.0%} busy ({} thread{})'.format(
+                stage.name, stage.busy_seconds / stage.thread_seconds if stage.thread_seconds > 0 else 0,
+                stage.num_threads, '' if stage.num_threads == 1 else 's')
+            queue_depth = metrics.get_histogram('pipeline_queue_depth', job=self.job_name, stage=stage.name)
+            if queue_depth is not None and not self.serial:
+                stage_str += ' queue depth {:.1f}'.format(queue_depth.sum / queue_depth.count)
+            stage_strs.append(stage_str)
+        return ', '.join(stage_strs)
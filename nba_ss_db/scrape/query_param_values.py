@@ -4,11 +4,25 @@ API request jobs.
 """
 import datetime
 from .. import db, CONFIG
-from ..scrape.utils import get_date_before, format_date_for_api_request, PROPER_DATE_FORMAT
+from ..scrape.utils import get_date_before, format_date_for_api_request, format_date, PROPER_DATE_FORMAT
 
 
 QUERY_PARAM_VALUES = {}
 
+# fillables whose values are ordered by the date of the games they belong to
+INCREMENTAL_QUERY_PARAMS = {'{DATE_TO}', '{GAME_DATE}', '{GAME_ID}'}
+
+GAME_DATES_BY_GAME_ID = {}
+
+# the table that the values of each fillable are read from
+QUERY_PARAM_TABLES = {
+    '{PLAYER_ID}': 'player_ids',
+    '{GAME_DATE}': 'game_dates',
+    '{DATE_TO}': 'game_dates',
+    '{GAME_ID}': 'games'
+}
+
+
 def get_possible_query_param_values(query_param, is_daily):
     """
     Valid query parameters are:
@@ -24,7 +38,9 @@ def get_possible_query_param_values(query_param, is_daily):
 
     All other query parameters return a list of values to iterate through.
     """
-    if query_param not in QUERY_PARAM_VALUES:
+    # read into a local since another thread may invalidate the cached values
+    values = QUERY_PARAM_VALUES.get(query_param)
+    if values is None:
         if query_param == '{SEASON}':
             values = CONFIG['SEASONS']
         elif query_param == '{PLAYER_ID}':
@@ -52,7 +68,112 @@ def get_possible_query_param_values(query_param, is_daily):
             return [CONFIG['CURRENT_SEASON']]
         elif query_param == '{DATE_TO}':
             today_date = datetime.datetime.today().strftime(PROPER_DATE_FORMAT)
-            prev_dates = QUERY_PARAM_VALUES[query_param][CONFIG['CURRENT_SEASON']]
+            prev_dates = values[CONFIG['CURRENT_SEASON']]
             return {CONFIG['CURRENT_SEASON']: prev_dates + [format_date_for_api_request(get_date_before(today_date))]}
 
-    return QUERY_PARAM_VALUES[query_param]
+    return values
+
+
+def invalidate_query_param_values(table_name):
+    """
+    Forgets the cached values of every fillable that is read
+    from the table, so that they are read again after the
+    table changed.
+    """
+    for query_param, query_param_table_name in QUERY_PARAM_TABLES.items():
+        if query_param_table_name == table_name:
+            QUERY_PARAM_VALUES.pop(query_param, None)
+    if table_name == QUERY_PARAM_TABLES['{GAME_ID}']:
+        GAME_DATES_BY_GAME_ID.clear()
+
+
+def get_high_water_marks(query_param, data_name):
+    """
+    Returns a mapping of season to the date (YYYY-MM-DD) of the
+    latest value of the query_param that is stored in the table
+    data_name. For {GAME_ID}, this is the date of the latest game.
+
+    Seasons without any stored values are not in the mapping.
+    """
+    if query_param not in INCREMENTAL_QUERY_PARAMS:
+        raise ValueError('Unsupported incremental fillable type: {}'.format(query_param))
+
+    column_name = query_param[1:-1]
+    table_schema = db.schema_catalog.get_table_schema(data_name)
+    if (table_schema is None or column_name not in table_schema.column_names
+            or 'SEASON' not in table_schema.column_names):
+        return {}
+
+    if query_param == '{GAME_ID}':
+        season_date_tuples = db.utils.execute_sql("""SELECT SEASON, MAX(GAME_DATE) FROM games
+                                                     WHERE GAME_ID IN (SELECT GAME_ID FROM {})
+                                                     GROUP BY SEASON;""".format(data_name)).rows
+    else:
+        season_date_tuples = db.utils.execute_sql("""SELECT SEASON, MAX({}) FROM {} GROUP BY SEASON;""".format(
+            column_name, data_name)).rows
+    return {season: date for season, date in season_date_tuples if date is not None}
+
+
+def get_earliest_high_water_marks(query_param, data_names):
+    """
+    Returns a mapping of season to the earliest high water mark
+    (see get_high_water_marks) of the tables data_names, so that
+    values missing from any of the tables are filled in.
+
+    Seasons without any stored values in one of the tables
+    are not in the mapping.
+    """
+    earliest_high_water_marks = None
+    for data_name in data_names:
+        high_water_marks = get_high_water_marks(query_param, data_name)
+        if earliest_high_water_marks is None:
+            earliest_high_water_marks = high_water_marks
+        else:
+            earliest_high_water_marks = {season: min(date, high_water_marks[season])
+                                         for season, date in earliest_high_water_marks.items()
+                                         if season in high_water_marks}
+    return earliest_high_water_marks if earliest_high_water_marks is not None else {}
+
+
+def get_query_param_value_date(query_param, value):
+    """
+    Returns the date (YYYY-MM-DD) that a value of an
+    incremental query_param belongs to.
+
+    >>> get_query_param_value_date('{DATE_TO}', '10%2F17%2F2017')
+    '2017-10-17'
+    >>> get_query_param_value_date('{GAME_DATE}', '2017-10-17')
+    '2017-10-17'
+    """
+    if query_param == '{GAME_ID}':
+        if len(GAME_DATES_BY_GAME_ID) == 0:
+            GAME_DATES_BY_GAME_ID.update(db.retrieve.fetch_game_dates_by_game_id())
+        return GAME_DATES_BY_GAME_ID.get(value)
+    return format_date(value)
+
+
+def get_values_after_high_water_mark(query_param, values, high_water_mark):
+    """
+    Returns the values of an incremental query_param that
+    belong to the date of the high_water_mark (YYYY-MM-DD) or
+    after it, or whose date is unknown.
+    All values are returned if there is no high_water_mark.
+
+    Values on the date of the high_water_mark are kept since
+    only some of them may have been stored (Ex. a run was
+    interrupted after storing some of the games of that day).
+    The ones that were already scraped are skipped with the
+    scrape_log like in any other scrape.
+
+    >>> get_values_after_high_water_mark('{DATE_TO}', ['10%2F16%2F2017', '10%2F17%2F2017', '10%2F18%2F2017'],
+    ...                                  '2017-10-17')
+    ['10%2F17%2F2017', '10%2F18%2F2017']
+    """
+    if high_water_mark is None:
+        return values
+    values_after_high_water_mark = []
+    for value in values:
+        value_date = get_query_param_value_date(query_param, value)
+        if value_date is None or value_date >= high_water_mark:
+            values_after_high_water_mark.append(value)
+    return values_after_high_water_mark
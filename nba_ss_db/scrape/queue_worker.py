@@ -0,0 +1,238 @@
+"""
+Scrapes the api requests in the scrape queue (see db/scrape_queue.py)
+with any number of worker processes.
+
+Every api request of a job is queued once with enqueue_scrape_jobs,
+then each worker repeatedly claims a batch of api requests, scrapes
+them and stores the responses until the queue is empty.
+
+Jobs are queued in the order of their dependencies (see
+scheduler.py). A job that depends on other jobs of the file (Ex. a
+{GAME_ID} job on the job storing "games") is deferred and its api
+requests are queued by a worker once the jobs it depends on are done.
+"""
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+import yaml
+
+from .. import db, metrics, CONFIG
+from . import pipeline, scheduler
+from .fillable_api_request import FillableAPIRequest, APIRequest
+from .query_param_values import invalidate_query_param_values
+from .scraper import parse_scrape_job, fetch_body, parse_result_sets, add_result_sets
+from .utils import get_job_name
+
+
+def enqueue_scrape_jobs(path_to_api_requests: str, is_daily=False):
+    """
+    Adds every api request of the scrape jobs specified in the
+    yaml file at the given path to the scrape queue, deferring the
+    jobs that depend on other jobs of the file until those are done.
+
+    Api requests that have already been scraped are skipped
+    the same way as in run_scrape_jobs.
+    """
+    with open(path_to_api_requests, 'r') as f:
+        jobs = scheduler.merge_jobs(yaml.load(f))
+    dependencies = scheduler.get_job_dependencies(jobs)
+    for i in scheduler.get_job_order(dependencies):
+        if len(dependencies[i]) == 0:
+            enqueue_scrape_job(jobs[i], is_daily)
+        else:
+            depends_on_jobs = [jobs[j] for j in sorted(dependencies[i])]
+            db.scrape_queue.defer_job(jobs[i], depends_on_jobs, is_daily)
+            print('Deferred {} until {} are scraped'.format(
+                get_job_name(jobs[i]), ', '.join(get_job_name(job) for job in depends_on_jobs)))
+
+
+def enqueue_scrape_job(job, is_daily=False):
+    """
+    Adds every api request of the job that hasn't
+    been scraped yet to the scrape queue.
+    """
+    scrape_job = parse_scrape_job(job)
+    data_name = scrape_job['data_name']
+    result_sets = scrape_job['result_sets']
+    fillable_api_request = FillableAPIRequest(job['API_ENDPOINT'], is_daily,
+                                              [result_set['data_name'] for result_set in result_sets])
+
+    # an api request is queued if any of the tables of the job is missing it
+    scraped_request_hashes = set.intersection(*(
+        set() if result_set['daily_scrape'] and is_daily
+        else db.request_logger.get_scraped_request_hashes(result_set['data_name'])
+        for result_set in result_sets))
+    api_requests = (api_request for api_request in fillable_api_request.generate_api_requests()
+                    if db.request_logger.get_request_hash(api_request.api_request) not in scraped_request_hashes)
+
+    num_enqueued = db.scrape_queue.enqueue_job(job, api_requests)
+    print('Queued {} api requests for {}'.format(num_enqueued, data_name))
+
+
+def enqueue_ready_jobs():
+    """
+    Queues the api requests of every deferred job whose
+    dependencies are done. Returns the number of jobs queued.
+    """
+    with db.utils.transaction(immediate=True):
+        ready_jobs = db.scrape_queue.pop_ready_jobs()
+        if len(ready_jobs) > 0:
+            # the tables were written by other workers since they were cached
+            db.request_logger.clear_scraped_requests_cache()
+            db.schema_catalog.clear()
+        for job, is_daily in ready_jobs:
+            for table_name in scheduler.get_read_tables(job):
+                invalidate_query_param_values(table_name)
+            enqueue_scrape_job(job, is_daily)
+    return len(ready_jobs)
+
+
+def run_queue_worker(worker_id=None):
+    """
+    Claims batches of api requests from the scrape queue,
+    scrapes them and stores the responses until the queue is empty
+    and no jobs are deferred. A batch is run through the same fetch,
+    parse and write stages as a job of run_scrape_jobs (see
+    pipeline.py), with the worker's thread as the writer.
+
+    The responses of a batch are stored, logged and marked as done
+    in one transaction, so if the worker crashes, its batch is
+    claimed by another worker once the lease expires. The leases of
+    a batch are renewed while it is being scraped (see
+    renewing_leases). An api request that raises while being scraped
+    or stored is marked as failed rather than stopping the worker.
+
+    Once there is nothing to claim, the worker queues the deferred
+    jobs whose dependencies are done, or waits
+    CONFIG['QUEUE_POLL_TIME'] seconds for other workers to finish them.
+    """
+    if worker_id is None:
+        worker_id = '{}:{}'.format(socket.gethostname(), os.getpid())
+    start_time = time.time()
+
+    # maps a data_name to the arguments of its job
+    jobs = {}
+    num_scraped = 0
+    with db.utils.connection():
+        while True:
+            queue_entries = db.scrape_queue.claim_batch(worker_id)
+            if len(queue_entries) == 0:
+                if enqueue_ready_jobs() > 0:
+                    continue
+                if not db.scrape_queue.has_deferred_jobs():
+                    break
+                time.sleep(CONFIG['QUEUE_POLL_TIME'])
+                continue
+            for queue_entry in queue_entries:
+                if queue_entry.data_name not in jobs:
+                    jobs[queue_entry.data_name] = parse_scrape_job(db.scrape_queue.get_job(queue_entry.data_name))
+
+            def fetch(queue_entry):
+                print(queue_entry.api_request)
+                try:
+                    return queue_entry, fetch_body(queue_entry.api_request)
+                except Exception as e:
+                    return queue_entry, e
+
+            def parse(item):
+                queue_entry, body = item
+                if isinstance(body, Exception):
+                    return item
+                try:
+                    return queue_entry, parse_result_sets(queue_entry.api_request, body,
+                                                          jobs[queue_entry.data_name]['result_sets'])
+                except Exception as e:
+                    return queue_entry, e
+
+            # the batch is written at once below
+            batch_writer = db.batch_writer.BatchWriter(float('inf'), float('inf'), float('inf'))
+            done_queue_ids = []
+
+            def write(item):
+                queue_entry, nba_responses = item
+                if not isinstance(nba_responses, Exception):
+                    job = jobs[queue_entry.data_name]
+                    api_request = APIRequest(queue_entry.api_request, queue_entry.query_params)
+                    try:
+                        add_result_sets(batch_writer, api_request, list(zip(job['result_sets'], nba_responses)))
+                    except Exception as e:
+                        nba_responses = e
+                if isinstance(nba_responses, Exception):
+                    print('Failed to scrape {} (attempt {}): {}'.format(
+                        queue_entry.api_request, queue_entry.attempts, nba_responses))
+                    db.scrape_queue.mark_failed(queue_entry)
+                    return
+
+                done_queue_ids.append(queue_entry.queue_id)
+                metrics.increment('scraped_requests', job=queue_entry.data_name)
+
+            batch_pipeline = pipeline.Pipeline('scrape_queue', serial=CONFIG['MAX_CONCURRENCY'] <= 1)
+            batch_pipeline.add_stage('fetch', fetch, num_threads=min(CONFIG['MAX_CONCURRENCY'], len(queue_entries)))
+            batch_pipeline.add_stage('parse', parse, num_threads=CONFIG['PIPELINE_PARSERS'])
+            with renewing_leases(worker_id, queue_entries):
+                batch_pipeline.run(queue_entries, 'write', write)
+
+                with db.utils.transaction(immediate=True):
+                    batch_writer.flush()
+                    num_done = db.scrape_queue.mark_done(done_queue_ids, worker_id)
+            if num_done < len(done_queue_ids):
+                print('{} lost the lease of {} api requests to another worker.'.format(
+                    worker_id, len(done_queue_ids) - num_done))
+            num_scraped += num_done
+            print('{} scraped {} api requests.'.format(worker_id, num_scraped))
+
+    metrics.write_run_summary('queue_worker', start_time, worker_id=worker_id)
+
+
+@contextmanager
+def renewing_leases(worker_id, queue_entries):
+    """
+    Context manager which renews the worker's leases of the
+    queue_entries every half of CONFIG['QUEUE_LEASE_TIME'] until it
+    exits. The leases are renewed by a thread of their own, so a
+    batch keeps them even while its api requests wait for retries
+    or for the circuit breaker.
+    """
+    queue_ids = [queue_entry.queue_id for queue_entry in queue_entries]
+    stop_event = threading.Event()
+
+    def renew():
+        with db.utils.connection():
+            while not stop_event.wait(CONFIG['QUEUE_LEASE_TIME'] / 2):
+                try:
+                    db.scrape_queue.renew_leases(worker_id, queue_ids)
+                except sqlite3.Error as e:
+                    print('{} couldn\'t renew its leases: {}'.format(worker_id, e))
+
+    renew_thread = threading.Thread(target=renew, name='{}-leases'.format(worker_id), daemon=True)
+    renew_thread.start()
+    try:
+        yield
+    finally:
+        stop_event.set()
+        renew_thread.join()
+
+
+def run_queue_workers(num_workers: int):
+    """
+    Runs num_workers queue workers in separate processes
+    and waits until all of them are done.
+    """
+    if num_workers <= 1:
+        run_queue_worker()
+    else:
+        # each forked worker opens its own database connection and http session
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=run_queue_worker) for _ in range(num_workers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            if worker.exitcode != 0:
+                print('A queue worker exited with code {}.'.format(worker.exitcode))
+
+    print('Scrape queue: {}'.format(db.scrape_queue.get_queue_stats()))
@@ -0,0 +1,149 @@
+"""
+An on-disk cache of the raw json responses from stats.nba.com.
+
+Responses are gzipped and stored under the sha1 hash of the url
+that was requested, sharded into directories by the first two
+characters of the hash:
+
+    RESPONSE_CACHE_PATH/3f/3fa4...c1.json.gz
+
+The cache is bounded by RESPONSE_CACHE_MAX_BYTES. When it grows
+past that size, the least recently used responses are evicted.
+Reading a response counts as using it.
+"""
+import gzip
+import hashlib
+import os
+import threading
+
+from .. import CONFIG
+
+
+CACHE_FILE_EXTENSION = '.json.gz'
+
+# fraction of RESPONSE_CACHE_MAX_BYTES to shrink the cache to when evicting
+EVICTION_TARGET = 0.9
+
+_cache_size = None
+_cache_lock = threading.Lock()
+
+
+def get_cache_key(api_request: str):
+    """
+    Returns the key that a response to api_request is stored under.
+
+    >>> get_cache_key('http://stats.nba.com/stats/leaguegamelog?Season=2017-18')
+    '38383b7ce399fca59b226d9f4b11982b2024670d'
+    """
+    return hashlib.sha1(api_request.encode('utf-8')).hexdigest()
+
+
+def get_cache_file_path(api_request: str):
+    """
+    Returns the path of the file that a response to
+    api_request is stored in.
+    """
+    cache_key = get_cache_key(api_request)
+    return os.path.join(CONFIG['RESPONSE_CACHE_PATH'], cache_key[:2], cache_key + CACHE_FILE_EXTENSION)
+
+
+def contains(api_request: str):
+    """
+    Returns True if a response to api_request is cached.
+    """
+    return os.path.isfile(get_cache_file_path(api_request))
+
+
+def get(api_request: str):
+    """
+    Returns the raw (decompressed) body of the cached response
+    to api_request or None if it isn't cached.
+    """
+    file_path = get_cache_file_path(api_request)
+    try:
+        with gzip.open(file_path, 'rb') as f:
+            body = f.read()
+    except FileNotFoundError:
+        return None
+
+    # mark the response as recently used
+    try:
+        os.utime(file_path)
+    except FileNotFoundError:
+        pass
+    return body
+
+
+def put(api_request: str, body: bytes):
+    """
+    Stores the raw body of a response to api_request,
+    evicting the least recently used responses if the cache
+    has grown past RESPONSE_CACHE_MAX_BYTES.
+    """
+    global _cache_size
+    file_path = get_cache_file_path(api_request)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+    # write to a temporary file first so a reader never sees a partial response
+    # (named by process and thread since workers and shards share the cache)
+    tmp_file_path = '{}.{}.{}.tmp'.format(file_path, os.getpid(), threading.get_ident())
+    with gzip.open(tmp_file_path, 'wb') as f:
+        f.write(body)
+    new_size = os.path.getsize(tmp_file_path)
+    old_size = os.path.getsize(file_path) if os.path.isfile(file_path) else 0
+    os.replace(tmp_file_path, file_path)
+
+    with _cache_lock:
+        if _cache_size is None:
+            _cache_size = _compute_cache_size()
+        else:
+            _cache_size += new_size - old_size
+
+        if _cache_size > CONFIG['RESPONSE_CACHE_MAX_BYTES']:
+            _cache_size = _evict(int(CONFIG['RESPONSE_CACHE_MAX_BYTES'] * EVICTION_TARGET))
+
+
+def clear():
+    """
+    Removes every cached response.
+    """
+    global _cache_size
+    with _cache_lock:
+        for file_path, _, _ in _list_cache_files():
+            os.remove(file_path)
+        _cache_size = 0
+
+
+def _list_cache_files():
+    """
+    Returns a list of (file_path, size, last_used_time) tuples
+    for every cached response.
+    """
+    cache_files = []
+    for dir_path, _, file_names in os.walk(CONFIG['RESPONSE_CACHE_PATH']):
+        for file_name in file_names:
+            if file_name.endswith(CACHE_FILE_EXTENSION):
+                file_path = os.path.join(dir_path, file_name)
+                stat = os.stat(file_path)
+                cache_files.append((file_path, stat.st_size, stat.st_mtime))
+    return cache_files
+
+
+def _compute_cache_size():
+    return sum(size for _, size, _ in _list_cache_files())
+
+
+def _evict(target_size):
+    """
+    Removes the least recently used responses until the
+    cache is no larger than target_size bytes.
+    Returns the new size of the cache.
+    """
+    cache_files = _list_cache_files()
+    cache_size = sum(size for _, size, _ in cache_files)
+    for file_path, size, _ in sorted(cache_files, key=lambda cache_file: cache_file[2]):
+        if cache_size <= target_size:
+            break
+        os.remove(file_path)
+        cache_size -= size
+    return cache_size
@@ -0,0 +1,233 @@
+"""
+Decides whether and how long to wait before retrying a failed
+api request.
+
+Errors are classified so that only errors that might go away
+(timeouts, throttling, server errors and malformed json) are retried.
+Retries back off exponentially with jitter and honor the Retry-After
+header. A circuit breaker per host pauses every request to that host
+when too many of its recent requests have failed.
+"""
+import email.utils
+import random
+import threading
+import time
+import urllib.parse
+from collections import deque
+
+import requests
+
+from .. import metrics, CONFIG
+
+
+TIMEOUT = 'timeout'
+CONNECTION_ERROR = 'connection_error'
+THROTTLED = 'throttled'
+SERVER_ERROR = 'server_error'
+CLIENT_ERROR = 'client_error'
+MALFORMED_JSON = 'malformed_json'
+UNKNOWN_ERROR = 'unknown_error'
+
+RETRYABLE_ERRORS = {TIMEOUT, CONNECTION_ERROR, THROTTLED, SERVER_ERROR, MALFORMED_JSON}
+
+
+class HTTPStatusError(IOError):
+    """
+    Raised when stats.nba.com responds with an unexpected status code.
+    """
+
+    def __init__(self, status_code: int, retry_after=None):
+        super().__init__('Unexpected status code: {}'.format(status_code))
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def raise_for_status(response):
+    """
+    Raises a HTTPStatusError if the response was not successful.
+    """
+    if response.status_code != 200:
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        raise HTTPStatusError(response.status_code, retry_after)
+
+
+def parse_retry_after(retry_after):
+    """
+    Returns the number of seconds to wait according to the
+    value of a Retry-After header or None if there wasn't one
+    (or it couldn't be parsed).
+
+    >>> parse_retry_after('120')
+    120.0
+    >>> parse_retry_after(None) is None
+    True
+    >>> parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT')
+    0.0
+    >>> parse_retry_after('soon') is None
+    True
+    """
+    if retry_after is None:
+        return None
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        retry_date = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    if retry_date is None:
+        return None
+    return max(retry_date.timestamp() - time.time(), 0.0)
+
+
+def classify_error(error: Exception):
+    """
+    Returns which kind of error was raised while making an api request.
+
+    >>> classify_error(HTTPStatusError(429))
+    'throttled'
+    >>> classify_error(HTTPStatusError(503))
+    'server_error'
+    >>> classify_error(HTTPStatusError(404))
+    'client_error'
+    >>> classify_error(ValueError('Expecting value: line 1 column 1 (char 0)'))
+    'malformed_json'
+    """
+    if isinstance(error, HTTPStatusError):
+        if error.status_code == 429:
+            return THROTTLED
+        elif error.status_code >= 500:
+            return SERVER_ERROR
+        return CLIENT_ERROR
+    elif isinstance(error, requests.Timeout):
+        return TIMEOUT
+    elif isinstance(error, requests.ConnectionError):
+        return CONNECTION_ERROR
+    elif isinstance(error, (ValueError, KeyError, IndexError, TypeError)):
+        # raised when decoding the json or accessing its result sets
+        return MALFORMED_JSON
+    return UNKNOWN_ERROR
+
+
+def is_retryable(error_class: str):
+    return error_class in RETRYABLE_ERRORS
+
+
+def get_backoff_time(attempt: int, retry_after=None):
+    """
+    Returns the number of seconds to wait before the given
+    retry attempt (starting at 0).
+
+    The wait is picked uniformly at random up to an exponentially
+    growing limit (CONFIG['SLEEP_TIME'] * 2 ** attempt) which is
+    capped at CONFIG['BACKOFF_MAX_TIME']. If the server asked us to
+    wait with a Retry-After header, we wait at least that long.
+    """
+    backoff_limit = min(CONFIG['SLEEP_TIME'] * 2 ** attempt, CONFIG['BACKOFF_MAX_TIME'])
+    backoff_time = random.uniform(0, backoff_limit)
+    if retry_after is not None:
+        backoff_time = max(backoff_time, min(retry_after, CONFIG['BACKOFF_MAX_TIME']))
+    return backoff_time
+
+
+def get_endpoint(api_request: str):
+    """
+    Returns the endpoint of the api request.
+
+    >>> get_endpoint('http://stats.nba.com/stats/leaguegamelog?Season=2017-18')
+    'leaguegamelog'
+    """
+    return urllib.parse.urlsplit(api_request).path.rstrip('/').split('/')[-1]
+
+
+def get_host(api_request: str):
+    """
+    >>> get_host('http://stats.nba.com/stats/leaguegamelog?Season=2017-18')
+    'stats.nba.com'
+    """
+    return urllib.parse.urlsplit(api_request).netloc
+
+
+def record_retry(api_request: str, error_class: str):
+    metrics.increment('retries', endpoint=get_endpoint(api_request), error=error_class)
+
+
+def get_retry_stats():
+    """
+    Returns a dictionary mapping each endpoint to a dictionary
+    of the number of retries for each kind of error.
+    """
+    retry_stats = {}
+    for labels, count in metrics.get_counters('retries').items():
+        labels = dict(labels)
+        retry_stats.setdefault(labels['endpoint'], {})[labels['error']] = count
+    return retry_stats
+
+
+class CircuitBreaker():
+    """
+    Keeps track of the outcomes of the most recent requests to a host.
+
+    When at least CIRCUIT_BREAKER_ERROR_RATE of the last
+    CIRCUIT_BREAKER_WINDOW requests failed, the breaker opens and
+    every request to the host waits CIRCUIT_BREAKER_COOLDOWN seconds
+    before being made.
+    """
+
+    def __init__(self, host: str):
+        self.host = host
+        self._outcomes = deque(maxlen=CONFIG['CIRCUIT_BREAKER_WINDOW'])
+        self._open_until = 0
+        self._lock = threading.Lock()
+
+    def wait_until_closed(self):
+        """
+        Blocks until requests can be made to the host.
+        """
+        while True:
+            with self._lock:
+                wait_time = self._open_until - time.time()
+            if wait_time <= 0:
+                return
+            time.sleep(wait_time)
+
+    def record_success(self):
+        with self._lock:
+            self._outcomes.append(True)
+
+    def record_failure(self):
+        with self._lock:
+            self._outcomes.append(False)
+            if self._should_open():
+                self._open_until = time.time() + CONFIG['CIRCUIT_BREAKER_COOLDOWN']
+                # start over once the breaker closes again
+                self._outcomes.clear()
+                print('Pausing requests to {} for {} seconds.'.format(
+                    self.host, CONFIG['CIRCUIT_BREAKER_COOLDOWN']))
+
+    def is_open(self):
+        with self._lock:
+            return self._open_until > time.time()
+
+    def _should_open(self):
+        if len(self._outcomes) < self._outcomes.maxlen:
+            return False
+        num_failures = sum(1 for outcome in self._outcomes if not outcome)
+        return num_failures / len(self._outcomes) >= CONFIG['CIRCUIT_BREAKER_ERROR_RATE']
+
+
+CIRCUIT_BREAKERS = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(api_request: str):
+    """
+    Returns the circuit breaker of the host of the api request.
+    """
+    host = get_host(api_request)
+    with _circuit_breakers_lock:
+        if host not in CIRCUIT_BREAKERS:
+            CIRCUIT_BREAKERS[host] = CircuitBreaker(host)
+        return CIRCUIT_BREAKERS[host]
@@ -0,0 +1,177 @@
+"""
+Orders and runs scrape jobs according to the tables they depend on.
+
+A job depends on the jobs that store the tables its fillables are
+read from (see QUERY_PARAM_TABLES), for example a job with {GAME_ID}
+depends on the job that stores "games". Jobs that don't depend on
+each other are run at the same time.
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from .. import db, CONFIG
+from .query_param_values import QUERY_PARAM_TABLES, invalidate_query_param_values
+from .utils import canonicalize_api_request, get_result_sets
+
+
+def get_read_tables(job):
+    """
+    Returns the set of tables that the fillable values of
+    the job (an entry of an api requests yaml file) are read from.
+    """
+    return {table_name for query_param, table_name in QUERY_PARAM_TABLES.items()
+            if query_param in job['API_ENDPOINT']}
+
+
+def get_stored_tables(job):
+    """
+    Returns the list of tables that the job stores.
+    """
+    return [result_set['DATA_NAME'] for result_set in get_result_sets(job)]
+
+
+def stores_query_param_table(job):
+    """
+    Returns True if the job stores a table that the fillable
+    values of jobs are read from (see QUERY_PARAM_TABLES).
+
+    >>> stores_query_param_table({'DATA_NAME': 'games', 'API_ENDPOINT': 'http://stats.nba.com/stats/test'})
+    True
+    """
+    return not set(get_stored_tables(job)).isdisjoint(QUERY_PARAM_TABLES.values())
+
+
+def merge_jobs(jobs):
+    """
+    Returns the jobs with every group of jobs whose api requests
+    are the same (up to the order of their query parameters)
+    merged into one job storing the result sets of all of them,
+    so that each api request is only made once in a run.
+
+    A merged job takes the place of the first job of its group.
+
+    >>> merge_jobs([{'DATA_NAME': 'a', 'API_ENDPOINT': 'http://s/x?A=1&B={SEASON}', 'RESULT_SET_INDEX': 1},
+    ...             {'DATA_NAME': 'b', 'API_ENDPOINT': 'http://s/y?A=1'},
+    ...             {'DATA_NAME': 'c', 'API_ENDPOINT': 'http://s/x?B={SEASON}&A=1'}])
+    [{'API_ENDPOINT': 'http://s/x?A=1&B={SEASON}', 'RESULT_SETS': [{'DATA_NAME': 'a', 'RESULT_SET_INDEX': 1}, \
+{'DATA_NAME': 'c'}]}, {'DATA_NAME': 'b', 'API_ENDPOINT': 'http://s/y?A=1'}]
+    """
+    jobs_by_api_endpoint = OrderedDict()
+    for job in jobs:
+        jobs_by_api_endpoint.setdefault(canonicalize_api_request(job['API_ENDPOINT']), []).append(job)
+
+    merged_jobs = []
+    for same_jobs in jobs_by_api_endpoint.values():
+        if len(same_jobs) == 1:
+            merged_jobs.append(same_jobs[0])
+            continue
+        result_sets = []
+        for job in same_jobs:
+            for result_set in get_result_sets(job):
+                result_set = {key: value for key, value in result_set.items() if key != 'API_ENDPOINT'}
+                if result_set not in result_sets:
+                    result_sets.append(result_set)
+        merged_jobs.append({'API_ENDPOINT': same_jobs[0]['API_ENDPOINT'], 'RESULT_SETS': result_sets})
+    return merged_jobs
+
+
+def get_job_dependencies(jobs):
+    """
+    Returns a list with the set of indicies of the jobs that
+    each job depends on.
+
+    A job depends on the jobs before or after it that store
+    a table it reads from, and on the jobs before it that store
+    the same table. Tables that no job stores are expected to be
+    in the database already. A ValueError is raised if the
+    dependencies are circular.
+    """
+    producers = {}
+    for i, job in enumerate(jobs):
+        for table_name in get_stored_tables(job):
+            producers.setdefault(table_name, []).append(i)
+
+    dependencies = []
+    for i, job in enumerate(jobs):
+        job_dependencies = set()
+        stored_tables = get_stored_tables(job)
+        for table_name in get_read_tables(job):
+            # a job that reads its own table uses what is already stored
+            if table_name not in stored_tables:
+                job_dependencies.update(producers.get(table_name, []))
+        # jobs storing the same table run in file order
+        for table_name in stored_tables:
+            job_dependencies.update(j for j in producers[table_name] if j < i)
+        dependencies.append(job_dependencies)
+
+    get_job_order(dependencies)
+    return dependencies
+
+
+def get_job_order(dependencies):
+    """
+    Returns the indicies of the jobs in an order in which
+    every job comes after the jobs it depends on (ties are
+    kept in file order).
+
+    >>> get_job_order([{2}, set(), {1}])
+    [1, 2, 0]
+    """
+    job_order = []
+    remaining = set(range(len(dependencies)))
+    while len(remaining) > 0:
+        ready = [i for i in sorted(remaining) if dependencies[i].isdisjoint(remaining)]
+        if len(ready) == 0:
+            raise ValueError('Scrape jobs have circular dependencies: {}'.format(sorted(remaining)))
+        job_order.append(ready[0])
+        remaining.remove(ready[0])
+    return job_order
+
+
+def run_jobs(jobs, run_job, max_concurrency=None):
+    """
+    Calls run_job on every job after the jobs it depends on
+    finished, running up to max_concurrency (CONFIG['JOB_CONCURRENCY'])
+    jobs at once in separate threads.
+
+    Once a job finished, the cached fillable values read from
+    its table are invalidated so that the jobs depending on it
+    see what it stored.
+    """
+    if max_concurrency is None:
+        max_concurrency = CONFIG['JOB_CONCURRENCY']
+    dependencies = get_job_dependencies(jobs)
+
+    if max_concurrency <= 1:
+        for i in get_job_order(dependencies):
+            run_job(jobs[i])
+            for table_name in get_stored_tables(jobs[i]):
+                invalidate_query_param_values(table_name)
+        return
+
+    def run_job_with_connection(job):
+        # each thread uses (and closes) its own connection
+        with db.utils.connection():
+            run_job(job)
+
+    waiting = set(range(len(jobs)))
+    finished = set()
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        running = {}
+
+        def submit_ready_jobs():
+            for i in sorted(waiting):
+                if len(running) < max_concurrency and dependencies[i] <= finished:
+                    waiting.remove(i)
+                    running[executor.submit(run_job_with_connection, jobs[i])] = i
+
+        submit_ready_jobs()
+        while len(running) > 0:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                future.result()
+                for table_name in get_stored_tables(jobs[i]):
+                    invalidate_query_param_values(table_name)
+                finished.add(i)
+            submit_ready_jobs()
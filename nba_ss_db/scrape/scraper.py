@@ -6,46 +6,110 @@ Ex. Scrape all ___ for each season for each position
 Ex. Scrape all ___ for each season for each player_id
 """
 from typing import Dict, List
+import threading
 import time
 import pprint
-import requests
 import yaml
 
-from .. import db, CONFIG
+from .. import db, metrics, profiling, CONFIG
+from . import http_session, json_decoder, pipeline, response_cache, retry_policy, scheduler
 from .fillable_api_request import FillableAPIRequest
-from .utils import format_str_to_nba_response_header
+from .utils import format_str_to_nba_response_header, format_progress, get_shard_index, get_job_name, \
+    get_result_sets
 
-TIMEOUT_TIME = 10
-
-def run_scrape_jobs(path_to_api_requests: str, is_daily=False):
+def run_scrape_jobs(path_to_api_requests: str, is_daily=False, replay=False, shard=None):
     """
     Runs all of the scrape jobs specified in the
     yaml file at the given path.
+
+    If replay is True, the jobs are run against the
+    response cache instead of stats.nba.com.
+
+    If a shard (i, n) is given, only the api requests of the
+    i-th of n shards are scraped (see general_scraper). Jobs
+    storing a table that fillable values are read from (Ex.
+    "games") are scraped in full by every shard, so that every
+    shard fills in the api requests of the jobs depending on them.
+
+    Jobs are run after the jobs that store the tables their
+    fillables are read from, and up to CONFIG['JOB_CONCURRENCY']
+    independent jobs are run at once (see scheduler.py). Jobs
+    with the same API_ENDPOINT are merged into one job which
+    stores the result sets of all of them.
+
+    The metrics of the run (see metrics.py) are written out
+    once every job is done.
     """
+    def run_job(api_request):
+        if CONFIG['VERBOSE']:
+            print('Running the current request:')
+            pprint.pprint(api_request, indent=2)
+        job_name = get_job_name(api_request)
+        with metrics.timer('job_seconds', job=job_name), profiling.profile(job_name):
+            general_scraper(**parse_scrape_job(api_request),
+                            overwrite=replay,
+                            is_daily=is_daily,
+                            replay=replay,
+                            shard=None if scheduler.stores_query_param_table(api_request) else shard)
+
+    # every run reports only its own metrics
+    metrics.reset()
+    start_time = time.time()
     with open(path_to_api_requests, 'r') as f:
         l_requests = yaml.load(f)
-        for api_request in l_requests:
-            if CONFIG['VERBOSE']:
-                print('Running the current request:')
-                pprint.pprint(api_request, indent=2)
-            overwrite_scrape = api_request['DAILY_SCRAPE'] and is_daily
-            ignore_keys = set(api_request['IGNORE_KEYS']) if 'IGNORE_KEYS' in api_request else set()
-            result_set_index = 0 if 'RESULT_SET_INDEX' not in api_request else api_request['RESULT_SET_INDEX']
-            general_scraper(fillable_api_request_str=api_request['API_ENDPOINT'],
-                            data_name=api_request['DATA_NAME'],
-                            primary_keys=api_request['PRIMARY_KEYS'],
-                            result_set_index=result_set_index,
-                            ignore_keys=ignore_keys,
-                            overwrite=overwrite_scrape,
-                            is_daily=is_daily)
-
-
-def run_daily_scrapes(path_to_api_requests: str):
+    # jobs making the same api requests make them once
+    scheduler.run_jobs(scheduler.merge_jobs(l_requests), run_job)
+
+    connection_stats = http_session.get_connection_stats()
+    print('Made {} requests with {} new connections ({} reused).'.format(
+        connection_stats['requests'], connection_stats['connections'], connection_stats['reused_connections']))
+    for endpoint, retry_counts in retry_policy.get_retry_stats().items():
+        print('Retried {} requests to {}: {}'.format(sum(retry_counts.values()), endpoint, retry_counts))
+
+    run_name = 'replay' if replay else 'daily_scrape' if is_daily else 'scrape'
+    summary_path = metrics.write_run_summary(run_name, start_time, path_to_api_requests=path_to_api_requests,
+                                             shard=shard, json_decoder=json_decoder.get_decoder_name())
+    if summary_path is not None:
+        print('Wrote the metrics of the run to {}'.format(summary_path))
+
+
+def parse_scrape_job(job: Dict):
+    """
+    Returns the arguments of general_scraper given by a
+    job (an entry of an api requests yaml file).
+
+    A job stores one or more result sets of the responses to its
+    api requests (see scrape.utils.get_result_sets), each of which
+    is described by a dict in 'result_sets'.
+    """
+    return {
+        'fillable_api_request_str': job['API_ENDPOINT'],
+        'data_name': get_job_name(job),
+        'result_sets': [{
+            'data_name': result_set['DATA_NAME'],
+            'result_set_index': result_set.get('RESULT_SET_INDEX', 0),
+            'primary_keys': result_set['PRIMARY_KEYS'],
+            'ignore_keys': set(result_set.get('IGNORE_KEYS', [])),
+            'daily_scrape': result_set.get('DAILY_SCRAPE', False)
+        } for result_set in get_result_sets(job)]
+    }
+
+
+def run_daily_scrapes(path_to_api_requests: str, shard=None):
     """
     Runs all of the daily scrape jobs specified in the
     yaml file at the given path.
     """
-    run_scrape_jobs(path_to_api_requests, is_daily=True)
+    run_scrape_jobs(path_to_api_requests, is_daily=True, shard=shard)
+
+
+def run_replay_jobs(path_to_api_requests: str, shard=None):
+    """
+    Rebuilds the tables of all of the scrape jobs specified in
+    the yaml file at the given path from the response cache
+    without making any api requests.
+    """
+    run_scrape_jobs(path_to_api_requests, replay=True, shard=shard)
 
 
 class NBAResponse():
@@ -66,6 +130,18 @@ class NBAResponse():
             self._rows = access_row_set(json_response)
         except ValueError:
             raise ValueError('Unexpected JSON formatting of headers and rows.')
+        # columns added with add_col are stored once rather than in every row
+        self._num_row_columns = len(self._headers)
+        self._constant_values = []
+        self._rows_with_constants = None
+
+    @classmethod
+    def from_result_set(cls, result_set: Dict):
+        """
+        Returns the NBAResponse of a single result set
+        (Ex. from json_decoder.decode_result_set).
+        """
+        return cls({'resultSets': [result_set]}, 0)
 
     @property
     def headers(self):
@@ -73,20 +149,51 @@ class NBAResponse():
 
     @property
     def rows(self):
+        """
+        The rows of the response including the added columns
+        (which are only copied into the rows when asked for).
+        """
+        if len(self._constant_values) == 0:
+            return self._rows
+        if self._rows_with_constants is None:
+            self._rows_with_constants = [list(row) + self._constant_values for row in self._rows]
+        return self._rows_with_constants
+
+    @property
+    def row_set(self):
+        """
+        The rows as they were in the json response (without the added columns).
+        """
         return self._rows
 
+    @property
+    def row_headers(self):
+        return self._headers[:self._num_row_columns]
+
+    @property
+    def constant_values(self):
+        """
+        The value of every added column (in the order of the headers after row_headers).
+        """
+        return self._constant_values
+
     def add_col(self, col_name, value):
+        """
+        Adds a column with the same value in every row.
+        """
         self._headers.append(col_name)
-        for row in self.rows:
-            row.append(value)
+        self._constant_values.append(value)
+        self._rows_with_constants = None
+
+    def __len__(self):
+        return len(self._rows)
 
     def __str__(self):
-        return '{} rows with headers: {}'.format(len(self.rows), self.headers)
+        return '{} rows with headers: {}'.format(len(self), self.headers)
 
 
-def general_scraper(fillable_api_request_str: str, data_name: str, primary_keys: List[str],
-                    result_set_index, ignore_keys=set(), overwrite=False,
-                    is_daily=False):
+def general_scraper(fillable_api_request_str: str, data_name: str, result_sets: List[Dict], overwrite=False,
+                    is_daily=False, replay=False, shard=None):
     """
     Scrapes for all combinations denoted by a "fillable" api_request.
 
@@ -103,67 +210,297 @@ def general_scraper(fillable_api_request_str: str, data_name: str, primary_keys:
     - to_date (in which case, a season will have to be fillable)
     - position
     - team_id
+
+    Every api_request is made once and each of the result_sets
+    (see parse_scrape_job) of its response is stored into its own
+    table, skipping the tables that the api_request was already
+    scraped for unless overwrite is True (or the result set is
+    scraped daily and is_daily is True).
+
+    If replay is True, only api_requests with a cached response
+    are stored and no api requests are made.
+
+    If a shard (i, n) is given, only the api_requests assigned to
+    the i-th of n shards are scraped. Each api_request belongs to
+    exactly one shard (see scrape.utils.get_shard_index), so n
+    processes given shards 0/n to (n-1)/n scrape every api_request
+    once without coordinating.
+
+    The api_requests are made by CONFIG['MAX_CONCURRENCY'] threads
+    (sharing CONFIG['MAX_CONCURRENCY'] requests in flight with the
+    other jobs being scraped, see http_session.request_slot),
+    their responses are decoded by CONFIG['PIPELINE_PARSERS'] threads
+    and stored by the calling thread, all at the same time (see
+    pipeline.py). The calling thread is the writer of this job only;
+    the batches of jobs scraped at the same time take turns on
+    SQLite's write lock.
     """
 
     print(data_name)
-    fillable_api_request = FillableAPIRequest(fillable_api_request_str, is_daily)
+    fillable_api_request = FillableAPIRequest(fillable_api_request_str, is_daily,
+                                              [result_set['data_name'] for result_set in result_sets])
     if CONFIG['VERBOSE']:
         print(fillable_api_request)
+        print('Planned api requests by season: {}'.format(dict(fillable_api_request.plan())))
+
+    num_api_requests = fillable_api_request.count()
+    num_api_requests_done = 0
+    start_time = time.time()
+
+    # load every request already scraped for each table once, rather than querying per request
+    scraped_request_hashes = [set() if overwrite or (is_daily and result_set['daily_scrape'])
+                              else db.request_logger.get_scraped_request_hashes(result_set['data_name'])
+                              for result_set in result_sets]
+    # guards the count of api requests done, which is counted by the fetch and write stages
+    progress_lock = threading.Lock()
+
+    def count_api_request_done():
+        nonlocal num_api_requests_done
+        with progress_lock:
+            num_api_requests_done += 1
+            return num_api_requests_done
+
+    def api_requests_to_scrape():
+        """
+        Yields (APIRequest, list of the result sets to store from its response) tuples.
+        """
+        for api_request in fillable_api_request.generate_api_requests():
+            if shard is not None and get_shard_index(api_request.api_request, shard[1]) != shard[0]:
+                # another shard scrapes this request
+                count_api_request_done()
+                metrics.increment('skipped_requests', job=data_name, reason='other_shard')
+                continue
+            with metrics.timer('dedup_check_seconds', job=data_name):
+                request_hash = db.request_logger.get_request_hash(api_request.api_request)
+                unscraped_result_sets = [result_set for result_set, request_hashes
+                                         in zip(result_sets, scraped_request_hashes)
+                                         if request_hash not in request_hashes]
+            if len(unscraped_result_sets) == 0:
+                count_api_request_done()
+                metrics.increment('skipped_requests', job=data_name, reason='already_scraped')
+                if CONFIG['VERBOSE']:
+                    print('Skipping api_request: {}\n because it has already been scraped.'.format(api_request))
+                continue
+            if replay and not response_cache.contains(api_request.api_request):
+                if CONFIG['VERBOSE']:
+                    print('Skipping api_request: {}\n because it is not in the response cache.'.format(api_request))
+                count_api_request_done()
+                metrics.increment('skipped_requests', job=data_name, reason='not_cached')
+                continue
+            yield api_request, unscraped_result_sets
+
+    def fetch(item):
+        api_request, unscraped_result_sets = item
+        print(api_request)
+        return api_request, unscraped_result_sets, fetch_body(api_request.api_request, replay)
+
+    def parse(item):
+        api_request, unscraped_result_sets, body = item
+        nba_responses = parse_result_sets(api_request.api_request, body, result_sets, replay)
+        return api_request, get_result_set_responses(api_request, [
+            (result_set, nba_response) for result_set, nba_response in zip(result_sets, nba_responses)
+            if result_set in unscraped_result_sets])
+
+    # responses are stored and logged together in batches
+    with db.batch_writer.BatchWriter() as batch_writer:
+        def write(item):
+            api_request, responses = item
+            print('{} {}'.format(format_progress(count_api_request_done(), num_api_requests,
+                                                 time.time() - start_time), data_name))
+            batch_writer.add_all(api_request.api_request, responses)
+            metrics.increment('scraped_requests', job=data_name)
+
+        # no more requests than there are to make are kept in flight
+        max_concurrency = max(min(CONFIG['MAX_CONCURRENCY'], num_api_requests), 1)
+        # everything is run on this thread when scraping serially
+        scrape_pipeline = pipeline.Pipeline(data_name, serial=CONFIG['MAX_CONCURRENCY'] <= 1)
+        scrape_pipeline.add_stage('fetch', fetch, num_threads=max_concurrency)
+        scrape_pipeline.add_stage('parse', parse, num_threads=CONFIG['PIPELINE_PARSERS'])
+        scrape_pipeline.run(api_requests_to_scrape(), 'write', write)
+
+
+def add_result_sets(batch_writer, api_request, result_set_responses):
+    """
+    Adds the primary key columns to the response of every
+    result set in result_set_responses (a list of
+    (result set, NBAResponse) tuples) and buffers all of them
+    at once, so that they are written in the same transaction.
+    """
+    batch_writer.add_all(api_request.api_request, get_result_set_responses(api_request, result_set_responses))
 
-    for api_request in fillable_api_request.generate_api_requests():
 
-        if not (overwrite or not db.request_logger.already_scraped(api_request.api_request)):
-            if CONFIG['VERBOSE']:
-                print('Skipping api_request: {}\n because it has already been scraped.'.format(api_request))
-            continue
+def get_result_set_responses(api_request, result_set_responses):
+    """
+    Adds the primary key columns to the response of every
+    result set in result_set_responses and returns them as
+    the responses to buffer with BatchWriter.add_all.
+    """
+    responses = []
+    for result_set, nba_response in result_set_responses:
+        add_primary_key_columns(nba_response, api_request.query_params, result_set['primary_keys'])
+        responses.append((result_set['data_name'], nba_response,
+                          result_set['primary_keys'], result_set['ignore_keys']))
+    return responses
 
-        print(api_request)
 
-        api_request_str = api_request.api_request
-        nba_response = scrape(api_request_str, result_set_index)
+def add_primary_key_columns(nba_response, query_params, primary_keys):
+    """
+    Adds a column to the nba_response for every primary key
+    that isn't in the response, filled with the value of the
+    query param of the same name.
+    """
+    for key in primary_keys:
+        key = format_str_to_nba_response_header(key)
 
-        # add any primary key columns from query params
-        for key in primary_keys:
-            key = format_str_to_nba_response_header(key)
+        # add any primary keys not provided in the response
+        if key not in nba_response.headers:
+            col_val = query_params[key]
 
-            # add any primary keys not provided in the response
-            if key not in nba_response.headers:
-                col_val = api_request.query_params[key]
+            if col_val is not None:
+                nba_response.add_col(key, col_val)
+            else:
+                raise ValueError('Unexpected primary key: {}'.format(key))
 
-                if col_val is not None:
-                    nba_response.add_col(key, col_val)
-                else:
-                    raise ValueError('Unexpected primary key: {}'.format(key))
 
-        # store the response into the db
-        db.store.store_nba_response(data_name, nba_response, primary_keys, ignore_keys)
+def parse_result_sets(api_request, body, result_sets, replay=False):
+    """
+    Decodes the body of the response to an api_request into a
+    list with the NBAResponse of each of the result_sets (see
+    parse_scrape_job) and saves it to the response cache.
 
-        # log after it has been stored
-        db.request_logger.log_request(api_request_str, data_name)
+    A malformed body is made again with retries, as scrape would.
+    """
+    result_set_index = get_result_set_index(result_sets)
+    try:
+        nba_responses = parse_body(api_request, body, result_set_index)
+    except Exception:
+        nba_responses = scrape(api_request, result_set_index, replay)
+    else:
+        if CONFIG['RESPONSE_CACHE'] and not replay:
+            response_cache.put(api_request, body)
+    if isinstance(nba_responses, NBAResponse):
+        nba_responses = [nba_responses]
+    return nba_responses
+
+
+def get_result_set_index(result_sets):
+    """
+    Returns the index of the only one of the result_sets or a
+    list of the indicies of all of them (see scrape).
+    """
+    result_set_indicies = [result_set['result_set_index'] for result_set in result_sets]
+    return result_set_indicies[0] if len(result_set_indicies) == 1 else result_set_indicies
 
 
-def scrape(api_request, result_set_index):
+def scrape(api_request, result_set_index, replay=False):
     """
     Tries to make an api_request to stats.nba.com multiple times and
     returns a NBAResponse object containing rows and headers.
+
+    If result_set_index is a list of indicies, a list with
+    the NBAResponse of each result set is returned instead.
+
+    Failed requests are retried according to the retry policy
+    (see retry_policy.py) and requests that can't succeed by
+    retrying (such as a 404) fail right away.
+
+    Raw responses are saved to the response cache if
+    CONFIG['RESPONSE_CACHE'] is True. If replay is True, the
+    response is read from the cache instead.
     """
+    if replay:
+        return parse_body(api_request, read_cached_body(api_request), result_set_index)
 
-    def scrape_json(api_request):
-        """
-        Makes an api_request.
-        """
-        USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/60.0.3112.101 Safari/537.36'
-        response = requests.get(url=api_request, headers={'User-agent':USER_AGENT},
-                                stream=True, allow_redirects=False, timeout=TIMEOUT_TIME)
-        return response.json()
+    def make_request():
+        body = request_body(api_request)
+        # a malformed body is retried like a failed request
+        return body, parse_body(api_request, body, result_set_index)
 
-    try_count = CONFIG['TRY_COUNT']
-    while try_count > 0:
+    body, nba_response = retry_request(api_request, make_request)
+    if CONFIG['RESPONSE_CACHE']:
+        response_cache.put(api_request, body)
+    return nba_response
+
+
+def fetch_body(api_request, replay=False):
+    """
+    Like scrape, but returns the raw body of the response
+    without decoding it (see parse_body) or caching it.
+    """
+    if replay:
+        return read_cached_body(api_request)
+    return retry_request(api_request, lambda: request_body(api_request))
+
+
+def read_cached_body(api_request):
+    body = response_cache.get(api_request)
+    if body is None:
+        raise IOError('The following request is not in the response cache: {}'.format(api_request))
+    return body
+
+
+def request_body(api_request):
+    """
+    Makes an api_request through the shared http session
+    once and returns the raw body of the response.
+    """
+    endpoint = retry_policy.get_endpoint(api_request)
+    # the requests of every job share CONFIG['MAX_CONCURRENCY'] slots
+    with http_session.request_slot(), metrics.timer('request_seconds', endpoint=endpoint):
+        response = http_session.get(api_request)
+    retry_policy.raise_for_status(response)
+    metrics.increment('response_bytes', len(response.content), endpoint=endpoint)
+    return response.content
+
+
+def parse_body(api_request, body, result_set_index):
+    """
+    Decodes the body of the response to an api_request into the
+    NBAResponse of the result set at result_set_index (or a list
+    of NBAResponses if it is a list of indicies).
+    """
+    endpoint = retry_policy.get_endpoint(api_request)
+    if isinstance(result_set_index, list):
+        with metrics.timer('json_decode_seconds', endpoint=endpoint):
+            result_sets = json_decoder.decode_result_sets(body, result_set_index)
+        with metrics.timer('nba_response_seconds', endpoint=endpoint):
+            return [NBAResponse.from_result_set(result_set) for result_set in result_sets]
+    with metrics.timer('json_decode_seconds', endpoint=endpoint):
+        result_set = json_decoder.decode_result_set(body, result_set_index)
+    with metrics.timer('nba_response_seconds', endpoint=endpoint):
+        return NBAResponse.from_result_set(result_set)
+
+
+def retry_request(api_request, make_request):
+    """
+    Calls make_request (which makes the api_request) until it
+    returns, waiting between tries according to the retry policy,
+    and returns its result. Raises an IOError if it never returned.
+    """
+    endpoint = retry_policy.get_endpoint(api_request)
+    circuit_breaker = retry_policy.get_circuit_breaker(api_request)
+    for attempt in range(CONFIG['TRY_COUNT']):
+        circuit_breaker.wait_until_closed()
         try:
-            response_json = scrape_json(api_request)
-            return NBAResponse(response_json, result_set_index)
-        except:
-            time.sleep(CONFIG['SLEEP_TIME'])
-            print('Sleeping on {} for {} seconds.'.format(api_request, CONFIG['SLEEP_TIME']))
-        try_count -= 1
+            result = make_request()
+        except Exception as e:
+            error_class = retry_policy.classify_error(e)
+            metrics.increment('requests', endpoint=endpoint, outcome=error_class)
+            if not retry_policy.is_retryable(error_class):
+                raise IOError('Wasn\'t able to make the following request ({}): {}'.format(
+                    error_class, api_request)) from e
+
+            circuit_breaker.record_failure()
+            if attempt == CONFIG['TRY_COUNT'] - 1:
+                break
+
+            retry_policy.record_retry(api_request, error_class)
+            sleep_time = retry_policy.get_backoff_time(attempt, getattr(e, 'retry_after', None))
+            print('Sleeping on {} for {:.1f} seconds ({}).'.format(api_request, sleep_time, error_class))
+            time.sleep(sleep_time)
+            continue
+
+        circuit_breaker.record_success()
+        metrics.increment('requests', endpoint=endpoint, outcome='ok')
+        return result
     raise IOError('Wasn\'t able to make the following request: {}'.format(api_request))
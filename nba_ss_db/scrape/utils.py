@@ -1,4 +1,8 @@
 import datetime
+import functools
+import hashlib
+import urllib.parse
+import pandas as pd
 
 
 PROPER_DATE_FORMAT = '%Y-%m-%d'
@@ -52,17 +56,74 @@ def is_proper_date_format(date_str):
         return False
 
 
+# the formats of dates in nba responses and api requests (in the order they are tried)
+URL_ENCODED_DATE_FORMAT = '%m%2F%d%2F%Y'
+DATE_FORMATS = [URL_ENCODED_DATE_FORMAT, '%b %d, %Y', '%m/%d/%Y', PROPER_DATE_FORMAT]
+
+# max number of formatted dates to remember
+DATE_CACHE_SIZE = 10000
+
+# columns with at least this many distinct dates are formatted with pandas
+BATCH_FORMAT_MIN_DATES = 1000
+
+
+def get_date_format(date_str):
+    """
+    Returns which of DATE_FORMATS date_str is in (dates in
+    PROPER_DATE_FORMAT may have extra characters after them).
+
+    Throws a ValueError if the date format is unsupported.
+
+    >>> get_date_format('OCT 29, 2016')
+    '%b %d, %Y'
+    >>> get_date_format('2016-10-29T00:00:00')
+    '%Y-%m-%d'
+    """
+    if len(date_str.split('%2F')) == 3:
+        return URL_ENCODED_DATE_FORMAT
+    for date_format in DATE_FORMATS[1:-1]:
+        try:
+            datetime.datetime.strptime(date_str, date_format)
+            return date_format
+        except ValueError:
+            pass
+    datetime.datetime.strptime(date_str[:len(EXAMPLE_PROPER_DATE)], PROPER_DATE_FORMAT)
+    return PROPER_DATE_FORMAT
+
+
+def format_date_with_format(date_str, date_format):
+    """
+    Formats the date_str which is in the date_format
+    (one of DATE_FORMATS) into YYYY-MM-DD format.
+    """
+    if date_format == URL_ENCODED_DATE_FORMAT:
+        month, day, year = date_str.split('%2F')
+        return '{}-{}-{}'.format(year, month, day)
+    if date_format == PROPER_DATE_FORMAT:
+        date_str = date_str[:len(EXAMPLE_PROPER_DATE)]
+    return datetime.datetime.strftime(
+        datetime.datetime.strptime(date_str, date_format),
+        PROPER_DATE_FORMAT
+    )
+
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
 def format_date(date_str):
     """
     Formats the date_str into YYYY-MM-DD format.
 
     Throws an exception if the date format was unsupported
 
-    Add translations as they show up:
+    Add translations to DATE_FORMATS as they show up:
     Currently supported:
+    01%2F25%2F2018
     OCT 29, 2016
+    MM/DD/YYYY
     YYYY-MM-DD[extra_chars]
 
+    Dates repeat in nearly every response (Ex. every player log
+    of a day), so the most recently formatted dates are remembered.
+
     >>> format_date('01%2F25%2F2018')
     '2018-01-25'
     >>> format_date('OCT 29, 2016')
@@ -72,38 +133,41 @@ def format_date(date_str):
     >>> format_date('2016-10-29T000001')
     '2016-10-29'
     """
-    # 01%2F25%2F2018
-    try:
-        month, day, year = date_str.split('%2F')
-        return '{}-{}-{}'.format(year, month, day)
-    except ValueError:
-        pass
+    return format_date_with_format(date_str, get_date_format(date_str))
 
-    # OCT 29, 2016
-    try:
-        return datetime.datetime.strftime(
-            datetime.datetime.strptime(date_str, '%b %d, %Y'),
-            PROPER_DATE_FORMAT
-        )
-    except ValueError:
-        pass
 
-    # MM/DD/YYYY
-    try:
-        return datetime.datetime.strftime(
-            datetime.datetime.strptime(date_str, '%m/%d/%Y'),
-            PROPER_DATE_FORMAT
-        )
-    except ValueError:
-        pass
+def format_dates(date_strs):
+    """
+    Formats a column of dates into YYYY-MM-DD format, formatting
+    every distinct date once. Returns a dict mapping each date_str
+    to its formatted date.
 
-    # YYYY-MM-DD[extra_chars]
-    return datetime.datetime.strftime(
-        datetime.datetime.strptime(date_str[:len(EXAMPLE_PROPER_DATE)], PROPER_DATE_FORMAT),
-        PROPER_DATE_FORMAT
-    )
+    The format is detected from the first date. Large columns are
+    formatted at once with pandas, and dates in another format
+    than the first one are formatted with format_date.
 
+    >>> format_dates(['OCT 29, 2016', 'OCT 29, 2016', '11/10/2017'])
+    {'OCT 29, 2016': '2016-10-29', '11/10/2017': '2017-11-10'}
+    """
+    distinct_date_strs = list(dict.fromkeys(date_strs))
+    if len(distinct_date_strs) < BATCH_FORMAT_MIN_DATES:
+        return {date_str: format_date(date_str) for date_str in distinct_date_strs}
+
+    date_format = get_date_format(distinct_date_strs[0])
+    if date_format == URL_ENCODED_DATE_FORMAT:
+        return {date_str: format_date(date_str) for date_str in distinct_date_strs}
+    to_parse = pd.Series(distinct_date_strs, dtype=object)
+    if date_format == PROPER_DATE_FORMAT:
+        to_parse = to_parse.str.slice(0, len(EXAMPLE_PROPER_DATE))
+    # dates in another format are NaT
+    parsed_dates = pd.to_datetime(to_parse, format=date_format, errors='coerce')
+    formatted_dates = parsed_dates.dt.strftime(PROPER_DATE_FORMAT)
+    return {date_str: (formatted_date if not is_missing else format_date(date_str))
+            for date_str, formatted_date, is_missing
+            in zip(distinct_date_strs, formatted_dates, parsed_dates.isna())}
 
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
 def get_date_before(date_str):
     """
     Returns the date string before date_str (YYYY-MM-DD) format.
@@ -129,6 +193,121 @@ def format_date_for_api_request(date_str):
     return '{}%2F{}%2F{}'.format(month, day, year)
 
 
+def canonicalize_api_request(api_request: str):
+    """
+    Returns a canonical form of the api_request so that requests
+    for the same data compare equal. The scheme is dropped, the
+    host is lowercased and the query parameters are sorted.
+
+    >>> canonicalize_api_request('http://stats.nba.com/stats/boxscoresummaryv2?Season=2017-18&GameID=0021700789')
+    'stats.nba.com/stats/boxscoresummaryv2?GameID=0021700789&Season=2017-18'
+    >>> canonicalize_api_request('https://Stats.NBA.com/stats/leaguegamelog?Season=2017-18&DateTo=')
+    'stats.nba.com/stats/leaguegamelog?DateTo=&Season=2017-18'
+    """
+    split_request = urllib.parse.urlsplit(api_request)
+    query_params = sorted(split_request.query.split('&')) if split_request.query else []
+    return '{}{}?{}'.format(split_request.netloc.lower(), split_request.path, '&'.join(query_params))
+
+
+# keys of a job that are the defaults of each of its RESULT_SETS
+RESULT_SET_DEFAULT_KEYS = {'PRIMARY_KEYS', 'IGNORE_KEYS', 'DAILY_SCRAPE'}
+
+
+def get_result_sets(job: dict):
+    """
+    Returns the result sets that a job (an entry of an api requests
+    yaml file) stores, as a list of dicts with the DATA_NAME,
+    RESULT_SET_INDEX, PRIMARY_KEYS, IGNORE_KEYS and DAILY_SCRAPE
+    of each one.
+
+    A job either stores one result set given by its own keys or
+    the ones in its RESULT_SETS, which default to the PRIMARY_KEYS,
+    IGNORE_KEYS and DAILY_SCRAPE of the job.
+
+    >>> get_result_sets({'DATA_NAME': 'games', 'API_ENDPOINT': '', 'PRIMARY_KEYS': ['GAME_ID']})
+    [{'DATA_NAME': 'games', 'API_ENDPOINT': '', 'PRIMARY_KEYS': ['GAME_ID']}]
+    >>> get_result_sets({'API_ENDPOINT': '', 'PRIMARY_KEYS': ['GAME_ID'], 'RESULT_SETS': [
+    ...     {'DATA_NAME': 'game_summaries'}, {'DATA_NAME': 'game_officials', 'RESULT_SET_INDEX': 2}]})
+    [{'PRIMARY_KEYS': ['GAME_ID'], 'DATA_NAME': 'game_summaries'}, \
+{'PRIMARY_KEYS': ['GAME_ID'], 'DATA_NAME': 'game_officials', 'RESULT_SET_INDEX': 2}]
+    """
+    if 'RESULT_SETS' not in job:
+        return [job]
+    job_defaults = {key: value for key, value in job.items() if key in RESULT_SET_DEFAULT_KEYS}
+    return [dict(job_defaults, **result_set) for result_set in job['RESULT_SETS']]
+
+
+def get_job_name(job: dict):
+    """
+    Returns the DATA_NAME of the job or the DATA_NAMEs of
+    all of its result sets joined by '+' if it has none.
+
+    >>> get_job_name({'API_ENDPOINT': '', 'RESULT_SETS': [{'DATA_NAME': 'game_summaries'}, {'DATA_NAME': 'game_officials'}]})
+    'game_summaries+game_officials'
+    """
+    if 'DATA_NAME' in job:
+        return job['DATA_NAME']
+    return '+'.join(result_set['DATA_NAME'] for result_set in get_result_sets(job))
+
+
+def parse_shard(shard: str):
+    """
+    Parses a shard given as 'i/n' (the i-th of n shards,
+    starting at 0) into a tuple (i, n).
+
+    >>> parse_shard('0/4')
+    (0, 4)
+    >>> parse_shard('4/4')
+    Traceback (most recent call last):
+    ...
+    ValueError: Invalid shard: 4/4 (expected i/n with 0 <= i < n)
+    """
+    try:
+        shard_index, num_shards = (int(s) for s in shard.split('/'))
+    except ValueError:
+        raise ValueError('Invalid shard: {} (expected i/n with 0 <= i < n)'.format(shard))
+    if not 0 <= shard_index < num_shards:
+        raise ValueError('Invalid shard: {} (expected i/n with 0 <= i < n)'.format(shard))
+    return shard_index, num_shards
+
+
+def get_shard_index(api_request: str, num_shards: int):
+    """
+    Returns which of num_shards shards the api_request belongs to.
+
+    The shard only depends on the canonical form of the api_request
+    (see canonicalize_api_request), so every process and machine
+    assigns a request to the same shard.
+
+    >>> get_shard_index('http://stats.nba.com/stats/leaguegamelog?Season=2017-18&Counter=1000', 4) == \
+        get_shard_index('https://stats.nba.com/stats/leaguegamelog?Counter=1000&Season=2017-18', 4)
+    True
+    >>> get_shard_index('http://stats.nba.com/stats/leaguegamelog?Season=2017-18', 1)
+    0
+    """
+    request_digest = hashlib.sha1(canonicalize_api_request(api_request).encode('utf-8')).digest()
+    return int.from_bytes(request_digest[:8], 'big') % num_shards
+
+
+def format_progress(num_done: int, num_total: int, elapsed_time: float):
+    """
+    Returns a string showing how many of num_total steps are done
+    and an estimate of the remaining time given that num_done
+    steps took elapsed_time seconds.
+
+    >>> format_progress(25, 100, 30)
+    '[25/100 25.0% ETA 0:01:30]'
+    >>> format_progress(0, 100, 0)
+    '[0/100 0.0% ETA ?]'
+    """
+    percent_done = 100 * num_done / num_total if num_total != 0 else 100
+    if num_done == 0:
+        eta = '?'
+    else:
+        eta = str(datetime.timedelta(seconds=round(elapsed_time / num_done * (num_total - num_done))))
+    return '[{}/{} {:.1f}% ETA {}]'.format(num_done, num_total, percent_done, eta)
+
+
 def flatten_list(l):
     """
     Flattens a list one level.
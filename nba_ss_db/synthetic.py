@@ -0,0 +1,462 @@
+"""
+Generates synthetic (but statistically plausible) responses for
+every endpoint used in api_requests.yaml and api_requests_init.yaml,
+and databases populated with them at any scale.
+
+A League is generated from a seed, so the same api request always
+gets the same response and the player ids, game ids and game dates
+of every endpoint agree with each other. Players have a role that
+sets how many minutes they play and how often they shoot, and box
+scores are internally consistent (Ex. FGM <= FGA, REB = OREB + DREB
+and PTS = 2 * FGM + FG3M + FTM).
+
+Ex) Populating a database with 10 seasons of 500 players and 82 games per team:
+
+    league = League(seasons=['20{:02d}-{:02d}'.format(y, y + 1) for y in range(8, 18)],
+                    players_per_team=17, games_per_season=1230)
+    populate_database(league)
+"""
+import datetime
+import math
+import random
+import threading
+import urllib.parse
+import yaml
+
+from . import db, scrape, CONFIG
+
+
+NUM_TEAMS = 30
+POSITIONS = ['G', 'F', 'C']
+
+API_REQUESTS_INIT_PATH = 'nba_ss_db/scrape/api_requests_init.yaml'
+API_REQUESTS_PATH = 'api_requests.yaml'
+
+# box score stats shared by most endpoints
+STAT_HEADERS = ['MIN', 'FGM', 'FGA', 'FG_PCT', 'FG3M', 'FG3A', 'FG3_PCT', 'FTM', 'FTA', 'FT_PCT',
+                'OREB', 'DREB', 'REB', 'AST', 'TOV', 'STL', 'BLK', 'BLKA', 'PF', 'PFD', 'PTS', 'PLUS_MINUS']
+
+MEASURE_TYPE_HEADERS = {
+    'Base': STAT_HEADERS,
+    'Advanced': ['MIN', 'OFF_RATING', 'DEF_RATING', 'NET_RATING', 'AST_PCT', 'AST_TO', 'AST_RATIO',
+                 'OREB_PCT', 'DREB_PCT', 'REB_PCT', 'TM_TOV_PCT', 'EFG_PCT', 'TS_PCT', 'USG_PCT', 'PACE', 'PIE'],
+    'Usage': ['MIN', 'USG_PCT', 'PCT_FGM', 'PCT_FGA', 'PCT_FG3M', 'PCT_FG3A', 'PCT_FTM', 'PCT_FTA', 'PCT_OREB',
+              'PCT_DREB', 'PCT_REB', 'PCT_AST', 'PCT_TOV', 'PCT_STL', 'PCT_BLK', 'PCT_BLKA', 'PCT_PF', 'PCT_PTS'],
+    'Four Factors': ['MIN', 'EFG_PCT', 'FTA_RATE', 'TM_TOV_PCT', 'OREB_PCT', 'OPP_EFG_PCT', 'OPP_FTA_RATE',
+                     'OPP_TOV_PCT', 'OPP_OREB_PCT'],
+    'Opponent': ['MIN'] + ['OPP_{}'.format(header) for header in STAT_HEADERS[1:]],
+}
+
+# (mean, standard deviation) of the stats that aren't part of a box score
+STAT_DISTRIBUTIONS = {
+    'OFF_RATING': (108, 8), 'DEF_RATING': (108, 8), 'NET_RATING': (0, 10), 'AST_PCT': (0.15, 0.08),
+    'AST_TO': (1.7, 0.7), 'AST_RATIO': (16, 5), 'OREB_PCT': (0.06, 0.04), 'DREB_PCT': (0.15, 0.06),
+    'REB_PCT': (0.1, 0.05), 'TM_TOV_PCT': (0.13, 0.04), 'EFG_PCT': (0.51, 0.06), 'TS_PCT': (0.55, 0.06),
+    'USG_PCT': (0.19, 0.05), 'PACE': (99, 3), 'PIE': (0.09, 0.05), 'FTA_RATE': (0.27, 0.06),
+    'OPP_EFG_PCT': (0.51, 0.05), 'OPP_FTA_RATE': (0.27, 0.06), 'OPP_TOV_PCT': (0.13, 0.03),
+    'OPP_OREB_PCT': (0.23, 0.04), 'FREQ': (1, 0), 'D_FG_PCT': (0.45, 0.03), 'NORMAL_FG_PCT': (0.46, 0.02),
+    'PCT_PLUSMINUS': (-0.01, 0.02),
+}
+
+
+class Player():
+    """
+    A player and the role that sets their box scores.
+    """
+
+    def __init__(self, player_id: int, player_name: str, team_id: int, position: str, rng):
+        self.player_id = player_id
+        self.player_name = player_name
+        self.team_id = team_id
+        self.position = position
+        self.minutes = min(max(rng.gauss(22, 8), 4), 38)
+        # shots per minute
+        self.usage = min(max(rng.gauss(0.38, 0.1), 0.15), 0.75)
+        self.fg_pct = min(max(rng.gauss(0.46, 0.04), 0.35), 0.65)
+        self.fg3_rate = 0.05 if position == 'C' else min(max(rng.gauss(0.38, 0.12), 0.0), 0.7)
+        self.rebounding = {'G': 0.12, 'F': 0.2, 'C': 0.32}[position]
+        self.passing = {'G': 0.2, 'F': 0.1, 'C': 0.07}[position]
+
+
+class League():
+    """
+    The teams, players and schedule of every season.
+    The size of the league sets the size of the generated data.
+    """
+
+    def __init__(self, seasons=None, players_per_team=15, games_per_season=1230, seed=0):
+        self.seasons = list(CONFIG['SEASONS']) if seasons is None else list(seasons)
+        self.players_per_team = players_per_team
+        self.games_per_season = games_per_season
+        self.seed = seed
+        self.teams = [(1610612737 + i, 'T{:02d}'.format(i), 'Team {}'.format(i)) for i in range(NUM_TEAMS)]
+        self._players = {}
+        self._schedules = {}
+        self._lock = threading.Lock()
+
+    def get_players(self, season):
+        """
+        Returns the list of Players of the season.
+        Players keep their role but change teams every season.
+        """
+        with self._lock:
+            if season not in self._players:
+                start_year = int(season[:4])
+                players = []
+                for i in range(NUM_TEAMS * self.players_per_team):
+                    team = self.teams[(i + start_year) % NUM_TEAMS]
+                    players.append(Player(200000 + i, 'Player {}'.format(i), team[0], POSITIONS[i % len(POSITIONS)],
+                                          random.Random('{}-{}'.format(self.seed, i))))
+                self._players[season] = players
+            return self._players[season]
+
+    def get_schedule(self, season):
+        """
+        Returns a list of (game_id, game_date, home_team, away_team) tuples.
+        """
+        with self._lock:
+            if season not in self._schedules:
+                self._schedules[season] = self._make_schedule(season)
+            return self._schedules[season]
+
+    def _make_schedule(self, season):
+        start_year = int(season[:4])
+        rng = random.Random('{}-{}'.format(self.seed, season))
+        first_date = datetime.date(start_year, 10, 17)
+        games_per_day = max(NUM_TEAMS // 4, 1)
+        schedule = []
+        for i in range(self.games_per_season):
+            if i % games_per_day == 0:
+                # a team plays at most once a day
+                teams = rng.sample(self.teams, NUM_TEAMS)
+            home_team, away_team = teams[2 * (i % games_per_day)], teams[2 * (i % games_per_day) + 1]
+            game_date = first_date + datetime.timedelta(days=i // games_per_day)
+            schedule.append(('002{:02d}{:05d}'.format(start_year % 100, i + 1), game_date.isoformat(),
+                             home_team, away_team))
+        return schedule
+
+    def get_game(self, season, game_id):
+        for game in self.get_schedule(season):
+            if game[0] == game_id:
+                return game
+        return None
+
+
+def _approximate_binomial(rng, n, p):
+    """
+    Returns a sample of a binomial distribution using its normal
+    approximation, which is a lot faster than sampling n times.
+    """
+    sample = round(rng.gauss(n * p, math.sqrt(max(n * p * (1 - p), 0))))
+    return min(max(sample, 0), n)
+
+
+def _pct(made, attempted):
+    return round(made / attempted, 3) if attempted != 0 else 0.0
+
+
+def make_box_score(rng, minutes, usage=0.38, fg_pct=0.46, fg3_rate=0.35, rebounding=0.2, passing=0.12):
+    """
+    Returns a list of values for STAT_HEADERS of someone who
+    played the given minutes (240 for a whole team).
+    """
+    fga = _approximate_binomial(rng, minutes, usage)
+    fg3a = _approximate_binomial(rng, fga, fg3_rate)
+    fgm = _approximate_binomial(rng, fga - fg3a, fg_pct + 0.05) + _approximate_binomial(rng, fg3a, fg_pct - 0.1)
+    fg3m = min(_approximate_binomial(rng, fg3a, fg_pct - 0.1), fgm)
+    fta = _approximate_binomial(rng, minutes, usage * 0.3)
+    ftm = _approximate_binomial(rng, fta, 0.76)
+    oreb = _approximate_binomial(rng, minutes, rebounding * 0.25)
+    dreb = _approximate_binomial(rng, minutes, rebounding * 0.75)
+    ast = _approximate_binomial(rng, minutes, passing)
+    tov = _approximate_binomial(rng, minutes, 0.05)
+    stl = _approximate_binomial(rng, minutes, 0.03)
+    blk = _approximate_binomial(rng, minutes, rebounding * 0.1)
+    blka = _approximate_binomial(rng, fga, 0.06)
+    pf = _approximate_binomial(rng, minutes, 0.08)
+    pfd = _approximate_binomial(rng, minutes, 0.08)
+    pts = 2 * fgm + fg3m + ftm
+    plus_minus = round(rng.gauss(0, 0.3 * math.sqrt(minutes + 1)))
+    return [minutes, fgm, fga, _pct(fgm, fga), fg3m, fg3a, _pct(fg3m, fg3a), ftm, fta, _pct(ftm, fta),
+            oreb, dreb, oreb + dreb, ast, tov, stl, blk, blka, pf, pfd, pts, plus_minus]
+
+
+def make_player_box_score(rng, player):
+    minutes = min(max(round(rng.gauss(player.minutes, 4)), 0), 48)
+    return make_box_score(rng, minutes, player.usage, player.fg_pct, player.fg3_rate,
+                          player.rebounding, player.passing)
+
+
+def make_team_box_score(rng):
+    return make_box_score(rng, 240, usage=0.37, fg3_rate=0.33, rebounding=0.19, passing=0.1)
+
+
+def make_stats(rng, headers, box_score=None):
+    """
+    Returns plausible values of the given headers. Headers in
+    STAT_HEADERS (or their OPP_ versions) are taken from the box_score.
+    """
+    values = []
+    for header in headers:
+        stat_header = header[len('OPP_'):] if header.startswith('OPP_') and header not in STAT_DISTRIBUTIONS else header
+        if stat_header in STAT_HEADERS:
+            if box_score is None:
+                box_score = make_team_box_score(rng)
+            values.append(box_score[STAT_HEADERS.index(stat_header)])
+        elif header in STAT_DISTRIBUTIONS:
+            mean, std = STAT_DISTRIBUTIONS[header]
+            values.append(round(rng.gauss(mean, std), 3))
+        elif header.startswith('PCT_'):
+            values.append(round(min(max(rng.gauss(0.2, 0.08), 0), 1), 3))
+        else:
+            values.append(rng.randint(0, 20))
+    return values
+
+
+def make_result_set(name, headers, rows):
+    return {'name': name, 'headers': headers, 'rowSet': rows}
+
+
+def league_dash_player_stats(league, query_params, rng):
+    season = query_params.get('Season', league.seasons[-1])
+    measure_headers = MEASURE_TYPE_HEADERS.get(query_params.get('MeasureType', 'Base'), STAT_HEADERS)
+    headers = ['PLAYER_ID', 'PLAYER_NAME', 'TEAM_ID', 'TEAM_ABBREVIATION', 'AGE', 'GP', 'W', 'L', 'W_PCT'] + \
+        measure_headers + ['NBA_FANTASY_PTS', 'DD2', 'TD3', 'CFID', 'CFPARAMS']
+    abbreviations = {team_id: abbreviation for team_id, abbreviation, _ in league.teams}
+    rows = []
+    for player in league.get_players(season):
+        if query_params.get('PlayerPosition') and query_params['PlayerPosition'] != player.position:
+            continue
+        gp = rng.randint(1, 82)
+        w = rng.randint(0, gp)
+        box_score = make_player_box_score(rng, player)
+        fantasy_pts = box_score[STAT_HEADERS.index('PTS')] + 1.2 * box_score[STAT_HEADERS.index('REB')] + \
+            1.5 * box_score[STAT_HEADERS.index('AST')]
+        rows.append([player.player_id, player.player_name, player.team_id, abbreviations[player.team_id],
+                     rng.randint(19, 38), gp, w, gp - w, _pct(w, gp)] + make_stats(rng, measure_headers, box_score) +
+                    [round(fantasy_pts, 1), rng.randint(0, gp // 4), 0, 5,
+                     '{},{}'.format(player.player_id, player.team_id)])
+    return [make_result_set('LeagueDashPlayerStats', headers, rows)]
+
+
+def league_dash_team_stats(league, query_params, rng):
+    measure_headers = MEASURE_TYPE_HEADERS.get(query_params.get('MeasureType', 'Base'), STAT_HEADERS)
+    headers = ['TEAM_ID', 'TEAM_NAME', 'GP', 'W', 'L', 'W_PCT'] + measure_headers + ['CFID', 'CFPARAMS']
+    rows = []
+    for team_id, _, team_name in league.teams:
+        gp = rng.randint(1, 82)
+        w = rng.randint(0, gp)
+        rows.append([team_id, team_name, gp, w, gp - w, _pct(w, gp)] + make_stats(rng, measure_headers) +
+                    [10, str(team_id)])
+    return [make_result_set('LeagueDashTeamStats', headers, rows)]
+
+
+def league_dash_pt_team_defend(league, query_params, rng):
+    headers = ['TEAM_ID', 'TEAM_NAME', 'TEAM_ABBREVIATION', 'GP', 'G', 'FREQ', 'D_FGM', 'D_FGA', 'D_FG_PCT',
+               'NORMAL_FG_PCT', 'PCT_PLUSMINUS']
+    rows = []
+    for team_id, abbreviation, team_name in league.teams:
+        gp = rng.randint(1, 82)
+        d_fga = _approximate_binomial(rng, 90, 0.95)
+        d_fgm = _approximate_binomial(rng, d_fga, 0.45)
+        rows.append([team_id, team_name, abbreviation, gp, gp, 1.0, d_fgm, d_fga, _pct(d_fgm, d_fga)] +
+                    make_stats(rng, headers[9:]))
+    return [make_result_set('LeagueDashPtTeamDefend', headers, rows)]
+
+
+def get_game_box_scores(league, game):
+    """
+    Returns the team box scores of the home and away team of a game.
+    """
+    rng = random.Random('{}-{}'.format(league.seed, game[0]))
+    home_box_score, away_box_score = make_team_box_score(rng), make_team_box_score(rng)
+    pts_i = STAT_HEADERS.index('PTS')
+    if home_box_score[pts_i] == away_box_score[pts_i]:
+        # there are no ties, so the home team made one more free throw
+        ftm_i, fta_i = STAT_HEADERS.index('FTM'), STAT_HEADERS.index('FTA')
+        home_box_score[ftm_i] += 1
+        home_box_score[fta_i] = max(home_box_score[fta_i], home_box_score[ftm_i])
+        home_box_score[STAT_HEADERS.index('FT_PCT')] = _pct(home_box_score[ftm_i], home_box_score[fta_i])
+        home_box_score[pts_i] += 1
+    home_box_score[-1] = home_box_score[pts_i] - away_box_score[pts_i]
+    away_box_score[-1] = -home_box_score[-1]
+    return home_box_score, away_box_score
+
+
+def get_wl(box_score, opponent_box_score):
+    pts_i = STAT_HEADERS.index('PTS')
+    return 'W' if box_score[pts_i] > opponent_box_score[pts_i] else 'L'
+
+
+def league_game_log(league, query_params, rng):
+    season = query_params.get('Season', league.seasons[-1])
+    headers = ['SEASON_ID', 'TEAM_ID', 'TEAM_ABBREVIATION', 'TEAM_NAME', 'GAME_ID', 'GAME_DATE', 'MATCHUP', 'WL'] + \
+        STAT_HEADERS + ['VIDEO_AVAILABLE']
+    rows = []
+    for game in league.get_schedule(season):
+        game_id, game_date, home_team, away_team = game
+        home_box_score, away_box_score = get_game_box_scores(league, game)
+        for team, opponent, matchup, box_score, opponent_box_score in (
+                (home_team, away_team, '{} vs. {}', home_box_score, away_box_score),
+                (away_team, home_team, '{} @ {}', away_box_score, home_box_score)):
+            rows.append(['2{}'.format(season[:4]), team[0], team[1], team[2], game_id, game_date,
+                         matchup.format(team[1], opponent[1]), get_wl(box_score, opponent_box_score)] +
+                        box_score + [1])
+    return [make_result_set('LeagueGameLog', headers, rows)]
+
+
+def game_logs(league, query_params, rng, is_player):
+    season = query_params.get('Season', league.seasons[-1])
+    measure_headers = MEASURE_TYPE_HEADERS.get(query_params.get('MeasureType', 'Base'), STAT_HEADERS)
+    headers = ['SEASON_YEAR'] + (['PLAYER_ID', 'PLAYER_NAME'] if is_player else []) + \
+        ['TEAM_ID', 'TEAM_ABBREVIATION', 'TEAM_NAME', 'GAME_ID', 'GAME_DATE', 'MATCHUP', 'WL'] + measure_headers
+
+    players_by_team = {}
+    if is_player:
+        for player in league.get_players(season):
+            players_by_team.setdefault(player.team_id, []).append(player)
+
+    rows = []
+    for game in league.get_schedule(season):
+        game_id, game_date, home_team, away_team = game
+        home_box_score, away_box_score = get_game_box_scores(league, game)
+        for team, opponent, box_score, opponent_box_score in ((home_team, away_team, home_box_score, away_box_score),
+                                                              (away_team, home_team, away_box_score, home_box_score)):
+            game_cols = [team[0], team[1], team[2], game_id, '{}T00:00:00'.format(game_date),
+                         '{} vs. {}'.format(team[1], opponent[1]), get_wl(box_score, opponent_box_score)]
+            if is_player:
+                for player in players_by_team.get(team[0], []):
+                    rows.append([season, player.player_id, player.player_name] + game_cols +
+                                make_stats(rng, measure_headers, make_player_box_score(rng, player)))
+            else:
+                rows.append([season] + game_cols + make_stats(rng, measure_headers, box_score))
+    return [make_result_set('PlayerGameLogs' if is_player else 'TeamGameLogs', headers, rows)]
+
+
+def box_score_summary(league, query_params, rng):
+    season = query_params.get('Season', league.seasons[-1])
+    game = league.get_game(season, query_params.get('GameID'))
+    if game is None:
+        return None
+    game_id, game_date, home_team, away_team = game
+    inactive_headers = ['PLAYER_ID', 'FIRST_NAME', 'LAST_NAME', 'JERSEY_NUM', 'TEAM_ID', 'TEAM_CITY', 'TEAM_NAME',
+                        'TEAM_ABBREVIATION']
+    inactive_rows = []
+    for player in league.get_players(season):
+        if player.team_id in (home_team[0], away_team[0]) and rng.random() < 0.15:
+            first_name, last_name = player.player_name.split(' ')
+            inactive_rows.append([player.player_id, first_name, last_name, str(player.player_id % 100),
+                                  player.team_id, 'City', 'Team', 'T'])
+    return [
+        make_result_set('GameSummary', ['GAME_DATE_EST', 'GAME_ID', 'HOME_TEAM_ID', 'VISITOR_TEAM_ID'],
+                        [['{}T00:00:00'.format(game_date), game_id, home_team[0], away_team[0]]]),
+        make_result_set('OtherStats', ['LEAGUE_ID', 'TEAM_ID', 'PTS_PAINT'],
+                        [['00', home_team[0], rng.randint(30, 60)], ['00', away_team[0], rng.randint(30, 60)]]),
+        make_result_set('Officials', ['OFFICIAL_ID', 'FIRST_NAME', 'LAST_NAME', 'JERSEY_NUM'],
+                        [[1000 + i, 'Ref', str(i), str(i)] for i in range(3)]),
+        make_result_set('InactivePlayers', inactive_headers, inactive_rows),
+        make_result_set('GameInfo', ['GAME_DATE', 'ATTENDANCE', 'GAME_TIME'],
+                        [[game_date, rng.randint(12000, 21000), '2:15']]),
+    ]
+
+
+def box_score_traditional(league, query_params, rng):
+    season = query_params.get('Season', league.seasons[-1])
+    game = league.get_game(season, query_params.get('GameID'))
+    if game is None:
+        return None
+    game_id, _, home_team, away_team = game
+    headers = ['GAME_ID', 'TEAM_ID', 'TEAM_ABBREVIATION', 'TEAM_CITY', 'PLAYER_ID', 'PLAYER_NAME', 'START_POSITION',
+               'COMMENT'] + STAT_HEADERS
+    rows = []
+    for player in league.get_players(season):
+        for team in (home_team, away_team):
+            if player.team_id == team[0]:
+                rows.append([game_id, team[0], team[1], 'City', player.player_id, player.player_name,
+                             player.position, ''] + make_player_box_score(rng, player))
+    team_headers = ['GAME_ID', 'TEAM_ID', 'TEAM_NAME', 'TEAM_ABBREVIATION', 'TEAM_CITY'] + STAT_HEADERS
+    team_rows = [[game_id, team[0], team[2], team[1], 'City'] + box_score
+                 for team, box_score in zip((home_team, away_team), get_game_box_scores(league, game))]
+    return [make_result_set('PlayerStats', headers, rows), make_result_set('TeamStats', team_headers, team_rows)]
+
+
+ENDPOINTS = {
+    'leaguedashplayerstats': league_dash_player_stats,
+    'leaguedashteamstats': league_dash_team_stats,
+    'leaguedashptteamdefend': league_dash_pt_team_defend,
+    'leaguegamelog': league_game_log,
+    'playergamelogs': lambda league, query_params, rng: game_logs(league, query_params, rng, True),
+    'teamgamelogs': lambda league, query_params, rng: game_logs(league, query_params, rng, False),
+    'boxscoresummaryv2': box_score_summary,
+    'boxscoretraditionalv2': box_score_traditional,
+}
+
+
+def generate_json_response(api_request: str, league: League):
+    """
+    Returns the json response (as a dictionary) that stats.nba.com
+    would give to the api_request. Returns None if the endpoint or
+    the game of the api_request is unknown.
+    """
+    split_request = urllib.parse.urlsplit(api_request)
+    endpoint = split_request.path.rstrip('/').split('/')[-1]
+    if endpoint not in ENDPOINTS:
+        return None
+    query_params = dict(urllib.parse.parse_qsl(split_request.query, keep_blank_values=True))
+    # the same request always gets the same data
+    result_sets = ENDPOINTS[endpoint](league, query_params, random.Random(split_request.path + split_request.query))
+    if result_sets is None:
+        return None
+    return {'resource': endpoint, 'parameters': query_params, 'resultSets': result_sets}
+
+
+def generate_nba_response(api_request: str, result_set_index: int, league: League):
+    """
+    Returns the NBAResponse that scraping the api_request would give.
+    """
+    json_response = generate_json_response(api_request, league)
+    if json_response is None:
+        raise ValueError('Can\'t generate a response to: {}'.format(api_request))
+    return scrape.scraper.NBAResponse(json_response, result_set_index)
+
+
+def populate_database(league: League, paths_to_api_requests=(API_REQUESTS_INIT_PATH, API_REQUESTS_PATH)):
+    """
+    Stores the responses to every api request of the jobs in the
+    given yaml files into the current database, the same way that
+    run_scrape_jobs does but without making any api requests.
+
+    Returns the number of rows that were stored.
+    """
+    seasons = CONFIG['SEASONS']
+    CONFIG['SEASONS'] = league.seasons
+    scrape.query_param_values.QUERY_PARAM_VALUES.clear()
+    num_rows = 0
+
+    def run_job(job):
+        nonlocal num_rows
+        scrape_job = scrape.scraper.parse_scrape_job(job)
+        data_names = [result_set['data_name'] for result_set in scrape_job['result_sets']]
+        scraped_request_hashes = set.intersection(*(db.request_logger.get_scraped_request_hashes(data_name)
+                                                    for data_name in data_names))
+        fillable_api_request = scrape.fillable_api_request.FillableAPIRequest(job['API_ENDPOINT'], False, data_names)
+        with db.batch_writer.BatchWriter() as batch_writer:
+            for api_request in fillable_api_request.generate_api_requests():
+                if db.request_logger.get_request_hash(api_request.api_request) in scraped_request_hashes:
+                    continue
+                result_set_responses = [
+                    (result_set, generate_nba_response(api_request.api_request, result_set['result_set_index'], league))
+                    for result_set in scrape_job['result_sets']]
+                scrape.scraper.add_result_sets(batch_writer, api_request, result_set_responses)
+                num_rows += sum(len(nba_response) for _, nba_response in result_set_responses)
+
+    try:
+        jobs = []
+        for path_to_api_requests in paths_to_api_requests:
+            with open(path_to_api_requests, 'r') as f:
+                jobs.extend(yaml.safe_load(f))
+        scrape.scheduler.run_jobs(scrape.scheduler.merge_jobs(jobs), run_job, max_concurrency=1)
+    finally:
+        CONFIG['SEASONS'] = seasons
+        scrape.query_param_values.QUERY_PARAM_VALUES.clear()
+    return num_rows
@@ -1,40 +1,93 @@
 import argparse
-from nba_ss_db import db, scrape
+from nba_ss_db import db, scrape, profiling, CONFIG
 from nba_ss_db.scrape.scraper import run_scrape_jobs
+from nba_ss_db.scrape.utils import parse_shard
 
 parser = argparse.ArgumentParser(description='NBA Stats Scraper and Storage')
 parser.add_argument('--scrape', nargs='?', const='api_requests.yaml', dest='scrape_file_path',
                     help="""Scrapes all api requests according to the entries in the supplied file path. If not path is supplied, 'api_requests.yaml' is used.""")
 parser.add_argument('--daily_scrape', nargs='?', const='api_requests.yaml', dest='daily_scrape_file_path',
                     help="""Scrapes all api requests according to the entries in the supplied file path for the current season. If not path is supplied, 'api_requests.yaml' is used.""")
+parser.add_argument('--replay', nargs='?', const='api_requests.yaml', dest='replay_file_path',
+                    help="""Rebuilds the tables of all api requests in the supplied file path from the response cache without making any api requests. If not path is supplied, 'api_requests.yaml' is used.""")
 parser.add_argument('--training_data', nargs='?', const=None,
                     help="""Queries and stores training data as a csv file. Accepts a FP filter as an optional argument.""")
 parser.add_argument('--clear_log', nargs='?', const=None, dest='clear_before_date',
                     help="""Deletes all entries in scrape_log before the supplied date. If no date is supplied all entries are removed.""")
+parser.add_argument('--compact_log', action='store_true',
+                    help="""Collapses duplicate entries in scrape_log (migrating it from the old format if needed) and vacuums the database.""")
+parser.add_argument('--sqlite_profile', choices=list(CONFIG['SQLITE_PRAGMAS'].keys()),
+                    help="""The preset of sqlite pragmas (in config.yaml) to use for the database. Ex) 'bulk_load' for large scrapes.""")
+parser.add_argument('--shard', type=parse_shard,
+                    help="""Only scrapes the api requests of one of several shards given as i/n (starting at 0). Ex) Running with 0/2 and 1/2 scrapes every api request once.""")
+parser.add_argument('--db_name',
+                    help="""The name of the database file to use instead of the one in config.yaml. Ex) A separate database for each shard.""")
+parser.add_argument('--merge_dbs', nargs='+', metavar='DB_PATH',
+                    help="""Copies the tables of the databases at the supplied paths into the database. Ex) Merging the databases of each shard.""")
+parser.add_argument('--enqueue', nargs='?', const='api_requests.yaml', dest='enqueue_file_path',
+                    help="""Adds all api requests according to the entries in the supplied file path to the scrape queue. If not path is supplied, 'api_requests.yaml' is used.""")
+parser.add_argument('--queue_workers', type=int,
+                    help="""Scrapes the api requests in the scrape queue with the supplied number of worker processes until the queue is empty.""")
+parser.add_argument('--profile', choices=profiling.PROFILE_MODES,
+                    help="""Profiles every job of --scrape, --daily_scrape and --training_data and prints its hotspots. 'cpu' saves a cProfile of every job, 'memory' its peak memory and a tracemalloc snapshot and 'sample' samples stacks with a low overhead.""")
 parser.add_argument('--drop_tables', action='store_true',
                     help="""Drops all tables in the database specified in db/config.py.""")
 
 
 args = parser.parse_args()
 
-if args.drop_tables:
-    db.utils.drop_tables()
+if args.db_name is not None:
+    CONFIG['DB_NAME'] = args.db_name
 
-if args.clear_before_date is not None:
-    db.utils.clear_scrape_logs(args.clear_before_date)
+if args.sqlite_profile is not None:
+    db.utils.set_sqlite_profile(args.sqlite_profile)
 
-if args.scrape_file_path is not None:
-    scrape.scraper.run_scrape_jobs(args.scrape_file_path)
+if args.profile is not None:
+    profiling.start(args.profile)
 
-if args.daily_scrape_file_path is not None:
-    scrape.scraper.run_daily_scrapes(args.daily_scrape_file_path)
+# every command shares one connection to the database
+with db.utils.connection():
+    if args.drop_tables:
+        db.utils.drop_tables()
 
-if args.training_data is not None:
-    con = db.utils.get_db_connection()
-    # execute other sql file to create temporary tables
-    db.utils.execute_sql_file_persist('sqlite_cmds.sql', con)
-    # execute main aggregation sql script
-    db_query = db.utils.execute_sql_file_persist('training_data.sql', con)
-    df = db_query.to_df()
+    # creates the scrape_log tables (or migrates them from the old format) if needed
+    db.initialize.init_db()
 
-    db.retrieve.df_to_csv(df, 'training_data_{}'.format(str(args.training_data)))
+    if args.clear_before_date is not None:
+        db.utils.clear_scrape_logs(args.clear_before_date)
+
+    if args.compact_log:
+        db.request_logger.compact_scrape_log()
+
+    if args.merge_dbs is not None:
+        db.merge.merge_databases(args.merge_dbs)
+
+    if args.scrape_file_path is not None:
+        scrape.scraper.run_scrape_jobs(args.scrape_file_path, shard=args.shard)
+
+    if args.daily_scrape_file_path is not None:
+        scrape.scraper.run_daily_scrapes(args.daily_scrape_file_path, shard=args.shard)
+
+    if args.enqueue_file_path is not None:
+        scrape.queue_worker.enqueue_scrape_jobs(args.enqueue_file_path)
+
+    if args.queue_workers is not None:
+        scrape.queue_worker.run_queue_workers(args.queue_workers)
+
+    if args.replay_file_path is not None:
+        # the init tables are needed to fill in the api requests of the other jobs
+        scrape.scraper.run_replay_jobs('nba_ss_db/scrape/api_requests_init.yaml')
+        scrape.scraper.run_replay_jobs(args.replay_file_path, shard=args.shard)
+
+    if args.training_data is not None:
+        with profiling.profile('training_data'):
+            con = db.utils.get_db_connection()
+            # execute other sql file to create temporary tables
+            db.utils.execute_sql_file_persist('sqlite_cmds.sql', con)
+            # execute main aggregation sql script
+            db_query = db.utils.execute_sql_file_persist('training_data.sql', con)
+            df = db_query.to_df()
+
+            db.retrieve.df_to_csv(df, 'training_data_{}'.format(str(args.training_data)))
+
+profiling.stop()
@@ -0,0 +1,32 @@
+import unittest
+from tests.test_setup import init_test_db
+
+from nba_ss_db import db, CONFIG
+from benchmarks import run_benchmarks
+
+
+class TestRunBenchmarks(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    @classmethod
+    def setUp(cls):
+        init_test_db()
+
+    def test_run_benchmarks(self):
+        """
+        Tests that every benchmark runs in its own database and
+        that the test database is used again afterwards.
+        """
+        report = run_benchmarks.run_benchmarks(run_benchmarks.BENCHMARKS.keys(), ['20'], repeat=1)
+        self.assertEqual(sorted(report['results'].keys()),
+                         sorted('{}/20'.format(name) for name in run_benchmarks.BENCHMARKS))
+        self.assertEqual(run_benchmarks.find_regressions(report, report, 0), [])
+        self.assertEqual(CONFIG['DB_NAME'], 'test_db')
+        self.assertTrue(db.retrieve.exists_table('player_ids'))
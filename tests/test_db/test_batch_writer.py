@@ -0,0 +1,61 @@
+import unittest
+from tests.test_setup import init_test_db
+
+from nba_ss_db import db
+from nba_ss_db import scrape
+
+
+def make_nba_response(player_id):
+    scraped_json = {
+        'resultSets': [
+            {
+                'headers': ['PLAYER_ID', 'PLAYER_NAME', 'PTS'],
+                'rowSet': [[player_id, 'Player {}'.format(player_id), 20]]
+            }
+        ]
+    }
+    return scrape.scraper.NBAResponse(scraped_json, 0)
+
+
+class TestBatchWriter(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    @classmethod
+    def setUp(cls):
+        init_test_db()
+
+    def test_flush_on_exit(self):
+        """
+        Tests that buffered responses are only stored and logged
+        when the batch writer is flushed on exit.
+        """
+        table_name = 'batch_writer_test'
+        with db.batch_writer.BatchWriter(max_rows=10) as batch_writer:
+            for player_id in range(3):
+                batch_writer.add(table_name, make_nba_response(player_id),
+                                 'api_request_{}'.format(player_id), primary_keys=('PLAYER_ID',))
+            self.assertFalse(db.retrieve.exists_table(table_name))
+            self.assertFalse(db.request_logger.already_scraped('api_request_0'))
+
+        num_rows = db.utils.execute_sql("""SELECT COUNT(*) FROM {};""".format(table_name)).rows[0][0]
+        self.assertEqual(num_rows, 3)
+        for player_id in range(3):
+            self.assertTrue(db.request_logger.already_scraped('api_request_{}'.format(player_id), table_name))
+
+    def test_flush_when_full(self):
+        """
+        Tests that the buffer is written once it holds max_rows rows.
+        """
+        table_name = 'batch_writer_test'
+        batch_writer = db.batch_writer.BatchWriter(max_rows=2)
+        batch_writer.add(table_name, make_nba_response(0), 'api_request_0', primary_keys=('PLAYER_ID',))
+        self.assertFalse(db.retrieve.exists_table(table_name))
+        batch_writer.add(table_name, make_nba_response(1), 'api_request_1', primary_keys=('PLAYER_ID',))
+        self.assertTrue(db.retrieve.exists_table(table_name))
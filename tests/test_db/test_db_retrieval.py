@@ -41,6 +41,7 @@ class TestDBStorage(unittest.TestCase):
         table_names = db.retrieve.get_table_names()
         self.assertTrue('scrape_log' not in table_names)
         self.assertTrue('player_ids' not in table_names)
+        self.assertFalse(set(table_names) & db.merge.QUEUE_TABLE_NAMES)
 
 
     def test_get_all_table_names(self):
@@ -1,4 +1,6 @@
+import tempfile
 import unittest
+from unittest import mock
 from tests.test_setup import init_test_db
 
 from nba_ss_db import db
@@ -74,3 +76,99 @@ class TestDBStorage(unittest.TestCase):
         self.assertTrue(db.retrieve.exists_table(table_name))
         num_rows_in_table = len(db.retrieve.db_query("""SELECT * FROM {};""".format(table_name)))
         self.assertEquals(num_rows_in_table, len(scraped_json['resultSets'][0]['rowSet']))
+
+
+    def test_connection_is_reused(self):
+        """
+        Tests that helpers reuse the same connection
+        within a connection context.
+        """
+        with db.utils.connection() as con:
+            self.assertIs(db.utils.get_db_connection(), con)
+            db.utils.execute_sql("""SELECT * FROM player_ids;""")
+            self.assertIs(db.utils.get_db_connection(), con)
+
+
+    def test_transaction_rollback(self):
+        """
+        Tests that a failed transaction stores nothing.
+        """
+        with self.assertRaises(ValueError):
+            with db.utils.transaction():
+                db.utils.execute_sql("""INSERT INTO player_ids VALUES ('1', 'Player', '2017-18');""")
+                raise ValueError()
+        num_rows = db.utils.execute_sql("""SELECT COUNT(*) FROM player_ids;""").rows[0][0]
+        self.assertEqual(num_rows, 0)
+
+
+    def test_all_null_column(self):
+        """
+        Tests that a table can be created from rows where
+        a column is None in every row.
+        """
+        scraped_json = {
+            'resultSets': [
+                {
+                    'headers': ['PLAYER_ID', 'NICKNAME'],
+                    'rowSet': [[1, None], [2, None]]
+                }
+            ]
+        }
+        nba_response = scrape.scraper.NBAResponse(scraped_json, 0)
+        table_name = 'null_column_test'
+        db.store.store_nba_response(table_name, nba_response, primary_keys=('PLAYER_ID', ))
+        self.assertTrue(db.schema_catalog.exists_table(table_name))
+        self.assertEqual(db.schema_catalog.get_table_schema(table_name).column_names, ['PLAYER_ID', 'NICKNAME'])
+        num_rows_in_table = len(db.retrieve.db_query("""SELECT * FROM {};""".format(table_name)))
+        self.assertEqual(num_rows_in_table, 2)
+
+
+    def test_store_added_columns(self):
+        """
+        Tests that columns added with add_col are stored in every
+        row and that dates in added and row columns are formatted.
+        """
+        scraped_json = {
+            'resultSets': [
+                {
+                    'headers': ['PLAYER_ID', 'GAME_DATE', 'PLAYER_NAME', 'PTS'],
+                    'rowSet': [[1, 'OCT 17, 2017', 'Player 1', 10], [2, 'OCT 18, 2017', 'Player 2', 20]]
+                }
+            ]
+        }
+        nba_response = scrape.scraper.NBAResponse(scraped_json, 0)
+        nba_response.add_col('SEASON', '2017-18')
+        nba_response.add_col('DATE_TO', '10/18/2017')
+        self.assertEqual(nba_response.rows[0], [1, 'OCT 17, 2017', 'Player 1', 10, '2017-18', '10/18/2017'])
+        self.assertEqual(len(scraped_json['resultSets'][0]['rowSet'][0]), 4)
+
+        table_name = 'added_columns_test'
+        db.store.store_nba_response(table_name, nba_response, primary_keys=('PLAYER_ID', 'SEASON'),
+                                    ignore_keys={'PLAYER_NAME'})
+        self.assertEqual(db.utils.execute_sql("""SELECT * FROM {} ORDER BY PLAYER_ID;""".format(table_name)).rows,
+                         [(1, '2017-10-17', 10, '2017-18', '2017-10-18'), (2, '2017-10-18', 20, '2017-18', '2017-10-18')])
+
+
+    def test_merge_databases(self):
+        """
+        Tests that the tables and scrape_log of another
+        database are merged into the current one.
+        """
+        with tempfile.TemporaryDirectory() as tmp_path:
+            with mock.patch.dict(db.utils.CONFIG, {'DB_PATH': tmp_path, 'DB_NAME': 'test_db_shard'}):
+                init_test_db()
+                shard_db_path = db.utils.get_db_path()
+                db.utils.execute_sql("""INSERT INTO player_ids VALUES ('1', 'Player', '2017-18');""")
+                db.utils.execute_sql("""CREATE TABLE shard_table (GAME_ID TEXT PRIMARY KEY);""")
+                db.utils.execute_sql("""INSERT INTO shard_table VALUES ('0021700001');""")
+                db.request_logger.log_request('api_request', 'shard_table')
+                db.utils.close_db_connection()
+
+            db.utils.execute_sql("""INSERT INTO player_ids VALUES ('2', 'Other Player', '2017-18');""")
+            db.merge.merge_databases([shard_db_path])
+            self.assertEqual(len(db.retrieve.db_query("""SELECT * FROM player_ids;""")), 2)
+
+            # rows that are already stored aren't added again
+            db.merge.merge_databases([shard_db_path])
+            self.assertEqual(len(db.retrieve.db_query("""SELECT * FROM shard_table;""")), 1)
+            self.assertTrue(db.request_logger.already_scraped('api_request', 'shard_table'))
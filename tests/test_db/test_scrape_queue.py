@@ -0,0 +1,196 @@
+import contextlib
+import io
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import yaml
+
+from tests.test_setup import init_test_db
+from nba_ss_db import db, CONFIG
+from nba_ss_db import scrape
+from nba_ss_db.scrape.fillable_api_request import APIRequest
+from nba_ss_db.scrape.query_param_values import QUERY_PARAM_VALUES
+from benchmarks.fake_stats_server import FakeStatsServer, League
+
+
+TEST_JOB = {
+    'DATA_NAME': 'scrape_queue_test',
+    'API_ENDPOINT': 'http://stats.nba.com/stats/test?PlayerID={PLAYER_ID}&Season={SEASON}',
+    'PRIMARY_KEYS': ['PLAYER_ID', 'SEASON'],
+    'DAILY_SCRAPE': False
+}
+
+
+def make_api_requests(num_api_requests):
+    return [APIRequest('http://stats.nba.com/stats/test?PlayerID={}&Season=2017-18'.format(player_id),
+                       {'SEASON': '2017-18', 'PLAYER_ID': player_id})
+            for player_id in range(num_api_requests)]
+
+
+class TestScrapeQueue(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    @classmethod
+    def setUp(cls):
+        init_test_db()
+
+    def test_claim_batch(self):
+        """
+        Tests that each queued api request is only claimed by one worker.
+        """
+        db.scrape_queue.enqueue_job(TEST_JOB, make_api_requests(5))
+        first_batch = db.scrape_queue.claim_batch('worker_1', batch_size=3)
+        second_batch = db.scrape_queue.claim_batch('worker_2', batch_size=3)
+        self.assertEqual(len(first_batch), 3)
+        self.assertEqual(len(second_batch), 2)
+        self.assertEqual(second_batch[0].query_params, {'SEASON': '2017-18', 'PLAYER_ID': 3})
+        self.assertEqual(db.scrape_queue.claim_batch('worker_3'), [])
+
+    def test_expired_lease_is_reclaimed(self):
+        """
+        Tests that an api request is claimed again once
+        the lease of the worker that claimed it expired.
+        """
+        db.scrape_queue.enqueue_job(TEST_JOB, make_api_requests(1))
+        db.scrape_queue.claim_batch('worker_1', lease_time=-1)
+        reclaimed_batch = db.scrape_queue.claim_batch('worker_2', lease_time=-1)
+        self.assertEqual(len(reclaimed_batch), 1)
+        self.assertEqual(reclaimed_batch[0].attempts, 2)
+
+        # an api request whose lease ran out max_attempts times isn't claimed again
+        self.assertEqual(db.scrape_queue.claim_batch('worker_3', max_attempts=2), [])
+        self.assertEqual(db.scrape_queue.get_queue_stats(), {'failed': 1})
+
+    def test_leases_are_renewed_while_scraping(self):
+        """
+        Tests that the leases of a batch are renewed while
+        it is being scraped, however long that takes.
+        """
+        def get_lease_expires_at():
+            return db.utils.execute_sql("""SELECT lease_expires_at FROM scrape_queue;""").rows[0][0]
+
+        db.scrape_queue.enqueue_job(TEST_JOB, make_api_requests(1))
+        queue_entries = db.scrape_queue.claim_batch('worker_1', lease_time=0)
+        claimed_lease_expires_at = get_lease_expires_at()
+        with mock.patch.dict(CONFIG, {'QUEUE_LEASE_TIME': 0.2}):
+            with scrape.queue_worker.renewing_leases('worker_1', queue_entries):
+                time.sleep(0.3)
+        self.assertGreater(get_lease_expires_at(), claimed_lease_expires_at)
+
+    def test_only_the_lease_owner_marks_done(self):
+        """
+        Tests that a renewed lease isn't claimed by another worker
+        and that a worker whose lease expired can't mark its
+        api request as done.
+        """
+        db.scrape_queue.enqueue_job(TEST_JOB, make_api_requests(2))
+        first_entry, second_entry = db.scrape_queue.claim_batch('worker_1', lease_time=-1)
+        self.assertEqual(db.scrape_queue.renew_leases('worker_1', [first_entry.queue_id]), 1)
+
+        reclaimed_entry, = db.scrape_queue.claim_batch('worker_2')
+        self.assertEqual(reclaimed_entry.queue_id, second_entry.queue_id)
+        self.assertEqual(db.scrape_queue.mark_done([first_entry.queue_id, second_entry.queue_id], 'worker_1'), 1)
+        self.assertEqual(db.scrape_queue.get_queue_stats(), {'done': 1, 'leased': 1})
+        self.assertEqual(db.scrape_queue.mark_done([reclaimed_entry.queue_id], 'worker_2'), 1)
+
+    def test_mark_failed(self):
+        """
+        Tests that a failed api request is queued again
+        until it runs out of attempts.
+        """
+        db.scrape_queue.enqueue_job(TEST_JOB, make_api_requests(1))
+        for _ in range(2):
+            queue_entry, = db.scrape_queue.claim_batch('worker_1')
+            db.scrape_queue.mark_failed(queue_entry, max_attempts=2)
+        self.assertEqual(db.scrape_queue.get_queue_stats(), {'failed': 1})
+
+        # queueing the api request again retries it
+        db.scrape_queue.enqueue_job(TEST_JOB, make_api_requests(1))
+        self.assertEqual(db.scrape_queue.get_queue_stats(), {'pending': 1})
+
+    def test_run_queue_worker(self):
+        """
+        Tests that a worker stores, logs and marks as done
+        every api request in the queue.
+        """
+        def request_player(api_request):
+            player_id = int(api_request.split('PlayerID=')[1].split('&')[0])
+            return '{{"resultSets": [{{"headers": ["PLAYER_ID", "PTS"], "rowSet": [[{}, 20]]}}]}}'.format(
+                player_id).encode()
+
+        api_requests = make_api_requests(5)
+        db.scrape_queue.enqueue_job(TEST_JOB, api_requests)
+        with mock.patch.object(scrape.scraper, 'request_body', side_effect=request_player), \
+                mock.patch.dict(CONFIG, {'RESPONSE_CACHE': False}), contextlib.redirect_stdout(io.StringIO()):
+            scrape.queue_worker.run_queue_worker('worker_1')
+
+        self.assertEqual(db.scrape_queue.get_queue_stats(), {'done': 5})
+        num_rows = db.utils.execute_sql("""SELECT COUNT(*) FROM scrape_queue_test;""").rows[0][0]
+        self.assertEqual(num_rows, 5)
+        for api_request in api_requests:
+            self.assertTrue(db.request_logger.already_scraped(api_request.api_request, TEST_JOB['DATA_NAME']))
+
+    def test_failing_api_request_doesnt_stop_the_worker(self):
+        """
+        Tests that an api request whose response can't be stored
+        is tried QUEUE_MAX_ATTEMPTS times and marked as failed
+        while the rest of the queue is scraped.
+        """
+        def request_player(api_request):
+            player_id = int(api_request.split('PlayerID=')[1].split('&')[0])
+            # the response to the last api request is missing its PLAYER_ID primary key
+            headers = '"PTS"' if player_id == 3 else '"PLAYER_ID", "PTS"'
+            row = '20' if player_id == 3 else '{}, 20'.format(player_id)
+            return '{{"resultSets": [{{"headers": [{}], "rowSet": [[{}]]}}]}}'.format(headers, row).encode()
+
+        api_requests = make_api_requests(3) + [APIRequest(
+            'http://stats.nba.com/stats/test?PlayerID=3&Season=2017-18', {'SEASON': '2017-18', 'PLAYER_ID': None})]
+        db.scrape_queue.enqueue_job(TEST_JOB, api_requests)
+        with mock.patch.object(scrape.scraper, 'request_body', side_effect=request_player), \
+                mock.patch.dict(CONFIG, {'RESPONSE_CACHE': False, 'QUEUE_MAX_ATTEMPTS': 2}), \
+                contextlib.redirect_stdout(io.StringIO()):
+            scrape.queue_worker.run_queue_worker('worker_1')
+
+        self.assertEqual(db.scrape_queue.get_queue_stats(), {'done': 3, 'failed': 1})
+
+    def test_deferred_jobs_are_queued_after_their_dependencies(self):
+        """
+        Tests that a {GAME_ID} job listed before the job storing
+        "games" is queued once "games" is scraped, so that every
+        game is scraped.
+        """
+        league = League(players_per_team=2, games_per_season=6)
+        with FakeStatsServer(league=league) as server:
+            jobs = [{'DATA_NAME': 'summaries_test', 'PRIMARY_KEYS': ['SEASON', 'GAME_ID'], 'DAILY_SCRAPE': False,
+                     'API_ENDPOINT': '{}/stats/boxscoresummaryv2?GameID={{GAME_ID}}&Season={{SEASON}}'.format(
+                         server.url)},
+                    {'DATA_NAME': 'games', 'PRIMARY_KEYS': ['TEAM_ID', 'SEASON', 'GAME_DATE'], 'DAILY_SCRAPE': True,
+                     'API_ENDPOINT': '{}/stats/leaguegamelog?PlayerOrTeam=T&Season={{SEASON}}'.format(server.url)}]
+            with tempfile.TemporaryDirectory() as tmp_path:
+                path_to_api_requests = os.path.join(tmp_path, 'api_requests.yaml')
+                with open(path_to_api_requests, 'w') as f:
+                    yaml.dump(jobs, f)
+                with mock.patch.dict(CONFIG, {'SEASONS': ['2017-18'], 'RESPONSE_CACHE': False}), \
+                        contextlib.redirect_stdout(io.StringIO()):
+                    QUERY_PARAM_VALUES.clear()
+                    scrape.queue_worker.enqueue_scrape_jobs(path_to_api_requests)
+                    self.assertEqual(db.scrape_queue.get_queue_stats(), {'pending': 1})
+                    self.assertTrue(db.scrape_queue.has_deferred_jobs())
+
+                    scrape.queue_worker.run_queue_worker('worker_1')
+                    QUERY_PARAM_VALUES.clear()
+
+        self.assertFalse(db.scrape_queue.has_deferred_jobs())
+        self.assertEqual(db.scrape_queue.get_queue_stats(), {'done': 7})
+        num_rows = db.utils.execute_sql("""SELECT COUNT(*) FROM summaries_test;""").rows[0][0]
+        self.assertEqual(num_rows, 6)
@@ -0,0 +1,57 @@
+import contextlib
+import io
+import unittest
+from tests.test_setup import init_test_db
+
+from nba_ss_db import db
+from nba_ss_db import synthetic
+
+
+class TestSynthetic(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    @classmethod
+    def setUp(cls):
+        init_test_db()
+
+    def test_populate_database(self):
+        """
+        Tests that every table of the scrape jobs is populated
+        and that the stored ids and box scores are consistent.
+        """
+        # the test player_ids table doesn't have every column of the scraped one
+        db.utils.execute_sql('DROP TABLE player_ids;')
+        db.schema_catalog.clear()
+        league = synthetic.League(seasons=['2017-18'], players_per_team=2, games_per_season=15)
+        with contextlib.redirect_stdout(io.StringIO()):
+            num_rows = synthetic.populate_database(league)
+        self.assertGreater(num_rows, 0)
+
+        for table_name in ('player_ids', 'game_dates', 'games', 'player_logs', 'team_logs_four_factors',
+                           'game_inactive_players', 'general_team_stats'):
+            self.assertGreater(db.utils.execute_sql('SELECT COUNT(*) FROM {};'.format(table_name)).rows[0][0], 0)
+
+        self.assertEqual(db.utils.execute_sql('SELECT COUNT(DISTINCT GAME_ID) FROM games;').rows[0][0], 15)
+        self.assertEqual(db.utils.execute_sql("""SELECT COUNT(*) FROM player_logs
+                                                 WHERE PLAYER_ID NOT IN (SELECT PLAYER_ID FROM player_ids)
+                                                 OR GAME_ID NOT IN (SELECT GAME_ID FROM games);""").rows[0][0], 0)
+        self.assertEqual(db.utils.execute_sql("""SELECT COUNT(*) FROM player_logs
+                                                 WHERE FGM > FGA OR REB != OREB + DREB
+                                                 OR PTS != 2 * FGM + FG3M + FTM;""").rows[0][0], 0)
+        self.assertEqual(db.utils.execute_sql("""SELECT COUNT(*) FROM games GROUP BY WL;""").rows, [(15,), (15,)])
+
+    def test_responses_are_deterministic(self):
+        api_request = 'http://stats.nba.com/stats/leaguegamelog?Season=2017-18'
+        league = synthetic.League(seasons=['2017-18'], players_per_team=2, games_per_season=5)
+        nba_response = synthetic.generate_nba_response(api_request, 0, league)
+        self.assertEqual(len(nba_response.rows), 10)
+        self.assertEqual(nba_response.rows, synthetic.generate_nba_response(api_request, 0, league).rows)
+        with self.assertRaises(ValueError):
+            synthetic.generate_nba_response('http://stats.nba.com/stats/unknown?Season=2017-18', 0, league)
@@ -0,0 +1,70 @@
+import unittest
+from tests.test_setup import init_test_db
+
+from nba_ss_db import db, CONFIG
+from nba_ss_db.scrape import query_param_values
+from nba_ss_db.scrape.fillable_api_request import FillableAPIRequest
+
+
+GAME_DATES = ['2017-10-17', '2017-10-18', '2017-10-19', '2017-10-20']
+
+
+class TestFillableAPIRequest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        query_param_values.QUERY_PARAM_VALUES.clear()
+
+    @classmethod
+    def setUp(cls):
+        init_test_db()
+        query_param_values.QUERY_PARAM_VALUES.clear()
+        db.utils.execute_sql("""CREATE TABLE game_dates (GAME_DATE TEXT, SEASON TEXT);""")
+        for game_date in GAME_DATES:
+            db.utils.execute_sql("""INSERT INTO game_dates VALUES (?, ?);""",
+                                 params=(game_date, CONFIG['CURRENT_SEASON']))
+
+    def test_incremental_daily_scrape(self):
+        """
+        Tests that a daily scrape only fills in game dates on or
+        after the latest one already stored for the job.
+        """
+        db.utils.execute_sql("""CREATE TABLE incremental_test (TEAM_ID INT, GAME_DATE TEXT, SEASON TEXT);""")
+        db.utils.execute_sql("""INSERT INTO incremental_test VALUES (1, '2017-10-18', ?);""",
+                             params=(CONFIG['CURRENT_SEASON'], ))
+
+        fillable_api_request = FillableAPIRequest('GameDate={GAME_DATE}&Season={SEASON}', True, 'incremental_test')
+        game_dates = [api_request.query_params['GAME_DATE']
+                      for api_request in fillable_api_request.generate_api_requests()]
+        # the games of the latest date may only have been stored in part
+        self.assertEqual(game_dates, ['2017-10-18', '2017-10-19', '2017-10-20'])
+
+    def test_full_scrape_is_not_incremental(self):
+        """
+        Tests that a non-daily scrape fills in every game date.
+        """
+        db.utils.execute_sql("""CREATE TABLE incremental_test (TEAM_ID INT, GAME_DATE TEXT, SEASON TEXT);""")
+        db.utils.execute_sql("""INSERT INTO incremental_test VALUES (1, '2017-10-18', ?);""",
+                             params=(CONFIG['CURRENT_SEASON'], ))
+
+        fillable_api_request = FillableAPIRequest('GameDate={GAME_DATE}&Season={SEASON}', False, 'incremental_test')
+        game_dates = [api_request.query_params['GAME_DATE']
+                      for api_request in fillable_api_request.generate_api_requests()
+                      if api_request.query_params['SEASON'] == CONFIG['CURRENT_SEASON']]
+        self.assertEqual(game_dates, GAME_DATES)
+
+    def test_count_and_plan(self):
+        """
+        Tests that count and plan match the number of
+        api requests that are generated.
+        """
+        fillable_api_request = FillableAPIRequest(
+            'GameDate={GAME_DATE}&Position={PLAYER_POSITION}&Season={SEASON}', False)
+        plan = fillable_api_request.plan()
+        self.assertEqual(plan[CONFIG['CURRENT_SEASON']], len(GAME_DATES) * 3)
+        self.assertEqual(fillable_api_request.count(), sum(plan.values()))
+        self.assertEqual(fillable_api_request.count(), len(list(fillable_api_request.generate_api_requests())))
@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+from nba_ss_db import metrics, CONFIG
+from nba_ss_db.scrape import http_session
+from benchmarks.fake_stats_server import FakeStatsServer, League
+
+
+class TestHTTPSession(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        http_session.close_session()
+
+    @classmethod
+    def setUp(cls):
+        http_session.close_session()
+        metrics.reset()
+
+    def test_session_is_shared(self):
+        """
+        Tests that every request goes through one session with
+        the default headers, a large enough pool and the timeouts
+        in the config.
+        """
+        session = http_session.get_session()
+        self.assertIs(http_session.get_session(), session)
+        self.assertEqual(session.headers['User-Agent'], http_session.USER_AGENT)
+        self.assertGreaterEqual(session.get_adapter('https://stats.nba.com')._pool_maxsize, CONFIG['MAX_CONCURRENCY'])
+
+        with mock.patch.object(session, 'get') as get:
+            http_session.get('https://stats.nba.com/stats/leaguegamelog')
+        get.assert_called_once_with('https://stats.nba.com/stats/leaguegamelog', allow_redirects=False,
+                                    timeout=(CONFIG['CONNECT_TIMEOUT'], CONFIG['READ_TIMEOUT']))
+
+    def test_connections_are_reused(self):
+        """
+        Tests that requests made one after another reuse one
+        connection and that the reuse is counted in metrics.
+        """
+        with FakeStatsServer(league=League(players_per_team=2, games_per_season=10)) as server:
+            for _ in range(5):
+                http_session.get('{}/stats/leaguegamelog?Season=2017-18'.format(server.url))
+        self.assertEqual(http_session.get_connection_stats(),
+                         {'requests': 5, 'connections': 1, 'reused_connections': 4})
+
+        metrics.reset()
+        self.assertEqual(http_session.get_connection_stats()['requests'], 0)
+
+    def test_failed_requests_are_counted(self):
+        """
+        Tests that a request which raises (Ex. a timeout)
+        is counted as a request.
+        """
+        session = http_session.get_session()
+        with mock.patch.object(session, 'get', side_effect=requests.exceptions.Timeout()):
+            with self.assertRaises(requests.exceptions.Timeout):
+                http_session.get('https://stats.nba.com/stats/leaguegamelog')
+        self.assertEqual(http_session.get_connection_stats()['requests'], 1)
+
+    def test_request_slots_are_shared(self):
+        """
+        Tests that no more than CONFIG['MAX_CONCURRENCY'] requests
+        are in flight at once across every thread making them.
+        """
+        num_in_flight = 0
+        max_in_flight = 0
+        lock = threading.Lock()
+
+        def make_request():
+            nonlocal num_in_flight, max_in_flight
+            with http_session.request_slot():
+                with lock:
+                    num_in_flight += 1
+                    max_in_flight = max(max_in_flight, num_in_flight)
+                time.sleep(0.01)
+                with lock:
+                    num_in_flight -= 1
+
+        with mock.patch.dict(CONFIG, {'MAX_CONCURRENCY': 2}):
+            threads = [threading.Thread(target=make_request) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(max_in_flight, 2)
+        self.assertEqual(metrics.get_histogram('request_slot_wait_seconds').count, 8)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs os.fork')
+    def test_session_is_reset_after_fork(self):
+        """
+        Tests that a forked process doesn't share the session
+        (and its pooled sockets) of its parent.
+        """
+        session = http_session.get_session()
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0 if http_session.get_session() is not session else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        self.assertIs(http_session.get_session(), session)
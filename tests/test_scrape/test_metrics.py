@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from tests.test_setup import init_test_db
+from nba_ss_db import db, metrics, CONFIG
+from nba_ss_db.scrape import scraper
+from benchmarks.fake_stats_server import FakeStatsServer, League
+
+
+class TestMetrics(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    @classmethod
+    def setUp(cls):
+        init_test_db()
+        metrics.reset()
+
+    def test_scrape_and_store_are_timed(self):
+        """
+        Tests that every stage of scraping and storing a response
+        is recorded per endpoint and per job.
+        """
+        with mock.patch.dict(CONFIG, {'SLEEP_TIME': 0, 'TRY_COUNT': 10, 'RESPONSE_CACHE': False}):
+            with FakeStatsServer(error_rate=0.5, league=League(players_per_team=2, games_per_season=10)) as server:
+                nba_response = scraper.scrape('{}/stats/leaguegamelog?Season=2017-18'.format(server.url), 0)
+        db.store.store_nba_response('metrics_test', nba_response, ['TEAM_ID', 'GAME_ID'])
+
+        requests = metrics.get_counters('requests')
+        self.assertEqual(requests[(('endpoint', 'leaguegamelog'), ('outcome', 'ok'))], 1)
+        self.assertEqual(sum(requests.values()), server.num_requests)
+        for name in ('request_seconds', 'json_decode_seconds', 'nba_response_seconds'):
+            self.assertEqual(metrics.get_histogram(name, endpoint='leaguegamelog').count,
+                             1 if name != 'request_seconds' else server.num_requests)
+        for step in ('filter_columns', 'extract_columns', 'format_dates', 'insert'):
+            self.assertEqual(metrics.get_histogram('store_seconds', job='metrics_test', step=step).count, 1)
+        self.assertEqual(metrics.get_counters('rows_stored'), {(('job', 'metrics_test'), ): 20})
+
+    def test_write_run_summary(self):
+        metrics.increment('scraped_requests', 3, job='player_ids')
+        metrics.observe('request_seconds', 0.02, endpoint='leaguegamelog')
+        with tempfile.TemporaryDirectory() as tmp_path:
+            prometheus_path = os.path.join(tmp_path, 'nba_ss_db.prom')
+            with mock.patch.dict(CONFIG, {'METRICS_PATH': tmp_path, 'METRICS_PROMETHEUS_PATH': prometheus_path}):
+                summary_path = metrics.write_run_summary('scrape', 0)
+
+            with open(summary_path, 'r') as f:
+                summary = json.load(f)
+            self.assertEqual(summary['run'], 'scrape')
+            self.assertEqual(summary['counters']['scraped_requests'], [{'labels': {'job': 'player_ids'}, 'value': 3}])
+            self.assertEqual(summary['histograms']['request_seconds'][0]['p50'], 0.025)
+
+            with open(prometheus_path, 'r') as f:
+                prometheus_lines = f.read().splitlines()
+            self.assertIn('nba_ss_db_scraped_requests_total{job="player_ids"} 3', prometheus_lines)
+            self.assertIn('nba_ss_db_request_seconds_bucket{endpoint="leaguegamelog",le="+Inf"} 1', prometheus_lines)
+            self.assertIn('nba_ss_db_request_seconds_count{endpoint="leaguegamelog"} 1', prometheus_lines)
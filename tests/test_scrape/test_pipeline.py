@@ -0,0 +1,85 @@
+import contextlib
+import io
+import threading
+import time
+import unittest
+
+from nba_ss_db import metrics
+from nba_ss_db.scrape.pipeline import Pipeline
+
+
+class TestPipeline(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    @classmethod
+    def setUp(cls):
+        metrics.reset()
+
+    def test_stages_run_with_backpressure(self):
+        """
+        Tests that every item goes through every stage, that a slow
+        last stage keeps the queues before it bounded and that the
+        metrics of every stage are counted.
+        """
+        num_in_flight = 0
+        max_in_flight = 0
+        lock = threading.Lock()
+
+        def fetch(i):
+            nonlocal num_in_flight, max_in_flight
+            with lock:
+                num_in_flight += 1
+                max_in_flight = max(max_in_flight, num_in_flight)
+            return i * 2
+
+        written = []
+
+        def write(i):
+            nonlocal num_in_flight
+            time.sleep(0.001)
+            with lock:
+                num_in_flight -= 1
+            written.append(i)
+
+        pipeline = Pipeline('test_job', queue_size=2)
+        pipeline.add_stage('fetch', fetch, num_threads=3)
+        pipeline.add_stage('parse', lambda i: i + 1, num_threads=2)
+        with contextlib.redirect_stdout(io.StringIO()):
+            pipeline.run(range(100), 'write', write)
+
+        self.assertEqual(sorted(written), [i * 2 + 1 for i in range(100)])
+        # both queues, an item being parsed by each parser, fetched by each fetcher and written
+        self.assertLessEqual(max_in_flight, 2 + 2 + 2 + 3 + 1)
+        busy_seconds = metrics.get_counters('pipeline_busy_seconds')
+        self.assertEqual(set(dict(labels)['stage'] for labels in busy_seconds), {'fetch', 'parse', 'write'})
+        self.assertEqual(metrics.get_histogram('pipeline_queue_depth', job='test_job', stage='write').count, 100)
+        for labels, thread_seconds in metrics.get_counters('pipeline_thread_seconds').items():
+            self.assertLessEqual(busy_seconds[labels], thread_seconds)
+
+    def test_errors_stop_the_pipeline(self):
+        """
+        Tests that the error of a stage is raised by run once
+        the other stages stopped, in threads or serially.
+        """
+        def parse(i):
+            if i == 10:
+                raise IOError('Wasn\'t able to make the following request: {}'.format(i))
+            return i
+
+        for serial in (False, True):
+            written = []
+            pipeline = Pipeline('test_job', queue_size=2, serial=serial)
+            pipeline.add_stage('fetch', lambda i: i, num_threads=2)
+            pipeline.add_stage('parse', parse, num_threads=2)
+            with self.assertRaises(IOError), contextlib.redirect_stdout(io.StringIO()):
+                pipeline.run(range(1000), 'write', written.append)
+            self.assertNotIn(10, written)
+            self.assertLess(len(written), 1000)
+            self.assertFalse(any(thread.name.startswith('test_job-') for thread in threading.enumerate()))
@@ -0,0 +1,60 @@
+import contextlib
+import io
+import os
+import pstats
+import tempfile
+import time
+import tracemalloc
+import unittest
+
+from nba_ss_db import profiling, CONFIG
+
+
+def busy_loop(seconds):
+    end_time = time.perf_counter() + seconds
+    while time.perf_counter() < end_time:
+        sum(range(100))
+
+
+class TestProfiling(unittest.TestCase):
+
+    def profile_job(self, mode, job):
+        """
+        Profiles job as 'test_job' with the given mode and returns
+        the path of its profile and what was printed.
+        """
+        output = io.StringIO()
+        with tempfile.TemporaryDirectory() as tmp_path, contextlib.redirect_stdout(output):
+            profiling.start(mode, tmp_path)
+            try:
+                with profiling.profile('test_job'):
+                    job()
+            finally:
+                profiling.stop()
+            file_names = os.listdir(tmp_path)
+            self.assertEqual(len(file_names), 1)
+            with open(os.path.join(tmp_path, file_names[0]), 'rb') as f:
+                profile = f.read()
+            yield file_names[0], os.path.join(tmp_path, file_names[0]), profile, output.getvalue()
+
+    def test_cpu(self):
+        job_concurrency = CONFIG['JOB_CONCURRENCY']
+        for file_name, path, _, output in self.profile_job('cpu', lambda: busy_loop(0.05)):
+            self.assertEqual(file_name, 'test_job.pstats')
+            self.assertIn('busy_loop', str(pstats.Stats(path).stats))
+            self.assertIn('Top {} functions of test_job'.format(CONFIG['PROFILE_TOP']), output)
+        self.assertEqual(CONFIG['JOB_CONCURRENCY'], job_concurrency)
+
+    def test_memory(self):
+        for file_name, path, _, output in self.profile_job('memory', lambda: [str(i) for i in range(10000)]):
+            self.assertEqual(file_name, 'test_job.tracemalloc')
+            self.assertGreater(len(tracemalloc.Snapshot.load(path).traces), 0)
+            self.assertIn('Peak memory of test_job', output)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_sample(self):
+        for file_name, _, profile, output in self.profile_job('sample', lambda: busy_loop(0.3)):
+            self.assertEqual(file_name, 'test_job.folded')
+            self.assertIn(b'busy_loop (test_profiling.py:', profile)
+            self.assertIn('running functions of test_job', output)
+        self.assertFalse(profiling.is_profiling())
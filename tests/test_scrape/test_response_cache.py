@@ -0,0 +1,61 @@
+import unittest
+import os
+
+from tests.test_setup import init_test_db
+from nba_ss_db import CONFIG
+from nba_ss_db.scrape import response_cache
+
+
+class TestResponseCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        response_cache.clear()
+
+    @classmethod
+    def setUp(cls):
+        init_test_db()
+        response_cache.clear()
+
+    def test_put_and_get(self):
+        """
+        Tests that a stored response is returned as is
+        and that an unknown response is None.
+        """
+        body = b'{"resultSets": []}'
+        response_cache.put('api_request', body)
+        self.assertTrue(response_cache.contains('api_request'))
+        self.assertEqual(response_cache.get('api_request'), body)
+        self.assertIsNone(response_cache.get('other_api_request'))
+
+    def test_sharded_file_path(self):
+        """
+        Tests that responses are stored in a directory named
+        after the first characters of their cache key.
+        """
+        file_path = response_cache.get_cache_file_path('api_request')
+        cache_key = response_cache.get_cache_key('api_request')
+        self.assertEqual(os.path.basename(os.path.dirname(file_path)), cache_key[:2])
+
+    def test_evicts_least_recently_used(self):
+        """
+        Tests that the least recently used responses are
+        evicted once the cache grows too large.
+        """
+        max_bytes = CONFIG['RESPONSE_CACHE_MAX_BYTES']
+        body = os.urandom(1000)
+        try:
+            response_cache.put('api_request_0', body)
+            response_cache.put('api_request_1', body)
+            os.utime(response_cache.get_cache_file_path('api_request_0'), (0, 0))
+            CONFIG['RESPONSE_CACHE_MAX_BYTES'] = 2500
+            response_cache.put('api_request_2', body)
+        finally:
+            CONFIG['RESPONSE_CACHE_MAX_BYTES'] = max_bytes
+        self.assertFalse(response_cache.contains('api_request_0'))
+        self.assertTrue(response_cache.contains('api_request_1'))
+        self.assertTrue(response_cache.contains('api_request_2'))
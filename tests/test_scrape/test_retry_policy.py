@@ -0,0 +1,48 @@
+import unittest
+from unittest import mock
+
+import tests.test_setup
+from nba_ss_db import CONFIG
+from nba_ss_db.scrape import retry_policy
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_backoff_time_is_capped(self):
+        """
+        Tests that the backoff time never exceeds BACKOFF_MAX_TIME
+        even for large attempts.
+        """
+        for attempt in range(20):
+            backoff_time = retry_policy.get_backoff_time(attempt)
+            self.assertTrue(0 <= backoff_time <= CONFIG['BACKOFF_MAX_TIME'])
+
+    def test_backoff_time_honors_retry_after(self):
+        """
+        Tests that we wait at least as long as the Retry-After header asks.
+        """
+        self.assertGreaterEqual(retry_policy.get_backoff_time(0, retry_after=7), 7)
+
+    def test_malformed_retry_after_is_ignored(self):
+        """
+        Tests that a response with a garbage Retry-After header
+        raises an HTTPStatusError classified by its status code.
+        """
+        response = mock.Mock(status_code=404, headers={'Retry-After': 'soon'})
+        with self.assertRaises(retry_policy.HTTPStatusError) as context:
+            retry_policy.raise_for_status(response)
+        self.assertIsNone(context.exception.retry_after)
+        self.assertEqual(retry_policy.classify_error(context.exception), 'client_error')
+
+    def test_circuit_breaker_opens(self):
+        """
+        Tests that the circuit breaker opens once enough
+        of the recent requests have failed.
+        """
+        circuit_breaker = retry_policy.CircuitBreaker('stats.nba.com')
+        for _ in range(CONFIG['CIRCUIT_BREAKER_WINDOW'] // 2):
+            circuit_breaker.record_success()
+        self.assertFalse(circuit_breaker.is_open())
+        for _ in range(CONFIG['CIRCUIT_BREAKER_WINDOW'] // 2):
+            circuit_breaker.record_failure()
+        self.assertTrue(circuit_breaker.is_open())
@@ -0,0 +1,85 @@
+import threading
+import unittest
+
+from tests.test_setup import init_test_db
+from nba_ss_db import db
+from nba_ss_db.scrape import scheduler
+from nba_ss_db.scrape.query_param_values import QUERY_PARAM_VALUES, get_possible_query_param_values
+
+
+def make_job(data_name, api_endpoint='http://stats.nba.com/stats/test?Season={SEASON}'):
+    return {'DATA_NAME': data_name, 'API_ENDPOINT': api_endpoint}
+
+
+TEST_JOBS = [
+    make_job('player_ids'),
+    make_job('game_inactive_players', 'http://stats.nba.com/stats/test?GameID={GAME_ID}&Season={SEASON}'),
+    make_job('player_logs', 'http://stats.nba.com/stats/test?PlayerID={PLAYER_ID}&Season={SEASON}'),
+    make_job('games'),
+    make_job('team_stats', 'http://stats.nba.com/stats/test?DateTo={DATE_TO}&Season={SEASON}'),
+]
+
+
+class TestScheduler(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    @classmethod
+    def setUp(cls):
+        init_test_db()
+
+    def test_job_dependencies(self):
+        """
+        Tests that jobs depend on the jobs storing the tables
+        their fillables are read from, wherever they are in the file.
+        """
+        dependencies = scheduler.get_job_dependencies(TEST_JOBS)
+        self.assertEqual(dependencies, [set(), {3}, {0}, set(), set()])
+        self.assertEqual(scheduler.get_job_order(dependencies), [0, 2, 3, 1, 4])
+
+    def test_circular_dependencies(self):
+        jobs = [make_job('player_ids', 'http://stats.nba.com/stats/test?GameID={GAME_ID}&Season={SEASON}'),
+                make_job('games', 'http://stats.nba.com/stats/test?PlayerID={PLAYER_ID}&Season={SEASON}')]
+        with self.assertRaises(ValueError):
+            scheduler.get_job_dependencies(jobs)
+
+    def test_run_jobs_in_parallel(self):
+        """
+        Tests that every job runs after the jobs it depends on
+        when independent jobs run at the same time.
+        """
+        finished_jobs = []
+        finished_jobs_lock = threading.Lock()
+
+        def run_job(job):
+            with finished_jobs_lock:
+                finished_jobs.append(job['DATA_NAME'])
+
+        scheduler.run_jobs(TEST_JOBS, run_job, max_concurrency=3)
+        self.assertEqual(sorted(finished_jobs), sorted(job['DATA_NAME'] for job in TEST_JOBS))
+        self.assertLess(finished_jobs.index('games'), finished_jobs.index('game_inactive_players'))
+        self.assertLess(finished_jobs.index('player_ids'), finished_jobs.index('player_logs'))
+
+    def test_query_param_values_are_refreshed(self):
+        """
+        Tests that the player ids read by a job include the
+        ones stored by the job it depends on.
+        """
+        QUERY_PARAM_VALUES.pop('{PLAYER_ID}', None)
+        self.assertEqual(get_possible_query_param_values('{PLAYER_ID}', False), {})
+        player_ids_seen = []
+
+        def run_job(job):
+            if job['DATA_NAME'] == 'player_ids':
+                db.utils.execute_sql("""INSERT INTO player_ids VALUES ('1', 'Player', '2017-18');""")
+            else:
+                player_ids_seen.append(get_possible_query_param_values('{PLAYER_ID}', False))
+
+        scheduler.run_jobs(TEST_JOBS[:3:2], run_job, max_concurrency=1)
+        self.assertEqual(player_ids_seen, [{'2017-18': ['1']}])
@@ -1,7 +1,19 @@
+import contextlib
+import datetime
+import io
+import os
+import tempfile
 import unittest
+from unittest import mock
+
+import yaml
 
 from tests.test_setup import init_test_db
-from nba_ss_db import db
+from nba_ss_db import db, CONFIG
+from nba_ss_db.scrape import json_decoder, scraper
+from nba_ss_db.scrape.query_param_values import QUERY_PARAM_VALUES, GAME_DATES_BY_GAME_ID
+from nba_ss_db.scrape.utils import get_shard_index, format_date, format_dates
+from benchmarks.fake_stats_server import FakeStatsServer, League
 
 
 class TestScraper(unittest.TestCase):
@@ -23,7 +35,214 @@ class TestScraper(unittest.TestCase):
 
     def test_already_scraped(self):
         db.request_logger.log_request('api_request', 'test_table')
-        api_request_query = db.utils.execute_sql(
-            """SELECT api_request FROM scrape_log LIMIT 1;""").rows
-        api_request = api_request_query[0][0]
-        self.assertTrue(db.request_logger.already_scraped(api_request), 'Should have been scraped.')
+        request_hash_query = db.utils.execute_sql(
+            """SELECT request_hash FROM scrape_log LIMIT 1;""").rows
+        request_hash = request_hash_query[0][0]
+        self.assertEqual(request_hash, db.request_logger.get_request_hash('api_request'))
+        self.assertTrue(db.request_logger.already_scraped('api_request'), 'Should have been scraped.')
+
+    def test_scraped_requests_are_cached_per_database(self):
+        """
+        Tests that requests scraped for a table in one database
+        aren't skipped as already scraped in another database.
+        """
+        db.request_logger.log_request('api_request', 'test_table')
+        self.assertTrue(db.request_logger.already_scraped('api_request', 'test_table'))
+        with tempfile.TemporaryDirectory() as tmp_path:
+            with mock.patch.dict(CONFIG, {'DB_PATH': tmp_path}):
+                db.initialize.init_db()
+                self.assertFalse(db.request_logger.already_scraped('api_request', 'test_table'))
+                db.request_logger.log_request('other_api_request', 'test_table')
+                db.utils.close_db_connection()
+        self.assertTrue(db.request_logger.already_scraped('api_request', 'test_table'))
+        self.assertFalse(db.request_logger.already_scraped('other_api_request', 'test_table'))
+
+
+    def test_parse_result_sets(self):
+        """
+        Tests that parse_result_sets returns the response of every
+        result set and that a malformed body is scraped again.
+        """
+        result_sets = [{'result_set_index': 0}, {'result_set_index': 1}]
+        body = b'{"resultSets": [{"headers": ["PTS"], "rowSet": [[20]]}, {"headers": ["AST"], "rowSet": [[5]]}]}'
+        with mock.patch.dict(CONFIG, {'RESPONSE_CACHE': False}):
+            nba_responses = scraper.parse_result_sets('api_request', body, result_sets)
+            self.assertEqual([nba_response.headers for nba_response in nba_responses], [['PTS'], ['AST']])
+
+            with mock.patch.object(scraper, 'scrape', return_value=nba_responses) as scrape:
+                self.assertIs(scraper.parse_result_sets('api_request', b'<html>', result_sets), nba_responses)
+            scrape.assert_called_once_with('api_request', [0, 1], False)
+
+    def test_scraped_requests_are_cached_per_table(self):
+        """
+        Tests that the in-memory set of scraped requests is loaded
+        per table and kept up to date as requests are logged.
+        """
+        db.request_logger.log_request('api_request', 'test_table')
+        scraped_request_hashes = db.request_logger.get_scraped_request_hashes('test_table')
+        self.assertEqual(scraped_request_hashes, {db.request_logger.get_request_hash('api_request')})
+
+        db.request_logger.log_request('other_api_request', 'test_table')
+        self.assertTrue(db.request_logger.already_scraped('other_api_request', 'test_table'))
+        self.assertFalse(db.request_logger.already_scraped('api_request', 'other_test_table'))
+
+    def test_log_request_keeps_one_entry_per_request(self):
+        """
+        Tests that logging the same request twice doesn't
+        add a second entry to scrape_log.
+        """
+        db.request_logger.log_request('api_request', 'test_table')
+        db.request_logger.log_request('api_request', 'test_table')
+        num_entries = db.utils.execute_sql("""SELECT COUNT(*) FROM scrape_log;""").rows[0][0]
+        self.assertEqual(num_entries, 1)
+
+    def test_migrate_old_scrape_log(self):
+        """
+        Tests that an old scrape_log is migrated by init_db
+        and that its duplicate entries are collapsed.
+        """
+        db.utils.execute_sql("""DROP TABLE scrape_log;""")
+        db.utils.execute_sql("""CREATE TABLE scrape_log (date text, api_request text, table_name text);""")
+        for date in ('2017-11-10 10:00:00 000000', '2017-11-11 10:00:00 000000'):
+            db.utils.execute_sql("""INSERT INTO scrape_log VALUES (?, ?, ?);""",
+                                 params=(date, 'api_request', 'test_table'))
+
+        db.initialize.init_db()
+        self.assertFalse(db.request_logger.is_old_scrape_log())
+        self.assertTrue(db.request_logger.already_scraped('api_request', 'test_table'))
+        num_entries = db.utils.execute_sql("""SELECT COUNT(*) FROM scrape_log;""").rows[0][0]
+        self.assertEqual(num_entries, 1)
+
+    def test_shards_partition_api_requests(self):
+        """
+        Tests that every api request is assigned to exactly one
+        shard and that the assignment doesn't depend on the
+        order of the query parameters.
+        """
+        api_requests = ['http://stats.nba.com/stats/boxscoresummaryv2?GameID={}&Season=2017-18'.format(game_id)
+                        for game_id in range(100)]
+        shards = [get_shard_index(api_request, 4) for api_request in api_requests]
+        self.assertTrue(all(0 <= shard < 4 for shard in shards))
+        self.assertEqual(len(set(shards)), 4, 'Every shard should get some of the api requests.')
+
+        reordered_api_request = 'http://stats.nba.com/stats/boxscoresummaryv2?Season=2017-18&GameID=0'
+        self.assertEqual(get_shard_index(reordered_api_request, 4), shards[0])
+
+    def test_format_dates_in_batch(self):
+        """
+        Tests that formatting a large column of dates at once gives
+        the same dates as formatting them one at a time, including
+        dates in another format than the first one.
+        """
+        first_date = datetime.date(2000, 1, 1)
+        for date_format in ('%b %d, %Y', '%m/%d/%Y', '%Y-%m-%dT00:00:00', '%m%%2F%d%%2F%Y'):
+            date_strs = [(first_date + datetime.timedelta(days=i)).strftime(date_format).upper() for i in range(1500)]
+            date_strs += ['OCT 29, 2016', '11/10/2017'] + date_strs[:10]
+            formatted_dates = format_dates(date_strs)
+            self.assertEqual(len(formatted_dates), 1502)
+            for date_str in date_strs:
+                self.assertEqual(formatted_dates[date_str], format_date.__wrapped__(date_str))
+
+    def test_jobs_with_the_same_api_requests_are_merged(self):
+        """
+        Tests that jobs storing different result sets of the same
+        api request make the request once and store both tables.
+        """
+        league = League(players_per_team=2, games_per_season=10)
+        game_id = league.get_schedule('2017-18')[0][0]
+        with FakeStatsServer(league=league) as server:
+            jobs = [{'DATA_NAME': 'officials_test', 'RESULT_SET_INDEX': 2, 'PRIMARY_KEYS': ['SEASON', 'OFFICIAL_ID'],
+                     'API_ENDPOINT': '{}/stats/boxscoresummaryv2?GameID={}&Season={{SEASON}}'.format(server.url, game_id),
+                     'DAILY_SCRAPE': False},
+                    {'API_ENDPOINT': '{}/stats/boxscoresummaryv2?Season={{SEASON}}&GameID={}'.format(server.url, game_id),
+                     'DAILY_SCRAPE': False, 'PRIMARY_KEYS': ['SEASON', 'GAME_ID'],
+                     'RESULT_SETS': [{'DATA_NAME': 'summaries_test', 'RESULT_SET_INDEX': 0},
+                                     {'DATA_NAME': 'game_info_test', 'RESULT_SET_INDEX': 4,
+                                      'PRIMARY_KEYS': ['SEASON', 'GAME_DATE']}]}]
+            with tempfile.TemporaryDirectory() as tmp_path:
+                path_to_api_requests = os.path.join(tmp_path, 'api_requests.yaml')
+                with open(path_to_api_requests, 'w') as f:
+                    yaml.dump(jobs, f)
+                with mock.patch.dict(CONFIG, {'SEASONS': ['2017-18'], 'RESPONSE_CACHE': False}), \
+                        contextlib.redirect_stdout(io.StringIO()):
+                    QUERY_PARAM_VALUES.clear()
+                    scraper.run_scrape_jobs(path_to_api_requests)
+                    QUERY_PARAM_VALUES.clear()
+        self.assertEqual(server.num_requests, 1)
+        for table_name, num_rows in (('officials_test', 3), ('summaries_test', 1), ('game_info_test', 1)):
+            self.assertEqual(db.utils.execute_sql('SELECT COUNT(*) FROM {};'.format(table_name)).rows[0][0], num_rows)
+            self.assertTrue(db.request_logger.already_scraped(jobs[0]['API_ENDPOINT'].format(SEASON='2017-18'),
+                                                              table_name))
+
+    def test_sharded_scrape_equals_unsharded_scrape(self):
+        """
+        Tests that merging the databases of every shard of a scrape
+        gives the same tables as scraping without shards, even for
+        jobs filled in from a table that is stored by the same scrape.
+        """
+        with FakeStatsServer(league=League(players_per_team=2, games_per_season=6)) as server:
+            jobs = [{'DATA_NAME': 'games', 'PRIMARY_KEYS': ['TEAM_ID', 'SEASON', 'GAME_DATE'], 'DAILY_SCRAPE': True,
+                     'API_ENDPOINT': '{}/stats/leaguegamelog?PlayerOrTeam=T&Season={{SEASON}}'.format(server.url)},
+                    {'DATA_NAME': 'summaries_test', 'PRIMARY_KEYS': ['SEASON', 'GAME_ID'], 'DAILY_SCRAPE': False,
+                     'API_ENDPOINT': '{}/stats/boxscoresummaryv2?GameID={{GAME_ID}}&Season={{SEASON}}'.format(
+                         server.url)}]
+            with tempfile.TemporaryDirectory() as tmp_path:
+                path_to_api_requests = os.path.join(tmp_path, 'api_requests.yaml')
+                with open(path_to_api_requests, 'w') as f:
+                    yaml.dump(jobs, f)
+
+                def get_tables(db_name, shard=None, merged_db_names=()):
+                    with mock.patch.dict(CONFIG, {'DB_PATH': tmp_path, 'DB_NAME': db_name, 'RESPONSE_CACHE': False,
+                                                  'SEASONS': ['2015-16', '2016-17', '2017-18']}), \
+                            contextlib.redirect_stdout(io.StringIO()):
+                        db.initialize.init_db()
+                        QUERY_PARAM_VALUES.clear()
+                        GAME_DATES_BY_GAME_ID.clear()
+                        if len(merged_db_names) == 0:
+                            scraper.run_scrape_jobs(path_to_api_requests, shard=shard)
+                        else:
+                            db.merge.merge_databases([os.path.join(tmp_path, '{}.db'.format(merged_db_name))
+                                                      for merged_db_name in merged_db_names])
+                        tables = {table_name: sorted(db.utils.execute_sql('SELECT * FROM {};'.format(table_name)).rows)
+                                  for table_name in ('games', 'summaries_test')}
+                        db.utils.close_db_connection()
+                        QUERY_PARAM_VALUES.clear()
+                        GAME_DATES_BY_GAME_ID.clear()
+                    return tables
+
+                tables = get_tables('unsharded')
+                get_tables('shard_0', shard=(0, 2))
+                get_tables('shard_1', shard=(1, 2))
+                merged_tables = get_tables('merged', merged_db_names=('shard_0', 'shard_1'))
+        self.assertEqual(len(tables['summaries_test']), 18)
+        self.assertEqual(merged_tables, tables)
+
+    def test_json_decoders_agree(self):
+        """
+        Tests that every installed json decoder extracts the
+        same result set and that unknown decoders are rejected.
+        """
+        body = b'{"resultSets": [{"headers": ["GAME_ID"], "rowSet": [["0021700001"]]}, ' \
+               b'{"headers": ["PLAYER_ID", "PTS"], "rowSet": [[1, 10.5], [2, null]]}]}'
+        for decoder_name, loads in json_decoder.JSON_DECODERS.items():
+            if loads is None:
+                continue
+            with mock.patch.dict(CONFIG, {'JSON_DECODER': decoder_name}):
+                nba_response = scraper.NBAResponse.from_result_set(json_decoder.decode_result_set(body, 1))
+            self.assertEqual(nba_response.headers, ['PLAYER_ID', 'PTS'])
+            self.assertEqual(nba_response.rows, [[1, 10.5], [2, None]])
+        with mock.patch.dict(CONFIG, {'JSON_DECODER': 'simplejson'}):
+            with self.assertRaises(ValueError):
+                json_decoder.decode_result_set(body, 1)
+
+    def test_scrape_retries_against_fake_server(self):
+        """
+        Tests that requests which were throttled or failed with
+        a server error are retried until they succeed.
+        """
+        with mock.patch.dict(CONFIG, {'SLEEP_TIME': 0, 'TRY_COUNT': 20, 'RESPONSE_CACHE': False}):
+            with FakeStatsServer(error_rate=0.3, throttle_rate=0.3, retry_after=0,
+                                 league=League(players_per_team=2, games_per_season=10)) as server:
+                nba_response = scraper.scrape('{}/stats/leaguegamelog?Season=2017-18'.format(server.url), 0)
+        self.assertIn('GAME_ID', nba_response.headers)
+        self.assertEqual(len(nba_response.rows), 20)
@@ -1,6 +1,8 @@
 from nba_ss_db import CONFIG
 CONFIG['DB_NAME'] = 'test_db'
 CONFIG['DB_PATH'] = 'tests/test_db/databases'
+CONFIG['RESPONSE_CACHE_PATH'] = 'tests/test_scrape/response_cache'
+CONFIG['METRICS_PATH'] = None
 from nba_ss_db import db
 
 